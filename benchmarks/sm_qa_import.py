@@ -0,0 +1,69 @@
+""" Compares the SuperMemo Q&A importer parsers on a multi-megabyte cards.txt. 
+
+The cards have multi-line questions and answers of growing length. The factory only
+counts the records, so the timings show the cost of reading and parsing.
+
+Usage: python benchmarks/sm_qa_import.py [number of cards]
+"""
+import os
+import random
+import sys
+import time
+
+from fs.tempfs import TempFS
+
+# The repository needn't be installed or on PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openmemo.conversion.formats.sm_qa import SuperMemoQAImporter
+
+
+class CountingFactory (object):
+    def __init__(self):
+        self.num_cos = 0
+
+    def ContentObject(self, importer, data):
+        self.num_cos += 1
+
+
+class NoMarkup (object):
+    pass
+
+
+def create_cards(num_cards, seed=0):
+    rnd = random.Random(seed)
+    cards = []
+    for i in range(num_cards):
+        question = ["Q: question %d line %d %s" % (i, j, "q" * rnd.randint(0, 80)) 
+                    for j in range(1 + i % 3)]
+        answer = ["A: answer %d line %d %s" % (i, j, "a" * rnd.randint(0, 80)) 
+                  for j in range(1 + (i % 7) * (i % 11))]
+        cards.append("\r\n".join(question + answer))
+    return "\r\n\r\n".join(cards)
+
+
+def time_import(fs, fast_parser):
+    factory = CountingFactory()
+    importer = SuperMemoQAImporter(fs, factory, NoMarkup())
+    importer.fast_parser = fast_parser
+    start = time.time()
+    importer()
+    return time.time() - start, factory.num_cos
+
+
+def main(num_cards=20000):
+    fs = TempFS()
+    data = create_cards(num_cards)
+    fs.setcontents('cards.txt', data)
+    print "cards.txt: %d cards, %.1f MB" % (num_cards, len(data) / 1e6)
+    line_time, line_cos = time_import(fs, False)
+    fast_time, fast_cos = time_import(fs, True)
+    assert line_cos == fast_cos == num_cards
+    print "line parser: %.3f s, %.0f cards/s" % (line_time, num_cards / line_time)
+    print "fast parser: %.3f s, %.0f cards/s" % (fast_time, num_cards / fast_time)
+    print "speedup:     %.1fx" % (line_time / fast_time)
+    fs.close()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
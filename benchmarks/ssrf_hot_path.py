@@ -0,0 +1,158 @@
+""" Benchmarks of the SSRF scheduler hot path. 
+
+Measures ``_calculate_interval()``, ``_find_max_load_reduction_ind()`` for several 
+window sizes and ``schedule()`` (balancing the workload and estimated) with synthetic
+calendars of 1k - 1M cards. The results are written to a JSON file, which can be
+compared with the results of another commit:
+
+Usage: python benchmarks/ssrf_hot_path.py [-o results.json] [--compare old.json] [--quick]
+"""
+from datetime import date, datetime, timedelta
+import json
+from optparse import OptionParser
+import os
+import platform
+import random
+import subprocess
+import sys
+from timeit import default_timer
+
+# The repository needn't be installed or on PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm, numpy
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+WINDOW_SIZES = (4, 16, 64, 256, 1024)
+CALENDAR_SIZES = (1000, 10000, 100000, 1000000)
+
+
+def measure(fn, args_list, repeat=3):
+    """ Returns the best time of a call of ``fn`` in seconds, calling it with each of ``args_list``. """
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        for args in args_list:
+            fn(*args)
+        elapsed = (default_timer() - start) / len(args_list)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def create_calendar(num_cards, today, seed=0):
+    """ Returns a calendar of cards with reviews scheduled in the next two years, 
+    more of them in the near future, like in a deck learned for a long time. 
+    """
+    rnd = random.Random(seed)
+    calendar = WorkloadCalendar()
+    for i in xrange(num_cards):
+        days = 1 + min(int(rnd.expovariate(1 / 60.0)), 730)
+        calendar.add(today + timedelta(days), rnd.uniform(0.0, 3.0))
+    return calendar
+
+
+def create_items(num_items, seed=0):
+    rnd = random.Random(seed)
+    return [(rnd.choice(GRADES), dict(num_reviews=rnd.randint(1, 10), avg_grade=rnd.uniform(1.5, 5.0),
+                                      difficulty=rnd.uniform(0.0, 2.0)), rnd.choice(PRIORITIES))
+            for i in xrange(num_items)]
+
+
+def bench_calculate_interval(results, num_calls):
+    algorithm = SSRFAlgorithm(None, validate=False)
+    rnd = random.Random(0)
+    args_list = [(rnd.randint(1, 20), rnd.uniform(1.5, 5.0), rnd.choice(GRADES), rnd.choice(PRIORITIES))
+                 for i in xrange(num_calls)]
+    results['calculate_interval'] = measure(algorithm._calculate_interval, args_list)
+
+
+def bench_find_max_load_reduction_ind(results, num_calls):
+    rnd = random.Random(0)
+    variants = [('pure', False)]
+    if numpy is not None:
+        variants.append(('numpy', True))
+    for window in WINDOW_SIZES:
+        args_list = []
+        for i in xrange(max(num_calls // window, 10)):
+            workloads = [rnd.randint(1, 100) for day in xrange(window)]
+            avg_difficulties = [rnd.uniform(0.1, 3.0) for day in xrange(window)]
+            alg_data = dict(num_reviews=rnd.randint(1, 10), avg_grade=3.0, difficulty=1.0)
+            args_list.append((alg_data, range(10, 10 + window), workloads, avg_difficulties,
+                              rnd.choice(PRIORITIES)))
+        for name, use_numpy in variants:
+            if use_numpy and window < SSRFAlgorithm.NUMPY_MIN_WINDOW:
+                # NumPy isn't used for small windows
+                continue
+            algorithm = SSRFAlgorithm(None, use_numpy=use_numpy, validate=False)
+            results['find_max_load_reduction_ind/%s/%d' % (name, window)] = measure(
+                algorithm._find_max_load_reduction_ind, args_list)
+
+
+def bench_schedule(results, num_calls, calendar_sizes):
+    today = date(2011, 3, 1)
+    now = datetime(2011, 3, 1, 10, 0)
+    items = create_items(num_calls)
+    for num_cards in calendar_sizes:
+        calendar = create_calendar(num_cards, today)
+        for validate in (True, False):
+            algorithm = SSRFAlgorithm(calendar, validate=validate)
+            suffix = '' if validate else '/no_validation'
+            results['schedule/%d%s' % (num_cards, suffix)] = measure(
+                lambda grade, alg_data, priority: algorithm.schedule(grade, alg_data, priority, now=now), items)
+            results['schedule_estimated/%d%s' % (num_cards, suffix)] = measure(
+                lambda grade, alg_data, priority: algorithm.schedule(grade, alg_data, priority, now=now,
+                                                                     estimated=True), items)
+
+
+def git_commit():
+    try:
+        return subprocess.Popen(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE).communicate()[0].strip() or None
+    except OSError:
+        return None
+
+
+def run(quick=False):
+    num_calls = 200 if quick else 2000
+    results = {}
+    bench_calculate_interval(results, num_calls * 10)
+    bench_find_max_load_reduction_ind(results, num_calls * 10)
+    bench_schedule(results, num_calls, CALENDAR_SIZES[:2] if quick else CALENDAR_SIZES)
+    return {'commit': git_commit(), 'python': platform.python_version(), 
+            'numpy': numpy.__version__ if numpy is not None else None,
+            'date': datetime.utcnow().isoformat(), 
+            'results': dict((name, seconds * 1e6) for name, seconds in results.items())}
+
+
+def print_results(report, old_report=None):
+    print "%-50s %12s" % ("benchmark", "us/call") + ("  %12s %8s" % ("old us/call", "change") if old_report else "")
+    old_results = old_report['results'] if old_report else {}
+    for name in sorted(report['results']):
+        line = "%-50s %12.2f" % (name, report['results'][name])
+        old = old_results.get(name)
+        if old:
+            line += "  %12.2f %+7.1f%%" % (old, 100 * (report['results'][name] - old) / old)
+        print line
+
+
+def main(args=None):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('-o', '--output', default='ssrf_hot_path.json', help="JSON file with the results")
+    parser.add_option('--compare', help="JSON file with results to compare with")
+    parser.add_option('--quick', action='store_true', default=False,
+                      help="fewer calls and calendars of up to 10k cards")
+    options, args = parser.parse_args(args)
+    report = run(options.quick)
+    old_report = None
+    if options.compare:
+        with open(options.compare) as f:
+            old_report = json.load(f)
+    print_results(report, old_report)
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+""" Compares the time of ``SSRFAlgorithm.schedule()`` calls with and without validation. 
+
+Usage: python benchmarks/ssrf_validation.py [number of calls]
+"""
+from datetime import date, datetime, timedelta
+import os
+import sys
+import time
+
+# The repository needn't be installed or on PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+
+def create_calendar(num_days=1000, reviews_per_day=50):
+    calendar = WorkloadCalendar()
+    today = date.today()
+    for days in range(1, num_days):
+        for i in range(1 + (days * 7) % reviews_per_day):
+            calendar.add(today + timedelta(days), (i % 13) / 4.0)
+    return calendar
+
+
+def create_items(num_items):
+    return [(i % 6, dict(num_reviews=1 + i % 9, avg_grade=1.0 + (i % 9) / 2.0, difficulty=0.5), PRIORITIES[i % 3])
+            for i in range(num_items)]
+
+
+def time_schedule(algorithm, items, now):
+    start = time.time()
+    for grade, alg_data, priority in items:
+        algorithm.schedule(grade, alg_data, priority, now=now)
+    return (time.time() - start) / len(items)
+
+
+def main(num_calls=2000):
+    calendar = create_calendar()
+    items = create_items(num_calls)
+    now = datetime.utcnow()
+    validated = time_schedule(SSRFAlgorithm(calendar, use_numpy=False), items, now)
+    not_validated = time_schedule(SSRFAlgorithm(calendar, use_numpy=False, validate=False), items, now)
+    print "schedule() with validation:    %8.1f us/call" % (validated * 1e6)
+    print "schedule() without validation: %8.1f us/call" % (not_validated * 1e6)
+    print "saved:                         %8.1f us/call (%.0f%%)" % (
+        (validated - not_validated) * 1e6, 100 * (validated - not_validated) / validated)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
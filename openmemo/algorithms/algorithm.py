@@ -1,5 +1,6 @@
 from collections import namedtuple
 from enum import Enum
+import threading
 
 AlgorithmResult = namedtuple('AlgorithmResult', 'next_review alg_data')
 
@@ -27,15 +28,70 @@ class AlgorithmGlobalData (object):
     """
 
 
+class AlgorithmMetrics (object):
+    """ Receives measurements of ``schedule()`` calls of an algorithm. """
+    
+    def record(self, branch, durations, window_size):
+        """ Records a single ``schedule()`` call.
+        
+        Arguments:
+        branch - the branch of the algorithm which decided about the next review
+        durations - a dict of durations of the phases of the call in seconds
+        window_size - number of days of global data requested, None if no data were requested
+        """
+        raise NotImplementedError()
+
+
+class CountingMetrics (AlgorithmMetrics):
+    """ Keeps cumulative counters of the recorded calls, which can be read 
+    at any time (also from another thread) with ``snapshot()``. 
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, branch, durations, window_size):
+        with self._lock:
+            counters = self._counters
+            counters['calls'] = counters.get('calls', 0) + 1
+            key = 'calls.%s' % branch
+            counters[key] = counters.get(key, 0) + 1
+            for phase, duration in durations.iteritems():
+                key = 'seconds.%s' % phase
+                counters[key] = counters.get(key, 0.0) + duration
+            if window_size is not None:
+                counters['window_days'] = counters.get('window_days', 0) + window_size
+
+    def snapshot(self):
+        """ Returns a dict of the counters:
+        
+        * ``calls`` - number of calls
+        * ``calls.<branch>`` - number of calls decided by the branch
+        * ``seconds.<phase>`` - total duration of the phase
+        * ``window_days`` - total number of days of global data requested
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+
+
 class Algorithm (object):
     """ Base class for a repetion scheduling algorithm. 
     
     Keeps a reference to a provider for gathering parameters that are out of scope 
     of the current LU algorithm data. 
+    
+    If ``metrics`` (an AlgorithmMetrics) is given, the algorithm records 
+    measurements of each ``schedule()`` call in it; otherwise nothing is measured.
     """
     
-    def __init__(self, global_data, *args, **kwargs):
+    def __init__(self, global_data, metrics=None, *args, **kwargs):
         self.global_data = global_data
+        self.metrics = metrics
     
     def schedule(self, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None, estimated=False, user_data=None):
         """ Calculates next repetition for a LU.
@@ -0,0 +1,214 @@
+""" SSRF algorithm fetching global data with non-blocking requests. """
+from datetime import datetime
+import sys
+import threading
+from openmemo.algorithms.algorithm import DEFAULT_PRIORITY
+from openmemo.algorithms.ssrf import SSRFAlgorithm, SSRFAlgorithmGlobalData
+
+
+class AsyncSSRFAlgorithmGlobalData (SSRFAlgorithmGlobalData):
+    """ Interface implemented by global LU data providers which can request
+    the data without blocking. 
+    
+    The asynchronous methods return futures - objects with ``result()``, ``done()``, 
+    ``cancel()`` and ``add_done_callback(fn)`` methods, e.g. ``concurrent.futures.Future``.
+    ``fn`` is called with the future when it completes, at once if it already has. 
+    ``cancel()`` of a request which has already completed has no effect.
+    """
+    
+    def get_workloads_async(self, from_date, to_date, user_data):
+        """ Returns a future of ``get_workloads(from_date, to_date, user_data)``. """
+        
+        raise NotImplementedError()
+    
+    def get_avg_difficulties_async(self, from_date, to_date, user_data):
+        """ Returns a future of ``get_avg_difficulties(from_date, to_date, user_data)``. """
+        
+        raise NotImplementedError()
+
+    def get_workloads(self, from_date, to_date, user_data):
+        return self.get_workloads_async(from_date, to_date, user_data).result()
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        return self.get_avg_difficulties_async(from_date, to_date, user_data).result()
+
+
+class ExecutorGlobalData (AsyncSSRFAlgorithmGlobalData):
+    """ Runs requests to a blocking SSRFAlgorithmGlobalData in an executor 
+    (an object with a ``submit(fn, *args)`` method returning a future, 
+    e.g. ``concurrent.futures.ThreadPoolExecutor``).
+    """
+    
+    def __init__(self, global_data, executor):
+        self.global_data = global_data
+        self.executor = executor
+
+    def get_workloads_async(self, from_date, to_date, user_data):
+        return self.executor.submit(self.global_data.get_workloads, from_date, to_date, user_data)
+
+    def get_avg_difficulties_async(self, from_date, to_date, user_data):
+        return self.executor.submit(self.global_data.get_avg_difficulties, from_date, to_date, user_data)
+
+
+class ScheduleFuture (object):
+    """ Result of ``AsyncSSRFAlgorithm.schedule_async()``, with the ``result()``, 
+    ``done()`` and ``add_done_callback(fn)`` methods of ``concurrent.futures.Future``.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+        self._result = None
+        self._exc_info = None
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """ Waits for the AlgorithmResult and returns it or raises the error of scheduling. 
+        
+        Raises RuntimeError if it doesn't complete in ``timeout`` seconds.
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError("Scheduling has not completed in %s s" % timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _complete(self, result=None, exc_info=None):
+        with self._lock:
+            self._result = result
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class _Pending (Exception):
+    """ Raised by _ReplayGlobalData for a request which has not completed. """
+    
+    def __init__(self, future):
+        Exception.__init__(self)
+        self.future = future
+
+
+class _ReplayGlobalData (SSRFAlgorithmGlobalData):
+    """ Answers requests of the scheduling code with the results of completed futures.
+    
+    A request which has not completed raises _Pending, the scheduling code is run 
+    again when it completes. Average difficulties are requested together with 
+    the workloads of the same range, so that both requests run concurrently.
+    ``cancel_unused()`` cancels the requests whose results haven't been used.
+    """
+    
+    def __init__(self, global_data):
+        self._global_data = global_data
+        # [name, (from_date, to_date, user_data), future, used]
+        self._requests = []
+
+    def get_workloads(self, from_date, to_date, user_data):
+        key = (from_date, to_date, user_data)
+        if self._find('workloads', key) is None:
+            self._request('workloads', key)
+            if self._find('avg_difficulties', key) is None:
+                self._request('avg_difficulties', key)
+        return self._result('workloads', key)
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        key = (from_date, to_date, user_data)
+        if self._find('avg_difficulties', key) is None:
+            self._request('avg_difficulties', key)
+        return self._result('avg_difficulties', key)
+
+    def cancel_unused(self):
+        for request in self._requests:
+            if not request[3]:
+                request[2].cancel()
+
+    def _find(self, name, key):
+        for request in self._requests:
+            if request[0] == name and request[1] == key:
+                return request
+        return None
+
+    def _request(self, name, key):
+        method = getattr(self._global_data, 'get_%s_async' % name)
+        self._requests.append([name, key, method(*key), False])
+
+    def _result(self, name, key):
+        request = self._find(name, key)
+        future = request[2]
+        if not future.done():
+            raise _Pending(future)
+        request[3] = True
+        return future.result()
+
+
+class AsyncSSRFAlgorithm (SSRFAlgorithm):
+    """ SSRF algorithm for global data providers implementing AsyncSSRFAlgorithmGlobalData.
+    
+    Daily workloads and average difficulties are requested at the same time, 
+    so their latencies overlap. When a day with no workload decides the schedule, 
+    the average difficulties aren't needed and their request is cancelled.
+    The results are the same as of SSRFAlgorithm.
+    """
+    
+    def schedule(self, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None, estimated=False, user_data=None,
+                 in_place=False):
+        """ Calculates next repetition for a LU, waiting for ``schedule_async()``. """
+        return self.schedule_async(grade, alg_data, priority, now, estimated, user_data, in_place).result()
+
+    def schedule_async(self, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None, estimated=False,
+                       user_data=None, in_place=False):
+        """ Calculates next repetition for a LU without waiting for the global data. 
+        
+        Takes the arguments of ``schedule()`` and returns a ScheduleFuture of its result.
+        The scheduling is finished by the callback of the last global data request, 
+        i.e. in the thread which completes it.
+        
+        With ``metrics`` set, only the final run of the scheduling code (see ``run()``) 
+        is recorded. It reads the results of completed requests, so the durations 
+        of the global data provider methods don't include the request latencies,
+        which overlap each other and the scheduling of other LUs.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        future = ScheduleFuture()
+        if estimated or not isinstance(self.global_data, AsyncSSRFAlgorithmGlobalData):
+            try:
+                result = SSRFAlgorithm._schedule(self, self.global_data, grade, alg_data, priority, now, estimated,
+                                                 user_data, in_place)
+            except Exception:
+                future._complete(exc_info=sys.exc_info())
+            else:
+                future._complete(result)
+            return future
+        
+        global_data = _ReplayGlobalData(self.global_data)
+        def run(completed=None):
+            # The scheduling code doesn't change alg_data before it has all the global data,
+            # so it is run again from the start when a request completes; a run interrupted
+            # by _Pending doesn't reach _result() and records no measurement
+            try:
+                result = SSRFAlgorithm._schedule(self, global_data, grade, alg_data, priority, now, estimated,
+                                                 user_data, in_place)
+            except _Pending, e:
+                e.future.add_done_callback(run)
+                return
+            except Exception:
+                global_data.cancel_unused()
+                future._complete(exc_info=sys.exc_info())
+                return
+            global_data.cancel_unused()
+            future._complete(result)
+        run()
+        return future
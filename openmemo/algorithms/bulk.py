@@ -0,0 +1,209 @@
+""" Rescheduling of many learning units in parallel processes.
+
+All LUs of a user are scheduled in one process with a local WorkloadCalendar,
+because calendars of different users are independent. 
+
+Usage: python -m openmemo.algorithms.bulk [options] input.csv output.csv
+
+The input CSV file has a header with the columns ``user``, ``lu``, ``grade``, ``priority``,
+``now`` and the SSRF algorithm data fields (empty if unknown); rows of a user 
+must be consecutive. The output has the columns ``user``, ``lu`` and the new 
+algorithm data fields.
+"""
+from collections import namedtuple
+import csv
+from datetime import datetime
+from itertools import groupby
+import multiprocessing
+from optparse import OptionParser
+import sys
+import time
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.ssrf_state import FIELDS
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+# Arguments of a ``schedule()`` call of a LU identified by ``lu``
+BulkItem = namedtuple('BulkItem', 'user_data lu grade alg_data priority now')
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def reschedule(items, processes=None, chunk_size=100, algorithm_kwargs=None, progress=None):
+    """ Schedules BulkItems and yields ``(user_data, lu, AlgorithmResult)`` tuples.
+    
+    Items of a user must be consecutive, ValueError is raised when a user's items 
+    appear again after items of other users. They are scheduled in the order of ``now``
+    (and their order in ``items`` at the same time), each result is added 
+    to the calendar of the user before the next item is scheduled. 
+    The results are yielded in the order of users in ``items``, so they are 
+    the same for any number of processes.
+    
+    Arguments:
+    processes - number of worker processes; the items are scheduled in this process if 0
+    chunk_size - number of users sent to the workers at once; at most two chunks 
+    of users are kept in memory 
+    algorithm_kwargs - keyword arguments of SSRFAlgorithm; validation is turned off by default
+    progress - a callable called with the number of scheduled items after each chunk
+    """
+    kwargs = {'validate': False}
+    kwargs.update(algorithm_kwargs or {})
+    users = ((user_data, user_items, kwargs) for user_data, user_items in _group_by_user(items))
+    pool = multiprocessing.Pool(processes) if processes != 0 else None
+    try:
+        num_items = 0
+        for chunk_results in _map_chunks(pool, _chunks(users, chunk_size)):
+            for user_data, results in chunk_results:
+                for lu, result in results:
+                    yield user_data, lu, result
+                num_items += len(results)
+            if progress is not None:
+                progress(num_items)
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    else:
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.join()
+
+
+def _group_by_user(items):
+    """ Yields ``(user_data, [item, ...])`` for the consecutive items of each user. """
+    users = set()
+    for user_data, user_items in groupby(items, lambda item: item.user_data):
+        if user_data in users:
+            raise ValueError("Items of user %r are not consecutive" % (user_data,))
+        users.add(user_data)
+        yield user_data, list(user_items)
+
+
+def _map_chunks(pool, chunks):
+    """ Yields lists of results of ``_reschedule_user()`` for the chunks of users. 
+    
+    The workers schedule the next chunk while the results of the previous one are consumed.
+    """
+    if pool is None:
+        for chunk in chunks:
+            yield map(_reschedule_user, chunk)
+        return
+    pending = None
+    for chunk in chunks:
+        next_pending = pool.map_async(_reschedule_user, chunk)
+        if pending is not None:
+            yield pending.get()
+        pending = next_pending
+    if pending is not None:
+        yield pending.get()
+
+
+def _reschedule_user(args):
+    """ Schedules items of a user and returns ``(user_data, [(lu, AlgorithmResult), ...])``. """
+    user_data, items, algorithm_kwargs = args
+    calendar = WorkloadCalendar()
+    algorithm = SSRFAlgorithm(calendar, **algorithm_kwargs)
+    order = sorted(range(len(items)), key=lambda ind: items[ind].now)
+    results = [None] * len(items)
+    for ind in order:
+        item = items[ind]
+        result = algorithm.schedule(item.grade, item.alg_data, item.priority, now=item.now, user_data=user_data)
+        calendar.update(result, user_data=user_data)
+        results[ind] = (item.lu, result)
+    return user_data, results
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for value in iterable:
+        chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ThroughputReport (object):
+    """ Progress callback of ``reschedule()`` writing the number of scheduled items 
+    and the throughput to a stream at most once per ``interval`` seconds. 
+    """
+    
+    def __init__(self, stream=sys.stderr, interval=1.0):
+        self.stream = stream
+        self.interval = interval
+        self.start = time.time()
+        self._last_report = None
+        self.num_items = 0
+
+    def __call__(self, num_items):
+        self.num_items = num_items
+        now = time.time()
+        if self._last_report is None or now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.time() - self.start
+        self.stream.write("%d LUs scheduled in %.1f s (%.0f LUs/s)\n" % (
+            self.num_items, elapsed, self.num_items / elapsed if elapsed else 0.0))
+
+
+def read_items(f):
+    """ Reads BulkItems from a CSV file. """
+    for row in csv.DictReader(f):
+        alg_data = {}
+        for field in FIELDS:
+            value = row.get(field)
+            if value:
+                alg_data[field] = _FIELD_PARSERS[field](value)
+        yield BulkItem(row['user'], row['lu'], int(row['grade']), alg_data or None,
+                       int(row.get('priority') or DEFAULT_PRIORITY), _parse_datetime(row['now']))
+
+
+def write_results(f, results):
+    """ Writes ``(user_data, lu, AlgorithmResult)`` tuples to a CSV file. """
+    writer = csv.writer(f)
+    writer.writerow(('user', 'lu') + FIELDS)
+    for user_data, lu, result in results:
+        row = [user_data, lu]
+        for field in FIELDS:
+            value = result.alg_data.get(field)
+            if isinstance(value, datetime):
+                value = value.strftime(DATETIME_FORMAT)
+            row.append('' if value is None else value)
+        writer.writerow(row)
+
+
+def _parse_datetime(value):
+    return datetime.strptime(value, DATETIME_FORMAT)
+
+_FIELD_PARSERS = {'num_reviews': int, 'avg_grade': float, 'difficulty': float, 'status': int,
+                  'last_review': _parse_datetime, 'next_review': _parse_datetime}
+
+
+def main(args=None):
+    parser = OptionParser(usage="%prog [options] input.csv output.csv")
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help="number of worker processes (default: number of CPUs, 0: no workers)")
+    parser.add_option('-c', '--chunk-size', type='int', default=100,
+                      help="number of users sent to the workers at once")
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+                      help="don't report progress")
+    options, args = parser.parse_args(args)
+    if len(args) != 2:
+        parser.error("input and output files are required")
+    report = None if options.quiet else ThroughputReport()
+    with open(args[0], 'rb') as input_file:
+        with open(args[1], 'wb') as output_file:
+            write_results(output_file, reschedule(read_items(input_file), options.processes,
+                                                  options.chunk_size, progress=report))
+    if report is not None:
+        report.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+""" SSRF scheduling with a limit of reviews per day. """
+from datetime import datetime, timedelta
+
+from openmemo.algorithms.ssrf import SSRFAlgorithm, SSRFAlgorithmIndexedGlobalData, SchedulingTrace
+from openmemo.algorithms.workload_calendar import _to_date
+
+
+def get_daily_cap(user_data):
+    """ Returns the ``daily_cap`` attribute of the user data or None. """
+    return getattr(user_data, 'daily_cap', None)
+
+
+class CappedSSRFAlgorithm (SSRFAlgorithm):
+    """ SSRF algorithm which doesn't schedule reviews on days with at least ``daily cap``
+    reviews of the user.
+    
+    The cap is read from the user data by ``daily_cap(user_data)``; if it is None, 
+    the LU is scheduled by SSRFAlgorithm. Otherwise days of the acceptable window 
+    which reached the cap are ineligible and the workload is balanced among the other 
+    days. If all the days reached the cap, the least loaded one (the latest of them) is chosen.
+    
+    Reviews already scheduled on days over the cap (e.g. after an import) can be moved
+    by ``smooth()``.
+    """
+    
+    def __init__(self, global_data, daily_cap=get_daily_cap, *args, **kwargs):
+        """
+        Arguments:
+        daily_cap - returns the max. number of reviews per day for the user data or None
+        
+        See SSRFAlgorithm for the other arguments.
+        """
+        super(CappedSSRFAlgorithm, self).__init__(global_data, *args, **kwargs)
+        self.daily_cap = daily_cap
+
+    def _find_ideal_interval_balancing_workload(self, alg_data, grade, max_interval, priority, today, user_data,
+            global_data, trace=None, min_interval=None):
+        cap = self.daily_cap(user_data)
+        if cap is None:
+            return super(CappedSSRFAlgorithm, self)._find_ideal_interval_balancing_workload(alg_data, grade,
+                max_interval, priority, today, user_data, global_data, trace, min_interval)
+
+        if min_interval is None:
+            min_interval = self._calculate_interval(alg_data['num_reviews'],
+                alg_data['avg_grade'], grade - 1, priority)
+        if self.validate:
+            self._assert_acceptable_intervals(min_interval, max_interval)
+        date_from = today + timedelta(min_interval)
+        date_to = today + timedelta(max_interval)
+        if trace is not None:
+            trace.min_interval = min_interval
+            trace.date_from = date_from
+            trace.date_to = date_to
+
+        min_workload = None
+        if isinstance(global_data, SSRFAlgorithmIndexedGlobalData):
+            # A day with no workload is below any cap
+            if cap > 0:
+                zero_workload_date = global_data.find_last_zero_workload(date_from, date_to, user_data)
+                if zero_workload_date is not None:
+                    ind = (zero_workload_date - date_from).days
+                    return self._capped_result(min_interval, max_interval, ind, SchedulingTrace.ZERO_WORKLOAD,
+                                               trace)
+            # If all the days reached the cap, the least loaded one is found without the workloads
+            min_workload = global_data.get_min_workload(date_from, date_to, user_data)
+            if min_workload >= cap:
+                last_date = global_data.find_last_workload_at_most(date_from, date_to, min_workload, user_data)
+                ind = (last_date - date_from).days
+                return self._capped_result(min_interval, max_interval, ind, SchedulingTrace.DAILY_CAP, trace)
+
+        workloads = self._get_workloads(global_data, min_interval, max_interval, date_from, date_to, user_data)
+        if trace is not None:
+            trace.workloads = workloads
+        eligible = [ind for ind, workload in enumerate(workloads) if workload < cap]
+        if not eligible:
+            # Choose the latest of the least loaded days
+            min_workload = min(workloads)
+            ind = len(workloads) - 1 - workloads[::-1].index(min_workload)
+            return self._capped_result(min_interval, max_interval, ind, SchedulingTrace.DAILY_CAP, trace)
+
+        zero_workload_ind = self._find_last_zero_workload_ind(workloads)
+        if zero_workload_ind is not None:
+            return self._capped_result(min_interval, max_interval, zero_workload_ind,
+                                       SchedulingTrace.ZERO_WORKLOAD, trace)
+
+        avg_difficulties = global_data.get_avg_difficulties(date_from, date_to, user_data)
+        if trace is not None:
+            trace.avg_difficulties = avg_difficulties
+        assert len(avg_difficulties) == len(workloads),\
+        "Avg. difficulties length doesn't match the workloads length"
+        if len(eligible) < len(workloads):
+            workloads = [workloads[ind] for ind in eligible]
+            avg_difficulties = [avg_difficulties[ind] for ind in eligible]
+        intervals = [min_interval + ind for ind in eligible]
+        # The least loaded day is eligible, so the minimum workload is the same for the eligible days
+        ind = eligible[self._find_max_load_reduction_ind(alg_data, intervals, workloads, avg_difficulties,
+                                                         priority, min_workload, trace=trace)]
+        return self._capped_result(min_interval, max_interval, ind, SchedulingTrace.LOAD_BALANCING, trace)
+
+    def _capped_result(self, min_interval, max_interval, ind, branch, trace):
+        ideal_interval = min_interval + ind
+        if trace is not None:
+            trace.chosen_ind = ind
+        if self.validate:
+            self._assert_ideal_interval(ideal_interval, min_interval, max_interval)
+        return ideal_interval, branch
+
+    def smooth(self, items, today, user_data=None, max_shift=0.1):
+        """ Moves reviews scheduled on days over the daily cap of the user to other days.
+        
+        ``items`` is a sequence of ``(alg_data, priority)`` tuples of scheduled LUs of the user.
+        A review is moved by at most ``max_shift`` of its interval (at least by a day), 
+        not before ``today`` and not after its ideal interval, to the least loaded day 
+        below the cap. Reviews with the longest intervals are moved first. LUs without
+        a ``last_review`` (e.g. imported with a next review only) and reviews which can't
+        be moved within the ideal interval (e.g. imported already past it) are not moved.
+        
+        The algorithm data of the moved LUs are updated (``next_review`` and ``difficulty``)
+        and the global data too, if they have a ``move()`` method (e.g. WorkloadCalendar).
+        Returns a list of ``(alg_data, old next review)`` of the moved LUs.
+        """
+        cap = self.daily_cap(user_data)
+        items = [(alg_data, priority) for alg_data, priority in items
+                 if alg_data.get('next_review') is not None and _to_date(alg_data['next_review']) >= today
+                 and alg_data.get('last_review') is not None]
+        if cap is None or not items:
+            return []
+
+        # Acceptable days of each review; a review moved past its ideal interval 
+        # would get a negative difficulty
+        by_day = {}
+        for item in items:
+            alg_data, priority = item
+            day = _to_date(alg_data['next_review'])
+            last_review_day = _to_date(alg_data['last_review'])
+            interval = (day - last_review_day).days
+            shift = max(1, int(interval * max_shift))
+            ideal_interval = self.interval_table.ideal_interval(_previous_num_reviews(alg_data), priority)
+            window = (max(day - timedelta(shift), today, last_review_day + timedelta(1)),
+                      min(day + timedelta(shift), last_review_day + timedelta(ideal_interval)))
+            if window[0] <= window[1]:
+                by_day.setdefault(day, []).append((item, window))
+        if not by_day:
+            return []
+
+        # Workloads of all the days the reviews are scheduled on or can be moved to, requested at once 
+        windows = [window for day_items in by_day.itervalues() for item, window in day_items]
+        date_from = min(min(by_day), min(window[0] for window in windows))
+        date_to = max(max(by_day), max(window[1] for window in windows))
+        workloads = self.global_data.get_workloads(date_from, date_to, user_data)
+        index = lambda day: (day - date_from).days
+        
+        moved = []
+        for day in sorted(by_day):
+            excess = workloads[index(day)] - cap
+            if excess <= 0:
+                continue
+            # Reviews with long intervals are the least affected by a move
+            candidates = sorted(by_day[day], key=lambda candidate: candidate[0][0]['last_review'])
+            for (alg_data, priority), (first_day, last_day) in candidates:
+                if excess <= 0:
+                    break
+                target = None
+                for ind in range(index(first_day), index(last_day) + 1):
+                    if workloads[ind] < cap and (target is None or workloads[ind] <= workloads[target]):
+                        target = ind
+                if target is None:
+                    continue
+                new_day = date_from + timedelta(target)
+                old_next_review, old_difficulty = alg_data['next_review'], alg_data['difficulty']
+                new_next_review = datetime.combine(new_day, old_next_review.time())
+                interval = (new_day - _to_date(alg_data['last_review'])).days
+                alg_data['difficulty'] = self._calculate_difficulty(_previous_num_reviews(alg_data), priority,
+                                                                    interval)
+                alg_data['next_review'] = new_next_review
+                workloads[index(day)] -= 1
+                workloads[target] += 1
+                excess -= 1
+                move = getattr(self.global_data, 'move', None)
+                if move is not None:
+                    move(old_next_review, old_difficulty, new_next_review, alg_data['difficulty'], user_data)
+                moved.append((alg_data, old_next_review))
+        return moved
+
+
+def _previous_num_reviews(alg_data):
+    """ Returns the number of reviews the difficulty of a scheduled LU was calculated for. """
+    return max(alg_data['num_reviews'] - 1, 1)
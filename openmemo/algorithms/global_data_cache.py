@@ -0,0 +1,182 @@
+""" Read-through cache of the SSRF global data. """
+from collections import OrderedDict
+from datetime import timedelta
+
+from openmemo.algorithms.ssrf import SSRFAlgorithmGlobalData
+from openmemo.algorithms.workload_calendar import _to_date
+
+
+class CachingGlobalData (SSRFAlgorithmGlobalData):
+    """ Caches workloads and average difficulties requested from another provider.
+    
+    Each user has a cached range of consecutive days of workloads and another one 
+    of average difficulties. A request inside the range is served from the cache,
+    a request overlapping or adjacent to the range is served by fetching only 
+    the missing days and extending the range, any other request replaces the range.
+    
+    Reviews scheduled while the data are cached must be passed to ``add()``, 
+    ``remove()`` or ``update()``, which update the cached days and call the same 
+    method of the wrapped provider if it has one (e.g. WorkloadCalendar).
+    
+    At most ``max_days`` values are cached; the least recently used users are evicted
+    first, the data of a user which don't fit alone aren't kept. ``hits``, ``partial_hits`` and ``misses`` count the requests served 
+    from the cache only, partially and not at all.
+    """
+    
+    def __init__(self, global_data, max_days=100000):
+        self.global_data = global_data
+        self.max_days = max_days
+        self.hits = self.partial_hits = self.misses = 0
+        self._users = OrderedDict()
+        self._num_days = 0
+
+    def get_workloads(self, from_date, to_date, user_data):
+        return self._get('workloads', self.global_data.get_workloads, _to_date(from_date), _to_date(to_date),
+                         user_data)
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        return self._get('avg_difficulties', self.global_data.get_avg_difficulties, _to_date(from_date),
+                         _to_date(to_date), user_data)
+
+    def add(self, review_date, difficulty, user_data=None):
+        """ Adds a review scheduled on ``review_date``. """
+        self._add(_to_date(review_date), difficulty, user_data)
+        self._write_through('add', review_date, difficulty, user_data)
+
+    def remove(self, review_date, difficulty, user_data=None):
+        """ Removes a review scheduled on ``review_date``. """
+        self._remove(_to_date(review_date), difficulty, user_data)
+        self._write_through('remove', review_date, difficulty, user_data)
+
+    def update(self, result, old_alg_data=None, user_data=None):
+        """ Updates the cache with an AlgorithmResult of a LU, see ``WorkloadCalendar.update()``. """
+        if old_alg_data and old_alg_data.get('next_review') is not None:
+            self._remove(_to_date(old_alg_data['next_review']), old_alg_data.get('difficulty', 0.0), user_data)
+        self._add(_to_date(result.next_review), result.alg_data['difficulty'], user_data)
+        self._write_through('update', result, old_alg_data, user_data)
+
+    def invalidate(self, user_data=None):
+        """ Removes cached data of a user. """
+        cache = self._users.pop(user_data, None)
+        if cache is not None:
+            self._num_days -= cache.num_days()
+
+    def _get(self, name, fetch, from_date, to_date, user_data):
+        assert from_date <= to_date, "from date %s > to date %s" % (from_date, to_date)
+        cache = self._user_cache(user_data)
+        cached = getattr(cache, name)
+        old_num_days = cache.num_days()
+        if cached is None or from_date > cached.date_to() + timedelta(1)\
+                or to_date < cached.date_from - timedelta(1):
+            self.misses += 1
+            cached = _CachedRange(from_date, list(fetch(from_date, to_date, user_data)))
+            setattr(cache, name, cached)
+        elif cached.date_from <= from_date and to_date <= cached.date_to():
+            self.hits += 1
+        else:
+            self.partial_hits += 1
+            if from_date < cached.date_from:
+                cached.values[:0] = fetch(from_date, cached.date_from - timedelta(1), user_data)
+                cached.date_from = from_date
+            if to_date > cached.date_to():
+                cached.values.extend(fetch(cached.date_to() + timedelta(1), to_date, user_data))
+        self._num_days += cache.num_days() - old_num_days
+        values = cached.slice(from_date, to_date)
+        self._evict()
+        return values
+
+    def _add(self, day, difficulty, user_data):
+        cache = self._users.get(user_data)
+        if cache is None:
+            return
+        workload = cache.workload(day)
+        if cache.avg_difficulties is not None and cache.avg_difficulties.contains(day):
+            if workload is None:
+                # The average can't be updated without knowing the workload
+                self._invalidate_avg_difficulties(cache)
+            else:
+                avg_difficulty = cache.avg_difficulties.get(day)
+                cache.avg_difficulties.set(day, (workload * avg_difficulty + difficulty) / (workload + 1))
+        if workload is not None:
+            cache.workloads.set(day, workload + 1)
+
+    def _remove(self, day, difficulty, user_data):
+        cache = self._users.get(user_data)
+        if cache is None:
+            return
+        workload = cache.workload(day)
+        assert workload is None or workload > 0, "no review scheduled on %s" % day
+        if cache.avg_difficulties is not None and cache.avg_difficulties.contains(day):
+            if workload is None:
+                self._invalidate_avg_difficulties(cache)
+            elif workload > 1:
+                avg_difficulty = cache.avg_difficulties.get(day)
+                cache.avg_difficulties.set(day, (workload * avg_difficulty - difficulty) / (workload - 1))
+            else:
+                cache.avg_difficulties.set(day, 0.0)
+        if workload is not None:
+            cache.workloads.set(day, workload - 1)
+
+    def _write_through(self, method, *args):
+        method = getattr(self.global_data, method, None)
+        if method is not None:
+            method(*args)
+
+    def _invalidate_avg_difficulties(self, cache):
+        self._num_days -= len(cache.avg_difficulties.values)
+        cache.avg_difficulties = None
+
+    def _user_cache(self, user_data):
+        cache = self._users.pop(user_data, None)
+        if cache is None:
+            cache = _UserCache()
+        # The most recently used user is the last one
+        self._users[user_data] = cache
+        return cache
+
+    def _evict(self):
+        """ Evicts the least recently used users until the cache fits ``max_days``. """
+        while self._num_days > self.max_days:
+            self.invalidate(next(iter(self._users)))
+
+
+class _UserCache (object):
+    __slots__ = ('workloads', 'avg_difficulties')
+    
+    def __init__(self):
+        self.workloads = None
+        self.avg_difficulties = None
+
+    def workload(self, day):
+        """ Returns the cached workload of a day or None. """
+        if self.workloads is not None and self.workloads.contains(day):
+            return self.workloads.get(day)
+        return None
+
+    def num_days(self):
+        return sum(len(cached.values) for cached in (self.workloads, self.avg_difficulties) if cached is not None)
+
+
+class _CachedRange (object):
+    """ Values of consecutive days starting at ``date_from``. """
+    __slots__ = ('date_from', 'values')
+    
+    def __init__(self, date_from, values):
+        self.date_from = date_from
+        self.values = values
+
+    def date_to(self):
+        return self.date_from + timedelta(len(self.values) - 1)
+
+    def contains(self, day):
+        return 0 <= (day - self.date_from).days < len(self.values)
+
+    def get(self, day):
+        return self.values[(day - self.date_from).days]
+
+    def set(self, day, value):
+        self.values[(day - self.date_from).days] = value
+
+    def slice(self, from_date, to_date):
+        i = (from_date - self.date_from).days
+        return self.values[i:i + (to_date - from_date).days + 1]
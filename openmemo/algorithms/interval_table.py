@@ -0,0 +1,72 @@
+from math import exp
+
+from openmemo.algorithms.algorithm import *
+
+
+class IntervalTable (object):
+    """ Lookup tables for the SSRF inter-repetition interval formula.
+    
+    ::
+        SSRF(n, AG(n-1), G(n), P) = 1 + n ^ (AG(n-1) / 2) * exp(G(n) - P)
+    
+    The scale factors ``exp(G(n) - P)`` are precomputed for all grades 
+    (including -1 used for the min. interval) and priorities. The base intervals
+    ``n ^ (AG(n-1) / 2)`` are calculated lazily, on the first use, for numbers 
+    of reviews up to ``max_num_reviews`` and average grades being multiplies of
+    ``1 / avg_grade_resolution``. Other inputs are calculated exactly on every call,
+    so the table always returns the same intervals as the formula.
+    
+    Ideal intervals (``SSRF(n, 5.0, 5, P)``, see the difficulty formula) are memoized
+    per number of reviews and priority.
+    """
+    
+    def __init__(self, priority_map, max_num_reviews=100, avg_grade_resolution=20):
+        """
+        Arguments:
+        priority_map - maps priorities to the SSRF priority values (P)
+        max_num_reviews - max. number of reviews with tabulated base intervals
+        avg_grade_resolution - number of tabulated average grades per one grade
+        """
+        self.priority_map = dict(priority_map)
+        self.max_num_reviews = max_num_reviews
+        self.avg_grade_resolution = avg_grade_resolution
+        self._max_avg_grade_ind = MAX_GRADE * avg_grade_resolution
+        self._scale_factors = dict(((grade, priority), exp(grade - ssrf_priority))
+                                   for grade in (MIN_GRADE - 1,) + GRADES
+                                   for priority, ssrf_priority in self.priority_map.iteritems())
+        # Rows of base intervals indexed by the number of reviews; 
+        # a row is a list indexed by the avg. grade step
+        self._base_intervals = {}
+        self._ideal_intervals = {}
+
+    def interval(self, num_reviews, avg_grade, grade, priority):
+        """ Returns SSRF(num_reviews, avg_grade, grade, priority). """
+        scale_factor = self._scale_factors.get((grade, priority))
+        if scale_factor is None:
+            scale_factor = exp(grade - self.priority_map[priority])
+        return 1 + int(round(self.base_interval(num_reviews, avg_grade) * scale_factor))
+
+    def ideal_interval(self, num_reviews, priority):
+        """ Returns the interval of an ideal LU, SSRF(num_reviews, 5.0, 5, priority). """
+        key = (num_reviews, priority)
+        interval = self._ideal_intervals.get(key)
+        if interval is None:
+            interval = self._ideal_intervals[key] = self.interval(num_reviews, MAX_GRADE, MAX_GRADE, priority)
+        return interval
+
+    def base_interval(self, num_reviews, avg_grade):
+        """ Returns num_reviews ^ (avg_grade / 2). """
+        if num_reviews <= self.max_num_reviews:
+            step = avg_grade * self.avg_grade_resolution
+            ind = int(step)
+            # Use the table only if the avg. grade is exactly the tabulated one
+            if ind == step and 0 <= ind <= self._max_avg_grade_ind \
+                    and float(ind) / self.avg_grade_resolution == avg_grade:
+                row = self._base_intervals.get(num_reviews)
+                if row is None:
+                    row = self._base_intervals[num_reviews] = [None] * (self._max_avg_grade_ind + 1)
+                base_interval = row[ind]
+                if base_interval is None:
+                    base_interval = row[ind] = num_reviews ** (avg_grade / 2.0)
+                return base_interval
+        return num_reviews ** (avg_grade / 2.0)
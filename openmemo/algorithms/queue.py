@@ -0,0 +1,147 @@
+""" Queue of learning units ordered by their next review. """
+from collections import deque
+import heapq
+import itertools
+
+from openmemo.algorithms.algorithm import FINAL_DRILL
+
+
+class DueQueue (object):
+    """ Learning units of many users ordered by ``next_review``.
+    
+    Each user has a binary heap of (next_review, LU) entries. Updating a LU
+    is O(log n): the old entry is only marked as removed and skipped when
+    it gets to the top of the heap (the heap is compacted when most 
+    of its entries are removed).
+    
+    LUs in the FINAL_DRILL status must be presented again in the same session,
+    so they are additionally kept in a FIFO of drills of their user.
+    
+    LUs are identified by any hashable keys, unique per user.
+    """
+    
+    # Indexes of the entry fields
+    _NEXT_REVIEW, _SEQ, _LU, _REMOVED = range(4)
+    
+    def __init__(self, items=(), user_data=None):
+        """ Creates a queue of ``(lu, next_review)`` items of a user. """
+        self._heaps = {}
+        # (user_data, LU) -> heap entry
+        self._entries = {}
+        self._drills = {}
+        self._num_removed = {}
+        self._counter = itertools.count()
+        items = list(items)
+        if items:
+            heap = self._heaps[user_data] = []
+            for lu, next_review in items:
+                assert (user_data, lu) not in self._entries, "duplicate LU %r" % (lu,)
+                entry = [next_review, next(self._counter), lu, False]
+                self._entries[user_data, lu] = entry
+                heap.append(entry)
+            heapq.heapify(heap)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def contains(self, lu, user_data=None):
+        return (user_data, lu) in self._entries
+
+    def next_review(self, lu, user_data=None):
+        """ Returns the next review of a queued LU. """
+        return self._entries[user_data, lu][self._NEXT_REVIEW]
+
+    def push(self, lu, next_review, user_data=None):
+        """ Adds a LU to the queue or changes its next review. """
+        key = (user_data, lu)
+        if key in self._entries:
+            self._remove_entry(user_data, self._entries.pop(key))
+        entry = [next_review, next(self._counter), lu, False]
+        self._entries[key] = entry
+        heapq.heappush(self._heaps.setdefault(user_data, []), entry)
+
+    def update(self, lu, result, user_data=None):
+        """ Updates a LU with an AlgorithmResult returned by ``schedule()``.
+        
+        A LU in the FINAL_DRILL status is appended to the drills of the user
+        (unless it is already there) and removed from them once it leaves the status.
+        """
+        self.push(lu, result.next_review, user_data)
+        drills = self._drills.get(user_data)
+        if result.alg_data['status'] == FINAL_DRILL:
+            if drills is None:
+                drills = self._drills[user_data] = deque()
+            if lu not in drills:
+                drills.append(lu)
+        elif drills and lu in drills:
+            drills.remove(lu)
+
+    def remove(self, lu, user_data=None):
+        """ Removes a LU from the queue and from the drills. """
+        self._remove_entry(user_data, self._entries.pop((user_data, lu)))
+        drills = self._drills.get(user_data)
+        if drills and lu in drills:
+            drills.remove(lu)
+
+    def pop_due(self, now, user_data=None, limit=None):
+        """ Removes LUs with ``next_review <= now`` from the queue and returns them
+        ordered by the next review (at most ``limit`` LUs). 
+        
+        LUs which should be reviewed again have to be put back by ``update()``.
+        """
+        heap = self._heaps.get(user_data)
+        due = []
+        while heap and (limit is None or len(due) < limit):
+            entry = heap[0]
+            if entry[self._REMOVED]:
+                heapq.heappop(heap)
+                self._num_removed[user_data] -= 1
+                continue
+            if entry[self._NEXT_REVIEW] > now:
+                break
+            heapq.heappop(heap)
+            del self._entries[user_data, entry[self._LU]]
+            due.append(entry[self._LU])
+        return due
+
+    def pop_drill(self, user_data=None):
+        """ Returns the next LU of the final drill of a user or None.
+        
+        The LU stays in the queue (ordered by its next review); it returns to 
+        the drills if its next result still has the FINAL_DRILL status.
+        """
+        drills = self._drills.get(user_data)
+        if not drills:
+            return None
+        return drills.popleft()
+
+    def drills(self, user_data=None):
+        """ Returns LUs waiting for the final drill of a user. """
+        return list(self._drills.get(user_data, ()))
+
+    def peek(self, k=1, user_data=None):
+        """ Returns up to ``k`` ``(next_review, lu)`` tuples of a user with the earliest 
+        next reviews, without removing them. Takes O(k log k) time. 
+        """
+        heap = self._heaps.get(user_data, [])
+        result = []
+        # Heap of (entry, index) of the candidates which can be the next smallest entry
+        candidates = [(heap[0], 0)] if heap else []
+        while candidates and len(result) < k:
+            entry, ind = heapq.heappop(candidates)
+            if not entry[self._REMOVED]:
+                result.append((entry[self._NEXT_REVIEW], entry[self._LU]))
+            for child in (2 * ind + 1, 2 * ind + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (heap[child], child))
+        return result
+
+    def _remove_entry(self, user_data, entry):
+        entry[self._REMOVED] = True
+        heap = self._heaps[user_data]
+        num_removed = self._num_removed[user_data] = self._num_removed.get(user_data, 0) + 1
+        # Compact the heap if most of it are removed entries
+        if num_removed > 16 and 2 * num_removed > len(heap):
+            heap[:] = [entry for entry in heap if not entry[self._REMOVED]]
+            heapq.heapify(heap)
+            self._num_removed[user_data] = 0
@@ -0,0 +1,100 @@
+""" Reconstruction of the SSRF algorithm data from a log of reviews. """
+from collections import namedtuple
+import cPickle as pickle
+from itertools import islice
+import os
+
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+# A logged review of the LU ``lu`` of a user
+ReviewEvent = namedtuple('ReviewEvent', 'user_data lu grade time priority')
+
+
+class ReplayEngine (object):
+    """ Replays a time-ordered log of ReviewEvents through SSRFAlgorithm.
+    
+    The algorithm data of all LUs and a WorkloadCalendar of all users are kept 
+    in memory, so the replay doesn't request any external data. Every 
+    ``checkpoint_interval`` events the state is saved to ``checkpoint_path``
+    (atomically, by renaming a temporary file); ``ReplayEngine.resume()`` 
+    restores it and ``run()`` then skips the events replayed before the checkpoint.
+    """
+    
+    def __init__(self, checkpoint_path=None, checkpoint_interval=100000, algorithm_kwargs=None):
+        """
+        Arguments:
+        algorithm_kwargs - keyword arguments of SSRFAlgorithm; validation is turned off by default
+        """
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.algorithm_kwargs = {'validate': False}
+        self.algorithm_kwargs.update(algorithm_kwargs or {})
+        self.calendar = WorkloadCalendar()
+        # (user_data, lu) -> algorithm data
+        self.alg_data = {}
+        self.num_events = 0
+        self.last_time = None
+        self._create_algorithm()
+
+    @classmethod
+    def resume(cls, checkpoint_path, checkpoint_interval=100000, algorithm_kwargs=None):
+        """ Returns an engine restored from the checkpoint or a new one if there is no checkpoint. """
+        engine = cls(checkpoint_path, checkpoint_interval, algorithm_kwargs)
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'rb') as f:
+                state = pickle.load(f)
+            assert state['algorithm_kwargs'] == engine.algorithm_kwargs, \
+                "checkpoint algorithm arguments %s don't match %s" % (state['algorithm_kwargs'],
+                                                                      engine.algorithm_kwargs)
+            engine.calendar = state['calendar']
+            engine.alg_data = state['alg_data']
+            engine.num_events = state['num_events']
+            engine.last_time = state['last_time']
+            engine._create_algorithm()
+        return engine
+
+    def run(self, events):
+        """ Replays the events, skipping the ones already replayed, and returns the number 
+        of replayed events. ``events`` must be the whole log, including the skipped events. 
+        """
+        events = islice(events, self.num_events, None)
+        num_events = self.num_events
+        for event in events:
+            self.process(event)
+            if self.checkpoint_path is not None and self.num_events % self.checkpoint_interval == 0:
+                self.save_checkpoint()
+        if self.checkpoint_path is not None and self.num_events != num_events:
+            self.save_checkpoint()
+        return self.num_events - num_events
+
+    def process(self, event):
+        """ Replays a single event and returns its AlgorithmResult. """
+        assert self.last_time is None or event.time >= self.last_time, \
+            "event at %s follows an event at %s" % (event.time, self.last_time)
+        key = (event.user_data, event.lu)
+        alg_data = self.alg_data.get(key)
+        old_alg_data = None
+        if alg_data is not None:
+            old_alg_data = {'next_review': alg_data['next_review'], 'difficulty': alg_data['difficulty']}
+        result = self._algorithm.schedule(event.grade, alg_data, event.priority, now=event.time,
+                                          user_data=event.user_data, in_place=alg_data is not None)
+        self.calendar.update(result, old_alg_data, event.user_data)
+        self.alg_data[key] = result.alg_data
+        self.num_events += 1
+        self.last_time = event.time
+        return result
+
+    def save_checkpoint(self):
+        state = {'calendar': self.calendar, 'alg_data': self.alg_data, 'num_events': self.num_events,
+                 'last_time': self.last_time, 'algorithm_kwargs': self.algorithm_kwargs}
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        if os.name == 'nt' and os.path.exists(self.checkpoint_path):
+            # Windows can't rename over an existing file
+            os.remove(self.checkpoint_path)
+        os.rename(temp_path, self.checkpoint_path)
+
+    def _create_algorithm(self):
+        self._algorithm = SSRFAlgorithm(self.calendar, **self.algorithm_kwargs)
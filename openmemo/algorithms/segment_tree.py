@@ -0,0 +1,77 @@
+class MinSegmentTree (object):
+    """ A fixed size array of numbers answering range queries in O(log n):
+    
+    * ``min(i, j)`` - the minimum of values between indexes i and j (both inclusive)
+    * ``find_last(i, j, limit)`` - the last index between i and j (both inclusive) 
+      with a value <= limit
+    
+    Changing a value is O(log n).
+    """
+    
+    def __init__(self, values, capacity=0, fill=0):
+        """
+        Arguments:
+        values - initial values
+        capacity - number of values the tree can keep, at least ``len(values)``
+        fill - value of indexes after the initial values 
+        """
+        size = 1
+        while size < max(len(values), capacity):
+            size *= 2
+        self.capacity = size
+        tree = [fill] * (2 * size)
+        tree[size:size + len(values)] = values
+        for node in range(size - 1, 0, -1):
+            tree[node] = min(tree[2 * node], tree[2 * node + 1])
+        self._tree = tree
+
+    def __getitem__(self, i):
+        return self._tree[self.capacity + i]
+
+    def __setitem__(self, i, value):
+        tree = self._tree
+        node = self.capacity + i
+        tree[node] = value
+        node //= 2
+        while node:
+            new_min = min(tree[2 * node], tree[2 * node + 1])
+            if tree[node] == new_min:
+                break
+            tree[node] = new_min
+            node //= 2
+
+    def min(self, i, j):
+        """ Returns the minimum of values between the indexes (both inclusive). """
+        assert 0 <= i <= j < self.capacity, "invalid range [%s, %s]" % (i, j)
+        tree = self._tree
+        i += self.capacity
+        j += self.capacity + 1
+        result = tree[i]
+        while i < j:
+            if i & 1:
+                result = min(result, tree[i])
+                i += 1
+            if j & 1:
+                j -= 1
+                result = min(result, tree[j])
+            i //= 2
+            j //= 2
+        return result
+
+    def find_last(self, i, j, limit):
+        """ Returns the last index between i and j (both inclusive) with a value <= limit 
+        or None if there is no such index.
+        """
+        assert 0 <= i <= j < self.capacity, "invalid range [%s, %s]" % (i, j)
+        return self._find_last(1, 0, self.capacity - 1, i, j, limit)
+
+    def _find_last(self, node, lo, hi, i, j, limit):
+        if hi < i or j < lo or self._tree[node] > limit:
+            return None
+        if lo == hi:
+            return lo
+        mid = (lo + hi) // 2
+        ind = self._find_last(2 * node + 1, mid + 1, hi, i, j, limit)
+        if ind is None:
+            ind = self._find_last(2 * node, lo, mid, i, j, limit)
+        return ind
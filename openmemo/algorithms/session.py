@@ -0,0 +1,88 @@
+""" Reviews of a study session scheduled with the SSRF algorithm. """
+from datetime import datetime
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf_state import SSRFStateArray
+
+
+class ReviewSession (object):
+    """ Keeps the state of the LUs reviewed in a session of a user, so that only 
+    the final AlgorithmResult of each LU has to be stored at the end of the session.
+    
+    The first grading of a LU in the session is scheduled by the algorithm. The state 
+    of the LU is then kept in a SSRFStateArray owned by the session, and later gradings
+    which the algorithm would only record (the LU is in the final drill or was reviewed
+    within 12 hours) update it directly, without copying and checking the state again.
+    Other gradings are scheduled by the algorithm in place. These short-circuited 
+    gradings are neither traced nor measured.
+    
+    Whenever a LU is scheduled, the session calls ``update(result, old_alg_data, user_data)``
+    of the algorithm global data if it has such a method (e.g. WorkloadCalendar or 
+    CachingGlobalData), so that the next LUs of the session are balanced with it.
+    """
+    
+    def __init__(self, algorithm, user_data=None):
+        self.algorithm = algorithm
+        self.user_data = user_data
+        self._states = SSRFStateArray()
+        # LU -> index of the state
+        self._index = {}
+        self._lus = []
+        self._update_global_data = getattr(algorithm.global_data, 'update', None)
+
+    def __len__(self):
+        return len(self._lus)
+
+    def __contains__(self, lu):
+        return lu in self._index
+
+    def grade(self, lu, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None):
+        """ Records a grade of a LU and returns its AlgorithmResult.
+        
+        ``alg_data`` are the LU algorithm data stored before the session; they are used 
+        for the first grading of the LU only. The algorithm data in the result are 
+        a view of the session state, valid until ``flush()``.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        ind = self._index.get(lu)
+        if ind is None:
+            result = self.algorithm.schedule(grade, alg_data, priority, now=now, user_data=self.user_data)
+            ind = self._index[lu] = len(self._lus)
+            self._lus.append(lu)
+            self._states.append(result.alg_data)
+            self._update(result, alg_data)
+            return AlgorithmResult(result.next_review, self._states.view(ind))
+
+        states = self._states
+        view = states.view(ind)
+        assert grade in GRADES, "grade %s should be one of allowed grades" % grade
+        if states.get(ind, 'status') == FINAL_DRILL:
+            states.set(ind, 'status', FINAL_DRILL if grade in self.algorithm.FINAL_DRILL_GRADES else MEMORIZED)
+            states.set(ind, 'last_review', now)
+            return AlgorithmResult(states.get(ind, 'next_review'), view)
+        if self.algorithm._reviewed_within_12h(view, now):
+            states.set(ind, 'last_review', now)
+            return AlgorithmResult(states.get(ind, 'next_review'), view)
+
+        old_alg_data = {'next_review': view['next_review'], 'difficulty': view['difficulty']}
+        result = self.algorithm.schedule(grade, view, priority, now=now, user_data=self.user_data, in_place=True)
+        self._update(result, old_alg_data)
+        return result
+
+    def flush(self):
+        """ Returns a list of ``(lu, AlgorithmResult)`` with the final results of the LUs 
+        in the order of their first grading and starts a new session. 
+        """
+        results = []
+        for ind, lu in enumerate(self._lus):
+            alg_data = self._states[ind].to_dict()
+            results.append((lu, AlgorithmResult(alg_data['next_review'], alg_data)))
+        self._states = SSRFStateArray()
+        self._index = {}
+        self._lus = []
+        return results
+
+    def _update(self, result, old_alg_data):
+        if self._update_global_data is not None:
+            self._update_global_data(result, old_alg_data, self.user_data)
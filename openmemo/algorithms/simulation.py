@@ -0,0 +1,211 @@
+""" Offline simulation of learning with the SSRF algorithm. 
+
+Forecasts daily workloads, difficulties and retention for a deck to which
+new cards are added every day. The algorithm is driven over a virtual clock
+(the ``now`` parameter of ``schedule()``), with a WorkloadCalendar as global data
+and a pluggable model of the user answers.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from math import exp, log
+import random
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+# Statistics of a simulated day:
+# reviews - number of reviews (including the first reviews of new cards)
+# new_cards - number of new cards
+# drills - number of additional final drill answers
+# avg_difficulty - average difficulty of the cards reviewed that day, after the review
+# retention - average probability of recall of the reviewed cards (new cards excluded)
+#   at the time of the review, None if there were no such cards
+DayStats = namedtuple('DayStats', 'date reviews new_cards drills avg_difficulty retention')
+
+
+class GradeModel (object):
+    """ Model of the user answers used by Simulation. 
+    
+    The model keeps its own state of every card (``memory``), independent
+    of the algorithm data, so the recall depends on the time which really 
+    elapsed since the last review, not on the interval chosen by the algorithm.
+    """
+    
+    def new_memory(self, random):
+        """ Returns the memory state of a new card. ``random`` is a ``random.Random`` instance. """
+        raise NotImplementedError()
+
+    def recall_probability(self, memory, now):
+        """ Returns the probability that the card is recalled at ``now``. """
+        raise NotImplementedError()
+
+    def grade(self, memory, now, random):
+        """ Returns a grade of the card reviewed at ``now`` and updates its memory state. """
+        raise NotImplementedError()
+
+    def drill_grade(self, memory, now, random):
+        """ Returns a grade of the card repeated during the final drill and updates its memory state. """
+        raise NotImplementedError()
+
+
+class ExponentialForgettingModel (GradeModel):
+    """ Recall probability decays exponentially with the time since the last review.
+    
+    Memory of a card is ``[last_review, stability, growth]``; the recall probability 
+    equals ``retention`` after ``stability`` days. A recalled card gets one of 
+    ``recall_grades`` (sorted, the higher the more probable the recall was)
+    and its stability grows by up to ``growth`` times (less if it was reviewed 
+    before ``stability`` days). A forgotten card gets one of ``forget_grades`` 
+    and its stability drops by ``lapse`` times. The growth of each card 
+    is drawn from ``growth_range``.
+    """
+    
+    def __init__(self, retention=0.9, recall_grades=(3, 4, 5), forget_grades=(0, 1, 2),
+                 new_grades=GRADES, drill_recall_probability=0.8, initial_stability=3.0,
+                 growth_range=(2.0, 4.0), lapse=0.3):
+        self.retention = retention
+        self.recall_grades = recall_grades
+        self.forget_grades = forget_grades
+        self.new_grades = new_grades
+        self.drill_recall_probability = drill_recall_probability
+        self.initial_stability = initial_stability
+        self.growth_range = growth_range
+        self.lapse = lapse
+        self._log_retention = log(retention)
+
+    def new_memory(self, random):
+        return [None, self.initial_stability, random.uniform(*self.growth_range)]
+
+    def recall_probability(self, memory, now):
+        last_review, stability, growth = memory
+        if last_review is None:
+            return 0.0
+        return exp(self._log_retention * _days(now - last_review) / stability)
+
+    def grade(self, memory, now, random):
+        last_review, stability, growth = memory
+        memory[0] = now
+        if last_review is None:
+            grade = random.choice(self.new_grades)
+            if grade not in self.recall_grades:
+                memory[1] = self.initial_stability * self.lapse
+            return grade
+        elapsed = _days(now - last_review)
+        recall_probability = exp(self._log_retention * elapsed / stability)
+        if random.random() < recall_probability:
+            memory[1] = stability * (1 + (growth - 1) * min(elapsed / stability, 1.0))
+            recall_grades = self.recall_grades
+            return recall_grades[min(int(recall_probability * len(recall_grades)), len(recall_grades) - 1)]
+        memory[1] = max(stability * self.lapse, self.initial_stability * self.lapse)
+        return random.choice(self.forget_grades)
+
+    def drill_grade(self, memory, now, random):
+        memory[0] = now
+        if random.random() < self.drill_recall_probability:
+            return random.choice(self.recall_grades)
+        return random.choice(self.forget_grades)
+
+
+class Simulation (object):
+    """ Simulates daily reviews of a deck growing by ``new_cards_per_day`` cards.
+    
+    Cards due on a day are kept in a bucket of that day and scheduled together
+    with ``SSRFAlgorithm.schedule_many()``, so a simulated day costs time 
+    proportional to the number of reviews, not to the deck size.
+    A card failed during a review is drilled until it gets a recall grade 
+    (at most ``max_drills`` times); a card still in the final drill or scheduled
+    for the same day is presented again the next day, its ``next_review`` 
+    is moved there.
+    """
+    
+    def __init__(self, grade_model=None, new_cards_per_day=50, priority=DEFAULT_PRIORITY,
+                 start=None, seed=0, max_drills=10, algorithm=None):
+        """
+        Arguments:
+        grade_model - GradeModel; ExponentialForgettingModel by default
+        algorithm - SSRFAlgorithm using the simulation calendar as global data;
+        by default created without validation
+        """
+        self.grade_model = grade_model or ExponentialForgettingModel()
+        self.new_cards_per_day = new_cards_per_day
+        self.priority = priority
+        self.now = start or datetime(2000, 1, 1, 9, 0)
+        self.random = random.Random(seed)
+        self.max_drills = max_drills
+        self.calendar = WorkloadCalendar()
+        self.algorithm = algorithm or SSRFAlgorithm(self.calendar, validate=False)
+        self.cards = []
+        # Memory states of the cards (see GradeModel)
+        self.memories = []
+        # Date -> list of indexes of the cards due on that date
+        self._due = {}
+
+    def run(self, num_days):
+        """ Simulates ``num_days`` days and returns a list of DayStats. """
+        stats = []
+        for i in xrange(num_days):
+            stats.append(self.step())
+        return stats
+
+    def step(self):
+        """ Simulates the current day, advances the clock and returns DayStats. """
+        grade_model, random, cards, memories = self.grade_model, self.random, self.cards, self.memories
+        now = self.now
+        today = now.date()
+        tomorrow = now + timedelta(1)
+        due = self._due.pop(today, [])
+        first_new = len(cards)
+        cards.extend(None for i in xrange(self.new_cards_per_day))
+        memories.extend(grade_model.new_memory(random) for i in xrange(self.new_cards_per_day))
+        reviewed = due + range(first_new, len(cards))
+
+        # Recall is sampled at the time of the review, before the memory is updated 
+        recall_probability_sum = 0.0
+        for card in due:
+            recall_probability_sum += grade_model.recall_probability(memories[card], now)
+        items = [(grade_model.grade(memories[card], now, random), cards[card], self.priority)
+                 for card in reviewed]
+        results = self.algorithm.schedule_many(items, now=now)
+
+        difficulty_sum = 0.0
+        drills = 0
+        for card, result in zip(reviewed, results):
+            alg_data = result.alg_data
+            drills += self._drill(memories[card], alg_data, now)
+            if alg_data['next_review'] < tomorrow:
+                alg_data['next_review'] = tomorrow
+            self.calendar.update(AlgorithmResult(alg_data['next_review'], alg_data), cards[card])
+            cards[card] = alg_data
+            self._due.setdefault(alg_data['next_review'].date(), []).append(card)
+            difficulty_sum += alg_data['difficulty']
+        num_reviews = len(reviewed)
+        self.now = tomorrow
+        return DayStats(today, num_reviews, self.new_cards_per_day, drills,
+                        difficulty_sum / num_reviews if num_reviews else 0.0,
+                        recall_probability_sum / len(due) if due else None)
+
+    def forecast(self, num_days):
+        """ Returns the number of reviews already scheduled for the next ``num_days`` days. """
+        today = self.now.date()
+        return self.calendar.get_workloads(today, today + timedelta(num_days - 1), None)
+
+    def _drill(self, memory, alg_data, now):
+        """ Drills a card in the final drill (updating ``alg_data``) and returns the number of drills. """
+        if alg_data['status'] != FINAL_DRILL:
+            return 0
+        # A drill only updates the status by the grade, so the answers are drawn 
+        # until a recall grade and the algorithm gets the last one
+        final_drill_grades = self.algorithm.FINAL_DRILL_GRADES
+        drills = 0
+        while drills < self.max_drills:
+            drills += 1
+            grade = self.grade_model.drill_grade(memory, now, self.random)
+            if grade not in final_drill_grades:
+                break
+        self.algorithm.schedule(grade, alg_data, self.priority, now=now, in_place=True)
+        return drills
+
+
+def _days(delta):
+    return delta.days + delta.seconds / 86400.0
@@ -1,12 +1,21 @@
 from datetime import date, timedelta, datetime, time
 import logging
-from math import exp, log
+from math import log
 import sys
+from timeit import default_timer
 
 from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.interval_table import IntervalTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 logger = logging.getLogger(__name__)
 
+_12_HOURS = timedelta(hours=12)
+
 ##class SSRFAlgorithmLUData (Bunch):
 #    """ SSRF algorithm parameters for a single learning unit.
 #
@@ -45,6 +54,259 @@ class SSRFAlgorithmGlobalData (AlgorithmGlobalData):
         raise NotImplementedError()
 
 
+class SSRFAlgorithmIndexedGlobalData (SSRFAlgorithmGlobalData):
+    """ Interface implemented by global LU data providers which answer range queries
+    about workloads and average difficulties without returning the whole range.
+    
+    If the provider implements it, the SSRF algorithm doesn't request the workloads
+    when there is a day with no workload and doesn't calculate minimums of the ranges.
+    """
+    
+    def find_last_zero_workload(self, from_date, to_date, user_data):
+        """ Returns the last date between from and to date with no items scheduled 
+        or None if there are items scheduled on every date. 
+        """
+        
+        raise NotImplementedError()
+    
+    def get_min_workload(self, from_date, to_date, user_data):
+        """ Returns ``min(self.get_workloads(from_date, to_date, user_data))``. """
+        
+        raise NotImplementedError()
+    
+    def get_min_avg_difficulty(self, from_date, to_date, user_data):
+        """ Returns ``min(self.get_avg_difficulties(from_date, to_date, user_data))``. """
+        
+        raise NotImplementedError()
+
+    def find_last_workload_at_most(self, from_date, to_date, max_workload, user_data):
+        """ Returns the last date between from and to date with at most ``max_workload`` items
+        scheduled or None if there are more items scheduled on every date.
+        
+        The default implementation searches ``get_workloads()``; providers answering
+        the other queries from an index should answer this one from it too.
+        """
+        workloads = self.get_workloads(from_date, to_date, user_data)
+        for ind in range(len(workloads) - 1, -1, -1):
+            if workloads[ind] <= max_workload:
+                return from_date + timedelta(ind)
+        return None
+
+
+class SchedulingTrace (object):
+    """ Details of a single ``SSRFAlgorithm.schedule()`` call.
+    
+    A trace is recorded only if debug logging of this module is enabled.
+    It is logged once, at the end of the call; the log record keeps it
+    in the ``ssrf_trace`` attribute. Attributes of the steps not executed 
+    in the call are None.
+    """
+    
+    # Branches of the algorithm which can decide about the next review
+    FINAL_DRILL = 'final drill'
+    REVIEWED_WITHIN_12H = 'reviewed within 12h'
+    ESTIMATED = 'estimated'
+    ZERO_WORKLOAD = 'zero workload'
+    LOAD_BALANCING = 'load balancing'
+    # All days of the window reached the daily cap (see openmemo.algorithms.daily_cap)
+    DAILY_CAP = 'daily cap'
+    
+    __slots__ = ('grade', 'priority', 'input_alg_data', 'branch', 'min_interval', 'max_interval',
+                 'date_from', 'date_to', 'workloads', 'avg_difficulties', 'load_coeffs', 'new_difficulties',
+                 'new_avg_difficulties', 'new_load_coeffs', 'load_coeff_rel', 'chosen_ind', 'ideal_interval',
+                 'output_alg_data')
+    
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def record_load_reduction(self, load_coeffs, new_difficulties, new_avg_difficulties, new_load_coeffs,
+                              load_coeff_rel, chosen_ind):
+        self.load_coeffs = load_coeffs
+        self.new_difficulties = new_difficulties
+        self.new_avg_difficulties = new_avg_difficulties
+        self.new_load_coeffs = new_load_coeffs
+        self.load_coeff_rel = load_coeff_rel
+        self.chosen_ind = chosen_ind
+
+    def __str__(self):
+        return "\n".join("%s: %s" % (name, getattr(self, name)) for name in self.__slots__
+                         if getattr(self, name) is not None)
+
+
+class _WindowGlobalData (SSRFAlgorithmGlobalData):
+    """ Workloads and average difficulties of a date range requested once 
+    from another provider and updated in memory with the items scheduled 
+    in this range. Used by ``SSRFAlgorithm.schedule_many()``.
+    """
+    
+    def __init__(self, global_data, date_from, date_to, user_data):
+        self._global_data = global_data
+        self._date_from = date_from
+        self._date_to = date_to
+        self._user_data = user_data
+        self._workloads = list(global_data.get_workloads(date_from, date_to, user_data))
+        # Average difficulties are requested on the first use only;
+        # until then the added items are remembered as (index, difficulty) 
+        self._avg_difficulties = None
+        self._pending = []
+
+    def get_workloads(self, from_date, to_date, user_data):
+        return self._workloads[self._index(from_date):self._index(to_date) + 1]
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        if self._avg_difficulties is None:
+            self._fetch_avg_difficulties()
+        return self._avg_difficulties[self._index(from_date):self._index(to_date) + 1]
+
+    def add(self, review_date, difficulty):
+        """ Adds an item scheduled on ``review_date`` with the given difficulty. """
+        ind = self._index(review_date)
+        if self._avg_difficulties is None:
+            self._pending.append((ind, difficulty))
+            self._workloads[ind] += 1
+        else:
+            self._add_difficulty(ind, difficulty)
+
+    def _fetch_avg_difficulties(self):
+        self._avg_difficulties = list(self._global_data.get_avg_difficulties(self._date_from,
+            self._date_to, self._user_data))
+        assert len(self._avg_difficulties) == len(self._workloads), \
+            "Avg. difficulties length doesn't match the workloads length"
+        # Replay items added before the average difficulties were known
+        for ind, difficulty in self._pending:
+            self._workloads[ind] -= 1
+        for ind, difficulty in self._pending:
+            self._add_difficulty(ind, difficulty)
+        self._pending = []
+
+    def _add_difficulty(self, ind, difficulty):
+        workload = self._workloads[ind]
+        self._avg_difficulties[ind] = (workload * self._avg_difficulties[ind] + difficulty) / (workload + 1)
+        self._workloads[ind] = workload + 1
+
+    def _index(self, day):
+        assert self._date_from <= day <= self._date_to, \
+            "date %s should be between %s and %s" % (day, self._date_from, self._date_to)
+        return (day - self._date_from).days
+
+
+class _Measurement (object):
+    """ Durations of the phases of a single ``SSRFAlgorithm.schedule()`` call.
+    
+    Requests to the global data provider are measured by a wrapper of the provider,
+    each provider method is a separate phase. The checks of an algorithm with ``validate``
+    set are measured by its ``_assert_*`` methods (see ``_measured_class()``) as 
+    the ``validation`` phase. The time not spent in the other phases is 
+    the ``calculation`` phase.
+    """
+    
+    def __init__(self):
+        self.start = self._phase_start = default_timer()
+        self.durations = {}
+        self.window_size = None
+        self._validation_start = None
+        self._validation_depth = 0
+
+    def wrap(self, global_data):
+        if isinstance(global_data, SSRFAlgorithmIndexedGlobalData):
+            return _MeasuredIndexedGlobalData(global_data, self)
+        return _MeasuredGlobalData(global_data, self)
+
+    def end_phase(self, phase):
+        now = default_timer()
+        self.add(phase, now - self._phase_start)
+        self._phase_start = now
+
+    def add(self, phase, duration):
+        self.durations[phase] = self.durations.get(phase, 0.0) + duration
+
+    def start_validation(self):
+        if self._validation_depth == 0:
+            self._validation_start = default_timer()
+        self._validation_depth += 1
+
+    def end_validation(self):
+        self._validation_depth -= 1
+        if self._validation_depth == 0:
+            duration = default_timer() - self._validation_start
+            self.add('validation', duration)
+            # The checks are not a part of the phase ended by end_phase()
+            self._phase_start += duration
+
+    def record(self, metrics, branch):
+        total = default_timer() - self.start
+        self.durations['calculation'] = total - sum(self.durations.itervalues())
+        self.durations['total'] = total
+        metrics.record(branch, self.durations, self.window_size)
+
+
+# Subclasses of the algorithm classes which measure their checks, by algorithm class
+_measured_classes = {}
+
+
+def _measured_class(cls):
+    """ Returns a subclass of the algorithm class whose ``_assert_*`` methods add their 
+    duration to the ``validation`` phase of the ``_measurement`` of the instance.
+    """
+    measured_class = _measured_classes.get(cls)
+    if measured_class is None:
+        checks = dict((name, _measured_check(getattr(cls, name).im_func))
+                      for name in dir(cls) if name.startswith('_assert_'))
+        measured_class = _measured_classes[cls] = type(cls)(cls.__name__, (cls,), checks)
+    return measured_class
+
+
+def _measured_check(check):
+    def measured_check(self, *args):
+        measurement = self._measurement
+        measurement.start_validation()
+        try:
+            return check(self, *args)
+        finally:
+            measurement.end_validation()
+    measured_check.__name__ = check.__name__
+    return measured_check
+
+
+class _MeasuredGlobalData (SSRFAlgorithmGlobalData):
+    """ Measures requests to another provider. """
+    
+    def __init__(self, global_data, measurement):
+        self._global_data = global_data
+        self._measurement = measurement
+
+    def get_workloads(self, from_date, to_date, user_data):
+        return self._call('get_workloads', from_date, to_date, user_data)
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        return self._call('get_avg_difficulties', from_date, to_date, user_data)
+
+    def _call(self, method, from_date, to_date, *args):
+        measurement = self._measurement
+        if measurement.window_size is None:
+            measurement.window_size = (to_date - from_date).days + 1
+        start = default_timer()
+        try:
+            return getattr(self._global_data, method)(from_date, to_date, *args)
+        finally:
+            measurement.add(method, default_timer() - start)
+
+
+class _MeasuredIndexedGlobalData (_MeasuredGlobalData, SSRFAlgorithmIndexedGlobalData):
+    def find_last_zero_workload(self, from_date, to_date, user_data):
+        return self._call('find_last_zero_workload', from_date, to_date, user_data)
+
+    def get_min_workload(self, from_date, to_date, user_data):
+        return self._call('get_min_workload', from_date, to_date, user_data)
+
+    def get_min_avg_difficulty(self, from_date, to_date, user_data):
+        return self._call('get_min_avg_difficulty', from_date, to_date, user_data)
+
+    def find_last_workload_at_most(self, from_date, to_date, max_workload, user_data):
+        return self._call('find_last_workload_at_most', from_date, to_date, max_workload, user_data)
+
+
 class SSRFAlgorithm (Algorithm):
     """ 
     Acknowledgments
@@ -237,28 +499,121 @@ class SSRFAlgorithm (Algorithm):
     }
 
     _DEFAULT_AVG_GRADE = 2.5
+
+    # Windows shorter than that are faster evaluated in pure Python
+    NUMPY_MIN_WINDOW = 64
     
-    def __init__(self, global_data, *args, **kwargs):
+    def __init__(self, global_data, use_numpy=True, interval_table=None, validate=True, priority_map=None,
+                 default_avg_grade=None, *args, **kwargs):
+        """ 
+        Arguments:
+        use_numpy - evaluate load coefficients of long windows with NumPy;
+        pure Python is used if NumPy is not installed.
+        interval_table - IntervalTable used for calculating intervals; 
+        by default a table with the default size is created
+        validate - check preconditions and postconditions of all the calculations;
+        if False, only the grade, priority and LU algorithm data passed to ``schedule()``
+        are checked
+        priority_map - maps priorities to the SSRF priority values (P); 
+        ``_PRIORITY_MAP`` by default
+        default_avg_grade - average grade of a new LU; ``_DEFAULT_AVG_GRADE`` by default
+        metrics - AlgorithmMetrics recording the branch of each call (one of the 
+        SchedulingTrace branches), the durations of the phases (``prepare``, 
+        the global data provider methods, ``validation`` - all the checks - if ``validate`` 
+        is set, ``calculation`` and ``total``) and the window size
+        """
         super(SSRFAlgorithm, self).__init__(global_data, *args, **kwargs)
+        self.use_numpy = use_numpy and numpy is not None
+        self.validate = validate
+        self.priority_map = dict(priority_map if priority_map is not None else self._PRIORITY_MAP)
+        self.default_avg_grade = default_avg_grade if default_avg_grade is not None else self._DEFAULT_AVG_GRADE
+        if interval_table is None:
+            interval_table = IntervalTable(self.priority_map)
+        assert interval_table.priority_map == self.priority_map, \
+            "interval table priority map %s doesn't match %s" % (interval_table.priority_map, self.priority_map)
+        self.interval_table = interval_table
 
-    def schedule(self, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None, estimated=False, user_data=None):
+    def schedule(self, grade, alg_data=None, priority=DEFAULT_PRIORITY, now=None, estimated=False, user_data=None,
+                 in_place=False):
         """ Calculates next repetition for a LU and sets ``next_review`` field.
         
+        ``alg_data`` can be a dict or any object with the same interface,
+        e.g. ``openmemo.algorithms.ssrf_state.SSRFState`` or ``SSRFStateView``.
+        By default it is copied; if ``in_place`` is True, it is updated and 
+        returned in the result without copying.
+        
         See the class docstring for an exact description of the scheduling algorithm. 
         """
-        if alg_data is None:
-            alg_data = {}
-        else:
-            alg_data = alg_data.copy()
-        alg_data = self._fill_initial_algorithm_data(alg_data)
+        return self._schedule(self.global_data, grade, alg_data, priority, now, estimated, user_data, in_place)
 
-        logger.debug("Input LU data: %s", alg_data)
+    def schedule_many(self, items, now=None, user_data=None):
+        """ Calculates next repetitions for many LUs reviewed at the same time.
         
-        # Check preconditions
-        self._assert_grade(grade)
-        self._assert_priority(priority)
-        self._assert_alg_data(alg_data)
+        ``items`` is a sequence of ``(grade, alg_data, priority)`` tuples.
+        Returns a list of AlgorithmResult in the order of ``items``. The results
+        are the same as of calling ``schedule()`` for each item in turn with
+        the global data reflecting the previously scheduled items.
+        
+        Workloads and average difficulties are requested from the global data
+        provider once, for the union of the acceptable intervals of all items.
+        Each scheduled item is then added to that window in memory, so later
+        items see earlier placements.
+        """
+        items = list(items)
+        if now is None:
+            now = datetime.utcnow()
+        today = now.date()
+
+        # Find acceptable intervals of the items which are going to be balanced
+        windows = [self._find_acceptable_intervals(grade, alg_data, priority, now)
+                   for grade, alg_data, priority in items]
+        balanced_windows = [window for window in windows if window is not None]
+        if not balanced_windows:
+            global_data = self.global_data
+        else:
+            date_from = today + timedelta(min(window[0] for window in balanced_windows))
+            date_to = today + timedelta(max(window[1] for window in balanced_windows))
+            global_data = _WindowGlobalData(self.global_data, date_from, date_to, user_data)
+
+        results = []
+        for (grade, alg_data, priority), window in zip(items, windows):
+            result = self._schedule(global_data, grade, alg_data, priority, now, False, user_data,
+                                    acceptable_intervals=window)
+            if window is not None:
+                global_data.add(result.next_review.date(), result.alg_data['difficulty'])
+            results.append(result)
+        return results
+
+    def _schedule(self, global_data, grade, alg_data, priority, now, estimated, user_data, in_place=False,
+                  acceptable_intervals=None):
+        """ Schedules a LU; ``acceptable_intervals`` are the intervals found by 
+        ``_find_acceptable_intervals()`` for the same arguments, if they were. 
+        """
+        # Phases of the call are measured only if there are metrics to record them
+        if self.metrics is None:
+            return self._schedule_measured(None, global_data, grade, alg_data, priority, now, estimated, user_data,
+                                           in_place, acceptable_intervals)
+        measurement = _Measurement()
+        algorithm = self
+        if self.validate:
+            # The call is made by a copy of the algorithm measuring its checks
+            algorithm = object.__new__(_measured_class(type(self)))
+            algorithm.__dict__.update(self.__dict__)
+            algorithm._measurement = measurement
+        return algorithm._schedule_measured(measurement, measurement.wrap(global_data), grade, alg_data, priority,
+                                            now, estimated, user_data, in_place, acceptable_intervals)
+
+    def _schedule_measured(self, measurement, global_data, grade, alg_data, priority, now, estimated, user_data,
+                           in_place, acceptable_intervals=None):
+        alg_data = self._prepare_alg_data(grade, alg_data, priority, in_place)
+        if measurement is not None:
+            measurement.end_phase('prepare')
         
+        # Details of the calculations are recorded only if they are going to be logged
+        trace = None
+        if logger.isEnabledFor(logging.DEBUG):
+            trace = SchedulingTrace(grade=grade, priority=priority, input_alg_data=alg_data.copy())
+
         if now is None:
             now = datetime.utcnow()
         today = now.date()
@@ -267,24 +622,27 @@ class SSRFAlgorithm (Algorithm):
         # Update simply it's status depending on the current grade
         if alg_data['status'] == FINAL_DRILL:
             self._update_alg_data_status(alg_data, grade)
-            logger.debug("Output LU data: %s", alg_data)
             alg_data['last_review'] = now
-            return AlgorithmResult(alg_data['next_review'], alg_data)
+            return self._result(alg_data['next_review'], alg_data, trace, SchedulingTrace.FINAL_DRILL, measurement)
 
-        last_review = alg_data.get('last_review')
-        if last_review and last_review >= now - timedelta(hours=12):
-            logger.debug("Already reviewed within 12h")
+        if self._reviewed_within_12h(alg_data, now):
             alg_data['last_review'] = now
-            return AlgorithmResult(alg_data['next_review'], alg_data)
+            return self._result(alg_data['next_review'], alg_data, trace, SchedulingTrace.REVIEWED_WITHIN_12H,
+                                measurement)
 
-        # Calculate maximum acceptable repetion interval
-        max_interval = self._calculate_interval(alg_data['num_reviews'],
-            alg_data['avg_grade'], grade, priority)
+        # Calculate maximum acceptable repetion interval (schedule_many() has it already)
+        min_interval = None
+        if acceptable_intervals is not None:
+            min_interval, max_interval = acceptable_intervals
+        else:
+            max_interval = self._calculate_interval(alg_data['num_reviews'],
+                alg_data['avg_grade'], grade, priority)
         if estimated:
             ideal_interval = max_interval
+            branch = SchedulingTrace.ESTIMATED
         else:
-            ideal_interval = self._find_ideal_interval_balancing_workload(alg_data, grade, max_interval, priority, today,
-                user_data)
+            ideal_interval, branch = self._find_ideal_interval_balancing_workload(alg_data, grade, max_interval,
+                priority, today, user_data, global_data, trace, min_interval)
 
         # Set a new schedule date based on the ideal interval
         next_review = datetime.combine(today + timedelta(ideal_interval), now.time())
@@ -293,39 +651,115 @@ class SSRFAlgorithm (Algorithm):
         self._update_alg_data_after_scheduling(alg_data, now, ideal_interval, grade, priority, next_review)
         self._update_alg_data_status(alg_data, grade)
 
-        logger.debug("Output algorithm data: %s", alg_data)
-        
         # Check postconditions
-        self._assert_alg_data(alg_data)
+        if self.validate:
+            self._assert_alg_data(alg_data)
+
+        if trace is not None:
+            trace.max_interval = max_interval
+            trace.ideal_interval = ideal_interval
+        return self._result(next_review, alg_data, trace, branch, measurement)
 
+    def _result(self, next_review, alg_data, trace, branch, measurement=None):
+        """ Returns AlgorithmResult, logs the trace and records the measurement, if they were made. """
+        if trace is not None:
+            trace.branch = branch
+            trace.output_alg_data = alg_data.copy()
+            logger.debug("Scheduling trace:\n%s", trace, extra={'ssrf_trace': trace})
+        if measurement is not None:
+            measurement.record(self.metrics, branch)
         return AlgorithmResult(next_review, alg_data)
 
-    def _find_ideal_interval_balancing_workload(self, alg_data, grade, max_interval, priority, today, user_data):
+    def _prepare_alg_data(self, grade, alg_data, priority, in_place=False):
+        """ Returns the LU algorithm data (a copy unless ``in_place``) filled with initial values and checked. """
+        if alg_data is None:
+            alg_data = {}
+        elif not in_place:
+            alg_data = alg_data.copy()
+        alg_data = self._fill_initial_algorithm_data(alg_data)
+
+        # Check preconditions (always, even if the calculations are not validated)
+        self._assert_grade(grade)
+        self._assert_priority(priority)
+        self._assert_alg_data(alg_data)
+        return alg_data
+
+    def _reviewed_within_12h(self, alg_data, now):
+        last_review = alg_data.get('last_review')
+        return bool(last_review and last_review >= now - _12_HOURS)
+
+    def _find_acceptable_intervals(self, grade, alg_data, priority, now):
+        """ Returns a (min. interval, max. interval) tuple or None if the LU 
+        is not going to be scheduled by balancing the workload. 
+        """
+        self._assert_grade(grade)
+        self._assert_priority(priority)
+        # The LU data are checked later by _schedule(), read them with the initial values as defaults
+        if alg_data is None:
+            num_reviews, avg_grade = 1, self.default_avg_grade
+        else:
+            if alg_data.get('status', MEMORIZED) == FINAL_DRILL or self._reviewed_within_12h(alg_data, now):
+                return None
+            num_reviews = alg_data.get('num_reviews', 1)
+            avg_grade = alg_data.get('avg_grade', self.default_avg_grade)
+        min_interval = self._calculate_interval(num_reviews, avg_grade, grade - 1, priority)
+        max_interval = self._calculate_interval(num_reviews, avg_grade, grade, priority)
+        return min_interval, max_interval
+
+    def _find_ideal_interval_balancing_workload(self, alg_data, grade, max_interval, priority, today, user_data,
+            global_data, trace=None, min_interval=None):
+        """ Returns the ideal interval and the branch of the algorithm which found it. 
+        
+        The minimum acceptable interval is calculated if not given.
+        """
         # Calculate minimum acceptable repetition interval
-        min_interval = self._calculate_interval(alg_data['num_reviews'],
-            alg_data['avg_grade'], grade - 1, priority)
-        logger.debug("Min/max acceptable intervals: %d/%d", min_interval, max_interval)
-        assert min_interval <= max_interval,\
-        "min. interval %s > max. interval %s" % (min_interval, max_interval)
+        if min_interval is None:
+            min_interval = self._calculate_interval(alg_data['num_reviews'],
+                alg_data['avg_grade'], grade - 1, priority)
+        if self.validate:
+            self._assert_acceptable_intervals(min_interval, max_interval)
 
-        # Get daily workloads for dates between min. and max. interval
         date_from = today + timedelta(min_interval)
         date_to = today + timedelta(max_interval)
-        workloads = self.global_data.get_workloads(date_from, date_to, user_data)
-        logger.debug("Workloads (from/to: %s/%s): %s", date_from, date_to, workloads)
-        assert len(workloads) == max_interval - min_interval + 1,\
-            "Workloads length doesn't match the number of days between min. and max. interval"
+        if trace is not None:
+            trace.min_interval = min_interval
+            trace.date_from = date_from
+            trace.date_to = date_to
+        indexed = isinstance(global_data, SSRFAlgorithmIndexedGlobalData)
+        if indexed:
+            # Ask the provider for the last day with no workload
+            zero_workload_date = global_data.find_last_zero_workload(date_from, date_to, user_data)
+            zero_workload_ind = None
+            if zero_workload_date is not None:
+                zero_workload_ind = (zero_workload_date - date_from).days
+        else:
+            # Get daily workloads for dates between min. and max. interval
+            workloads = self._get_workloads(global_data, min_interval, max_interval, date_from, date_to, user_data)
+            if trace is not None:
+                trace.workloads = workloads
+
+            # Check if there is a day with no workload
+            zero_workload_ind = self._find_last_zero_workload_ind(workloads)
 
-        # Check if there is a day with no workload
-        zero_workload_ind = self._find_last_zero_workload_ind(workloads)
         if zero_workload_ind != None:
             # If true, this is the ideal interval
             ideal_interval = min_interval + zero_workload_ind
+            branch = SchedulingTrace.ZERO_WORKLOAD
+            if trace is not None:
+                trace.chosen_ind = zero_workload_ind
         else:
+            min_workload = min_avg_difficulty = None
+            if indexed:
+                workloads = self._get_workloads(global_data, min_interval, max_interval, date_from, date_to, user_data)
+                min_workload = global_data.get_min_workload(date_from, date_to, user_data)
+                min_avg_difficulty = global_data.get_min_avg_difficulty(date_from, date_to, user_data)
+                if trace is not None:
+                    trace.workloads = workloads
+
             # Get daily difficulties for dates between min. and max. interval
-            avg_difficulties = self.global_data.get_avg_difficulties(date_from, date_to, user_data)
-            logger.debug("Avg. difficulties (from/to: %s/%s): %s",
-                date_from, date_to, avg_difficulties)
+            avg_difficulties = global_data.get_avg_difficulties(date_from, date_to, user_data)
+            if trace is not None:
+                trace.avg_difficulties = avg_difficulties
             assert len(avg_difficulties) == len(workloads),\
             "Avg. difficulties length doesn't match the workloads length"
 
@@ -333,12 +767,18 @@ class SSRFAlgorithm (Algorithm):
             max_load_reduction_ind = self._find_max_load_reduction_ind(alg_data,
                 range(min_interval, max_interval + 1),
                 workloads,
-                avg_difficulties, priority)
+                avg_difficulties, priority, min_workload, min_avg_difficulty, trace)
             ideal_interval = min_interval + max_load_reduction_ind
-        assert min_interval <= ideal_interval <= max_interval,\
-        "ideal interval should be between min. and max. interval"
-        logger.debug("Ideal interval: %d", ideal_interval)
-        return ideal_interval
+            branch = SchedulingTrace.LOAD_BALANCING
+        if self.validate:
+            self._assert_ideal_interval(ideal_interval, min_interval, max_interval)
+        return ideal_interval, branch
+
+    def _get_workloads(self, global_data, min_interval, max_interval, date_from, date_to, user_data):
+        workloads = global_data.get_workloads(date_from, date_to, user_data)
+        assert len(workloads) == max_interval - min_interval + 1,\
+            "Workloads length doesn't match the number of days between min. and max. interval"
+        return workloads
 
 
     def _calculate_interval(self, num_reviews, prev_avg_grade, grade, priority):
@@ -347,27 +787,25 @@ class SSRFAlgorithm (Algorithm):
         See the class docstring for an exact description of the method. 
         """
         # Check preconditions
-        self._assert_num_reviews(num_reviews)
-        self._assert_avg_grade(prev_avg_grade)
-        assert grade in (MIN_GRADE - 1,) + GRADES, \
-            "grade %s should be -1 or one of allowed grades" % grade
-        self._assert_priority(priority)
+        if self.validate:
+            self._assert_num_reviews(num_reviews)
+            self._assert_avg_grade(prev_avg_grade)
+            self._assert_interval_grade(grade)
+            self._assert_priority(priority)
         
-        overlearning_factor = 1
-        base_interval = num_reviews ** (prev_avg_grade / 2.0)
-        ssrf_priority = self._PRIORITY_MAP[priority]
-        scale_factor = exp(grade - ssrf_priority)
-        interval = overlearning_factor + int(round(base_interval * scale_factor))
+        interval = self.interval_table.interval(num_reviews, prev_avg_grade, grade, priority)
         
         # Check postconditions
-        self._assert_interval(interval)
+        if self.validate:
+            self._assert_interval(interval)
         
         return interval 
 
     def _find_last_zero_workload_ind(self, workloads):
         """ Finds an index of the last zero workload or None if all workloads are greater than 0. """
         # Check preconditions
-        self._assert_workloads(workloads)
+        if self.validate:
+            self._assert_workloads(workloads)
 
         # If there is no zero workload 0, return None
         if 0 not in workloads:
@@ -379,83 +817,245 @@ class SSRFAlgorithm (Algorithm):
         last_zero_workload_ind = (len(workloads) - 1) - rev_workloads.index(0)
         
         # Check postconditions
-        assert 0 <= last_zero_workload_ind <= (len(workloads) - 1), \
-            "Zero workload index %s should one of the valid workload indexes"  % last_zero_workload_ind
+        if self.validate:
+            self._assert_zero_workload_ind(last_zero_workload_ind, len(workloads))
 
         return last_zero_workload_ind
         
-    def _find_max_load_reduction_ind(self, alg_data, intervals, workloads, avg_difficulties, priority):
+    def _find_max_load_reduction_ind(self, alg_data, intervals, workloads, avg_difficulties, priority,
+                                     min_workload=None, min_avg_difficulty=None, trace=None):
         """ Finds an index of the maximum load reduction in case the repetition 
         of the current LU was added to the schedule described with workloads and avg. difficulties.
+        
+        The minimum workload and avg. difficulty are calculated if not given.
+        Intermediate results are recorded in the trace, if given.
         """
+        if self.use_numpy and len(workloads) >= self.NUMPY_MIN_WINDOW:
+            return self._find_max_load_reduction_ind_numpy(alg_data, intervals, workloads,
+                avg_difficulties, priority, min_workload, min_avg_difficulty, trace)
+        if trace is None:
+            return self._find_max_load_reduction_ind_single_pass(alg_data, intervals, workloads,
+                avg_difficulties, priority, min_workload, min_avg_difficulty)
+
         # Check preconditions
-        self._assert_alg_data(alg_data)
-        self._assert_intervals(intervals)
-        self._assert_workloads(workloads)
-        self._assert_avg_difficulties(avg_difficulties)
+        if self.validate:
+            self._assert_alg_data(alg_data)
+            self._assert_intervals(intervals)
+            self._assert_workloads(workloads)
+            self._assert_avg_difficulties(avg_difficulties)
 
         # Calculate load coefficients for each date
-        load_coeffs = self._calculate_load_coeffs(workloads, avg_difficulties)
-        logger.debug("Load coefficients: %s", load_coeffs)
+        load_coeffs = self._calculate_load_coeffs(workloads, avg_difficulties, min_workload, min_avg_difficulty)
         
         # Calculate daily workloads and average difficulties in case 
         # the repetition of current LU was scheduled on min. - max. interval dates
-        new_workloads = map(lambda workload: workload + 1, workloads)
-        logger.debug("New workloads: %s", new_workloads)
-        def new_avg_difficulty(interval, workload, avg_difficulty, new_workload):
-            new_difficulty = self._calculate_difficulty(alg_data['num_reviews'],
-                                              priority,
-                                              interval)
-            logger.debug("New difficulty for the interval %d: %s", interval, new_difficulty)
-            return (workload * avg_difficulty + new_difficulty) / new_workload 
-        new_avg_difficulties = map(new_avg_difficulty, 
-                                   intervals, workloads, avg_difficulties, new_workloads)
-        logger.debug("New avg. difficulties: %s", new_avg_difficulties)
+        new_workloads = [workload + 1 for workload in workloads]
+        num_reviews = alg_data['num_reviews']
+        new_difficulties = [self._calculate_difficulty(num_reviews, priority, interval) for interval in intervals]
+        new_avg_difficulties = [(workload * avg_difficulty + new_difficulty) / new_workload
+                                for workload, avg_difficulty, new_difficulty, new_workload
+                                in zip(workloads, avg_difficulties, new_difficulties, new_workloads)]
         
         # Calculate load coefficient for each date in case of LU repeated on this date
         new_load_coeffs = self._calculate_load_coeffs(new_workloads, new_avg_difficulties)
-        logger.debug("New load coefficients: %s", new_load_coeffs)
         
         # Choose the date with the maximum load coefficient reduction
-        load_coeff_rel = map(lambda coeff1, coeff2: coeff1 / coeff2 if coeff2 != 0 else sys.maxint, 
-                             new_load_coeffs, load_coeffs)
-        logger.debug("Load coefficient relations (new to old): %s", load_coeff_rel)
-        load_coeff_rel.reverse()
-        max_load_reduction_ind = (len(load_coeff_rel) - 1) - load_coeff_rel.index(min(load_coeff_rel))
+        load_coeff_rel = [coeff1 / coeff2 if coeff2 != 0 else sys.maxint
+                          for coeff1, coeff2 in zip(new_load_coeffs, load_coeffs)]
+        rev_load_coeff_rel = load_coeff_rel[::-1]
+        max_load_reduction_ind = (len(load_coeff_rel) - 1) - rev_load_coeff_rel.index(min(rev_load_coeff_rel))
+
+        if trace is not None:
+            trace.record_load_reduction(load_coeffs, new_difficulties, new_avg_difficulties, new_load_coeffs,
+                                        load_coeff_rel, max_load_reduction_ind)
         
         # Check postconditions
-        assert 0 <= max_load_reduction_ind <= len(load_coeffs) - 1, \
-            "Max. load coefficient reduction index %s should one of the valid load coefficient indexes"  % max_load_reduction_ind
+        if self.validate:
+            self._assert_max_load_reduction_ind(max_load_reduction_ind, len(load_coeffs))
         
         return max_load_reduction_ind
 
-    def _calculate_load_coeffs(self, workloads, avg_difficulties):
+    def _find_max_load_reduction_ind_single_pass(self, alg_data, intervals, workloads, avg_difficulties, priority,
+                                                 min_workload=None, min_avg_difficulty=None):
+        """ Version of ``_find_max_load_reduction_ind()`` which doesn't build the intermediate lists.
+        
+        The minimum of the new workloads is the minimum workload + 1, so only the new
+        avg. difficulties are calculated in advance (their minimum is needed for the new 
+        load coefficients). The load coefficients before and after adding the LU, their ratio 
+        and the best date are then calculated in a single pass.
+        """
+        # Check preconditions
+        if self.validate:
+            self._assert_alg_data(alg_data)
+            self._assert_intervals(intervals)
+            self._assert_workloads(workloads)
+            self._assert_avg_difficulties(avg_difficulties)
+            self._assert_window_lengths(workloads, avg_difficulties, intervals)
+
+        if min_workload is None:
+            min_workload = min(workloads)
+        if min_avg_difficulty is None:
+            min_avg_difficulty = min(avg_difficulties)
+        min_workload = float(min_workload)
+        min_difficulty = float(min_avg_difficulty)
+        new_min_workload = min_workload + 1
+
+        ideal_interval = self.interval_table.ideal_interval(alg_data['num_reviews'], priority)
+        if self.validate:
+            self._assert_max_interval(max(intervals), ideal_interval)
+        new_avg_difficulties = [(workload * avg_difficulty + log((ideal_interval + 1.0) / (interval + 1.0)))
+                                / (workload + 1)
+                                for workload, avg_difficulty, interval in zip(workloads, avg_difficulties, intervals)]
+        new_min_difficulty = float(min(new_avg_difficulties))
+
+        # Choose the latest date with the maximum load coefficient reduction.
+        # Only the ratio of the coefficients matters, so they are compared without halving 
+        # them and the squares are multiplications
+        validate = self.validate
+        maxint = sys.maxint
+        max_load_reduction_ind = 0
+        min_load_coeff_rel = float('inf')
+        for ind, (workload, avg_difficulty, new_avg_difficulty) in enumerate(zip(workloads, avg_difficulties,
+                                                                                 new_avg_difficulties)):
+            load_coeff = 0.0
+            if workload != 0:
+                coeff = min_workload / workload - 1
+                load_coeff = coeff * coeff
+            if avg_difficulty != 0.0:
+                coeff = min_difficulty / avg_difficulty - 1
+                load_coeff += coeff * coeff
+            coeff = new_min_workload / (workload + 1) - 1
+            new_load_coeff = coeff * coeff
+            if new_avg_difficulty != 0.0:
+                coeff = new_min_difficulty / new_avg_difficulty - 1
+                new_load_coeff += coeff * coeff
+            if validate:
+                assert 0.0 <= load_coeff <= 2.0 and 0.0 <= new_load_coeff <= 2.0, \
+                    "load coefficients %s and %s should be between 0.0 and 1.0" % (load_coeff / 2,
+                                                                                    new_load_coeff / 2)
+            load_coeff_rel = new_load_coeff / load_coeff if load_coeff != 0 else maxint
+            if load_coeff_rel <= min_load_coeff_rel:
+                min_load_coeff_rel = load_coeff_rel
+                max_load_reduction_ind = ind
+
+        # Check postconditions
+        if self.validate:
+            self._assert_max_load_reduction_ind(max_load_reduction_ind, len(workloads))
+
+        return max_load_reduction_ind
+
+    def _find_max_load_reduction_ind_numpy(self, alg_data, intervals, workloads, avg_difficulties, priority,
+                                           min_workload=None, min_avg_difficulty=None, trace=None):
+        """ NumPy version of ``_find_max_load_reduction_ind()``. 
+        
+        The whole window is evaluated with array operations. The ideal interval
+        is calculated once instead of once per date.
+        """
+        # fromiter() converts lists about twice as fast as asarray()
+        num_days = len(workloads)
+        intervals = numpy.fromiter(intervals, float, num_days)
+        workloads = numpy.fromiter(workloads, float, num_days)
+        avg_difficulties = numpy.fromiter(avg_difficulties, float, num_days)
+
+        # Check preconditions
+        if self.validate:
+            self._assert_alg_data(alg_data)
+            self._assert_window_arrays(intervals, workloads, avg_difficulties)
+
+        # Calculate load coefficients for each date
+        load_coeffs = self._calculate_load_coeffs_numpy(workloads, avg_difficulties, min_workload,
+            min_avg_difficulty)
+
+        # Calculate daily workloads and average difficulties in case 
+        # the repetition of current LU was scheduled on min. - max. interval dates
+        new_workloads = workloads + 1
+        ideal_interval = self.interval_table.ideal_interval(alg_data['num_reviews'], priority)
+        new_difficulties = numpy.log((ideal_interval + 1.0) / (intervals + 1.0))
+        if self.validate:
+            self._assert_difficulty_array(new_difficulties)
+        new_avg_difficulties = (workloads * avg_difficulties + new_difficulties) / new_workloads
+
+        # Calculate load coefficient for each date in case of LU repeated on this date
+        new_load_coeffs = self._calculate_load_coeffs_numpy(new_workloads, new_avg_difficulties)
+
+        # Choose the latest date with the maximum load coefficient reduction
+        nonzero = load_coeffs != 0
+        load_coeff_rel = numpy.where(nonzero, new_load_coeffs / numpy.where(nonzero, load_coeffs, 1.0), sys.maxint)
+        max_load_reduction_ind = (len(load_coeff_rel) - 1) - int(numpy.argmin(load_coeff_rel[::-1]))
+
+        if trace is not None:
+            trace.record_load_reduction(load_coeffs.tolist(), new_difficulties.tolist(),
+                                        new_avg_difficulties.tolist(), new_load_coeffs.tolist(),
+                                        load_coeff_rel.tolist(), max_load_reduction_ind)
+
+        # Check postconditions
+        if self.validate:
+            self._assert_max_load_reduction_ind(max_load_reduction_ind, len(load_coeffs))
+
+        return max_load_reduction_ind
+
+    def _calculate_load_coeffs_numpy(self, workloads, avg_difficulties, min_workload=None, min_difficulty=None):
+        """ NumPy version of ``_calculate_load_coeffs()``; takes and returns float arrays. """
+        if min_workload is None:
+            min_workload = workloads.min()
+        if min_difficulty is None:
+            min_difficulty = avg_difficulties.min()
+        # Zero divisors are replaced with ones and their coefficients are zeroed,
+        # which is much cheaper for short windows than numpy.errstate(); the fixed 
+        # cost of the operations dominates, so the temporary arrays are reused
+        nonzero_workloads = workloads != 0
+        nonzero_difficulties = avg_difficulties != 0.0
+        load_coeffs = min_workload / numpy.where(nonzero_workloads, workloads, 1.0)
+        load_coeffs -= 1.0
+        load_coeffs *= load_coeffs
+        load_coeffs *= nonzero_workloads
+        difficulty_coeffs = min_difficulty / numpy.where(nonzero_difficulties, avg_difficulties, 1.0)
+        difficulty_coeffs -= 1.0
+        difficulty_coeffs *= difficulty_coeffs
+        difficulty_coeffs *= nonzero_difficulties
+        load_coeffs += difficulty_coeffs
+        load_coeffs *= 0.5
+
+        # Check postconditions
+        if self.validate:
+            self._assert_load_coeff_array(load_coeffs)
+
+        return load_coeffs
+
+    def _calculate_load_coeffs(self, workloads, avg_difficulties, min_workload=None, min_difficulty=None):
         """ Calcuates load coefficients based on workloads and averages difficulties.
          
         See the class docstring for an exact description of the method. 
+        The minimum workload and avg. difficulty are calculated if not given.
         """
         # Check preconditions
-        self._assert_workloads(workloads)
-        self._assert_avg_difficulties(avg_difficulties)
-        assert len(avg_difficulties) == len(workloads), \
-             "Avg. difficulties length doesn't match the workloads length"
+        if self.validate:
+            self._assert_workloads(workloads)
+            self._assert_avg_difficulties(avg_difficulties)
+            self._assert_window_lengths(workloads, avg_difficulties)
         
-        min_workload = float(min(workloads))
-        min_difficulty = float(min(avg_difficulties))
+        if min_workload is None:
+            min_workload = min(workloads)
+        if min_difficulty is None:
+            min_difficulty = min(avg_difficulties)
+        min_workload = float(min_workload)
+        min_difficulty = float(min_difficulty)
         calculate_load_coeffs = lambda workload, avg_difficulty: \
             (((min_workload / workload - 1) ** 2 if workload != 0 else 0.0) + \
              ((min_difficulty / avg_difficulty - 1) ** 2 if avg_difficulty != 0.0 else 0.0)) / 2
         load_coeffs = map(calculate_load_coeffs, workloads, avg_difficulties)
 
         # Check postconditions
-        self._assert_load_coeffs(load_coeffs)
+        if self.validate:
+            self._assert_load_coeffs(load_coeffs)
         
         return load_coeffs 
 
     def _update_alg_data_after_scheduling(self, alg_data, now, ideal_interval, grade, priority, next_review):
         """ Updates the LU algorithm parameters after a successful scheduling. """
         # Check preconditions
-        self._assert_alg_data(alg_data)
+        if self.validate:
+            self._assert_alg_data(alg_data)
         
         new_num_reviews = alg_data['num_reviews'] + 1
         new_avg_grade = (alg_data['avg_grade'] * alg_data['num_reviews'] + grade) / new_num_reviews
@@ -469,7 +1069,8 @@ class SSRFAlgorithm (Algorithm):
         alg_data['next_review'] = next_review
 
         # Check postconditions
-        self._assert_alg_data(alg_data)
+        if self.validate:
+            self._assert_alg_data(alg_data)
 
     def _update_alg_data_status(self, alg_data, grade):
         """ Updates the LU status depending on the last grade. 
@@ -477,7 +1078,7 @@ class SSRFAlgorithm (Algorithm):
         A LU can be drilled during the same learning session or can be marked
         as memorized (it will be recalled on the scheduled repetition date.
         """
-        if grade in SSRFAlgorithm.FINAL_DRILL_GRADES:
+        if grade in self.FINAL_DRILL_GRADES:
             alg_data['status'] = FINAL_DRILL
         else:
             alg_data['status'] = MEMORIZED
@@ -488,18 +1089,17 @@ class SSRFAlgorithm (Algorithm):
         See the class docstring for an exact description of the method. 
         """
         # Check preconditions
-        self._assert_num_reviews(num_reviews)
-        self._assert_priority(priority)
-        self._assert_interval(last_interval)
+        if self.validate:
+            self._assert_num_reviews(num_reviews)
+            self._assert_priority(priority)
+            self._assert_interval(last_interval)
         
-        ideal_interval = self._calculate_interval(num_reviews, 
-                                        MAX_GRADE, 
-                                        MAX_GRADE, 
-                                        priority)
+        ideal_interval = self.interval_table.ideal_interval(num_reviews, priority)
         difficulty = log((ideal_interval + 1.0) / (last_interval + 1.0))
         
         # Check postconditions
-        self._assert_difficulty(difficulty)
+        if self.validate:
+            self._assert_difficulty(difficulty)
         
         return difficulty
 
@@ -531,7 +1131,24 @@ class SSRFAlgorithm (Algorithm):
 
     def _assert_intervals(self, intervals):
         for interval in intervals:
-            self._assert_interval(interval)
+            assert interval >= 1, "interval %s should be >= 1" % interval
+
+    def _assert_interval_grade(self, grade):
+        assert grade in (MIN_GRADE - 1,) + GRADES, \
+            "grade %s should be -1 or one of allowed grades" % grade
+
+    def _assert_acceptable_intervals(self, min_interval, max_interval):
+        assert min_interval <= max_interval,\
+            "min. interval %s > max. interval %s" % (min_interval, max_interval)
+
+    def _assert_ideal_interval(self, ideal_interval, min_interval, max_interval):
+        assert min_interval <= ideal_interval <= max_interval,\
+            "ideal interval should be between min. and max. interval"
+
+    def _assert_max_interval(self, max_interval, ideal_interval):
+        assert ideal_interval >= max_interval, \
+            "all difficulties should be >= 0.0 (ideal interval %s < max. interval %s)" % (ideal_interval,
+                                                                                      max_interval)
         
     def _assert_workloads(self, workloads):
         for workload in workloads:
@@ -547,17 +1164,48 @@ class SSRFAlgorithm (Algorithm):
             assert 0.0 <= load_coeff <= 1.0, \
                 "all load coefficients %s should be between 0.0 and 1.0"  % load_coeffs
 
+    def _assert_window_lengths(self, workloads, avg_difficulties, intervals=None):
+        assert len(avg_difficulties) == len(workloads), \
+            "Avg. difficulties length doesn't match the workloads length"
+        assert intervals is None or len(intervals) == len(workloads), \
+            "Intervals length doesn't match the workloads length"
+
+    def _assert_window_arrays(self, intervals, workloads, avg_difficulties):
+        assert (intervals >= 1).all(), "all intervals %s should be >= 1" % intervals
+        assert (workloads >= 0).all(), "all workloads %s should be >= 0" % workloads
+        assert (avg_difficulties >= 0.0).all(), \
+            "all avg. difficulties %s should be >= 0" % avg_difficulties
+        self._assert_window_lengths(workloads, avg_difficulties, intervals)
+
+    def _assert_difficulty_array(self, difficulties):
+        assert (difficulties >= 0.0).all(), \
+            "all difficulties %s should be >= 0.0" % difficulties
+
+    def _assert_load_coeff_array(self, load_coeffs):
+        assert ((load_coeffs >= 0.0) & (load_coeffs <= 1.0)).all(), \
+            "all load coefficients %s should be between 0.0 and 1.0"  % load_coeffs
+
+    def _assert_zero_workload_ind(self, zero_workload_ind, num_days):
+        assert 0 <= zero_workload_ind <= num_days - 1, \
+            "Zero workload index %s should one of the valid workload indexes"  % zero_workload_ind
+
+    def _assert_max_load_reduction_ind(self, max_load_reduction_ind, num_days):
+        assert 0 <= max_load_reduction_ind <= num_days - 1, \
+            "Max. load coefficient reduction index %s should one of the valid load coefficient indexes" \
+            % max_load_reduction_ind
+
     def _fill_initial_algorithm_data(self, alg_data=None):
         """ Fills the initial SSRF algorithm parameters for a newly created LU. """
         alg_data = alg_data if alg_data is not None else {}
         alg_data.setdefault('num_reviews', 1)
-        alg_data.setdefault('avg_grade', SSRFAlgorithm._DEFAULT_AVG_GRADE)
+        alg_data.setdefault('avg_grade', self.default_avg_grade)
         alg_data.setdefault('difficulty', 0.0)
         alg_data.setdefault('status', MEMORIZED)
         
         # check postconditions
-        self._assert_alg_data(alg_data)
+        if self.validate:
+            self._assert_alg_data(alg_data)
         return alg_data
 
     def get_difficulty(self, alg_data):
-        return alg_data['difficulty']
\ No newline at end of file
+        return alg_data['difficulty']
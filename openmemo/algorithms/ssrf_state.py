@@ -0,0 +1,198 @@
+from array import array
+from datetime import datetime, timedelta
+
+# SSRF algorithm parameters of a single learning unit
+FIELDS = ('num_reviews', 'avg_grade', 'difficulty', 'status', 'last_review', 'next_review')
+
+
+class _AlgorithmDataMapping (object):
+    """ Dict-like access to the SSRF algorithm parameters kept as attributes.
+    
+    ``SSRFAlgorithm`` uses only these methods, so the subclasses can be passed
+    to ``schedule()`` instead of dicts. A parameter with None value is treated
+    as missing.
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, _AlgorithmDataMapping)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def get(self, key, default=None):
+        if key not in FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def setdefault(self, key, default=None):
+        value = self.get(key)
+        if value is None:
+            self[key] = value = default
+        return value
+
+    def keys(self):
+        return [key for key in FIELDS if getattr(self, key) is not None]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def copy(self):
+        return SSRFState(**self.to_dict())
+
+    def to_dict(self):
+        """ Returns the parameters in the dict format used by ``SSRFAlgorithm``. """
+        return dict(self.items())
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join("%s=%r" % (key, value) for key, value in self.items()))
+
+
+class SSRFState (_AlgorithmDataMapping):
+    """ SSRF algorithm parameters of a single LU.
+    
+    A compact (no per-instance dict) alternative to the dict returned 
+    in ``AlgorithmResult.alg_data``.
+    """
+    __slots__ = FIELDS
+    
+    def __init__(self, num_reviews=None, avg_grade=None, difficulty=None, status=None,
+                 last_review=None, next_review=None):
+        self.num_reviews = num_reviews
+        self.avg_grade = avg_grade
+        self.difficulty = difficulty
+        self.status = status
+        self.last_review = last_review
+        self.next_review = next_review
+
+    @classmethod
+    def from_dict(cls, alg_data):
+        """ Creates a state from the dict format used by ``SSRFAlgorithm``. """
+        return cls(**dict((key, alg_data.get(key)) for key in FIELDS))
+
+
+_EPOCH = datetime(1970, 1, 1)
+_NAN = float('nan')
+
+
+def _encode_datetime(value):
+    if value is None:
+        return _NAN
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000.0 + delta.microseconds
+
+
+def _decode_datetime(value):
+    if value != value:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _encode_float(value):
+    return _NAN if value is None else value
+
+
+def _decode_float(value):
+    return None if value != value else value
+
+
+# (array type code, encode, decode) per field; 
+# missing values are kept as 0 reviews, NaN and -1 status
+_CODECS = {
+    'num_reviews': ('l', lambda value: value or 0, lambda value: value or None),
+    'avg_grade': ('d', _encode_float, _decode_float),
+    'difficulty': ('d', _encode_float, _decode_float),
+    'status': ('b', lambda value: -1 if value is None else value, lambda value: None if value == -1 else value),
+    'last_review': ('d', _encode_datetime, _decode_datetime),
+    'next_review': ('d', _encode_datetime, _decode_datetime),
+}
+
+
+class SSRFStateArray (object):
+    """ SSRF algorithm parameters of many LUs kept in one array per parameter.
+    
+    Dates are kept as microseconds since the epoch. Items are read and written
+    as SSRFState objects or dicts; ``view()`` returns an object which reads and
+    writes the parameters of an item directly in the arrays, so it can be
+    passed to ``SSRFAlgorithm.schedule()`` with ``in_place=True``.
+    """
+    
+    def __init__(self, states=()):
+        for field in FIELDS:
+            setattr(self, field, array(_CODECS[field][0]))
+        self.extend(states)
+
+    def __len__(self):
+        return len(self.num_reviews)
+
+    def __getitem__(self, ind):
+        return SSRFState(**dict((field, self.get(ind, field)) for field in FIELDS))
+
+    def __setitem__(self, ind, alg_data):
+        for field in FIELDS:
+            self.set(ind, field, alg_data.get(field))
+
+    def __iter__(self):
+        for ind in xrange(len(self)):
+            yield self[ind]
+
+    def append(self, alg_data):
+        """ Appends parameters of a LU given as SSRFState or a dict. """
+        for field in FIELDS:
+            getattr(self, field).append(_CODECS[field][1](alg_data.get(field)))
+
+    def extend(self, states):
+        for alg_data in states:
+            self.append(alg_data)
+
+    def get(self, ind, field):
+        return _CODECS[field][2](getattr(self, field)[ind])
+
+    def set(self, ind, field, value):
+        getattr(self, field)[ind] = _CODECS[field][1](value)
+
+    def view(self, ind):
+        """ Returns SSRFStateView of the item. """
+        return SSRFStateView(self, ind)
+
+
+def _view_property(field):
+    def fget(self):
+        return self.states.get(self.ind, field)
+    def fset(self, value):
+        self.states.set(self.ind, field, value)
+    return property(fget, fset)
+
+
+class SSRFStateView (_AlgorithmDataMapping):
+    """ SSRF algorithm parameters of a single item of SSRFStateArray. 
+    
+    Changing the parameters changes the array.
+    """
+    __slots__ = ('states', 'ind')
+    
+    def __init__(self, states, ind):
+        self.states = states
+        self.ind = ind
+
+for _field in FIELDS:
+    setattr(SSRFStateView, _field, _view_property(_field))
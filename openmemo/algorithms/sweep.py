@@ -0,0 +1,180 @@
+""" Evaluation of SSRF algorithm parameters on recorded review histories.
+
+Each parameter set is used to replay all the histories in a separate process: 
+the recorded reviews of each user are passed to ``SSRFAlgorithm.schedule()`` 
+in the order of their time, with a WorkloadCalendar of the user as global data.
+The scheduled intervals and the daily numbers of reviews in the calendars
+at the end of the replay are summarized in a SweepResult.
+
+Usage: python -m openmemo.algorithms.sweep [options] reviews.csv parameters.json
+
+The reviews CSV file has a header with the columns ``user``, ``lu``, ``grade``, 
+``time`` and ``priority``. The parameters JSON file contains a list of objects 
+with the ``name`` and optionally ``priority_map`` (e.g. ``{"-1": 2.0, "0": 3.0, "1": 4.0}``) 
+and ``default_avg_grade`` keys.
+"""
+from collections import namedtuple
+import csv
+from datetime import datetime
+import json
+from math import sqrt
+import multiprocessing
+from optparse import OptionParser
+import sys
+
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+
+# A recorded review of a LU
+Review = namedtuple('Review', 'lu grade time priority')
+
+# SSRFAlgorithm parameters; None means the default value
+ParameterSet = namedtuple('ParameterSet', 'name priority_map default_avg_grade')
+
+# Statistics of the replayed histories:
+# mean_interval, median_interval, p90_interval - statistics of the scheduled intervals in days
+# mean_workload - average number of reviews scheduled on a day of a user
+# workload_cv - coefficient of variation (std. deviation / mean) of the daily numbers 
+#   of scheduled reviews, averaged over users; the lower, the smoother the workload
+# max_workload - the maximum number of reviews scheduled on a day of a user
+# The workloads are the next reviews of the LUs, read from the calendars after the replay
+# (between the first and the last day with a review).
+SweepResult = namedtuple('SweepResult', 'name reviews mean_interval median_interval p90_interval '
+                                        'mean_workload workload_cv max_workload')
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def sweep(histories, parameter_sets, processes=None):
+    """ Replays the histories with each ParameterSet and returns a list of SweepResults
+    in the order of ``parameter_sets``. 
+    
+    ``histories`` is a dict mapping users to lists of Reviews. The parameter sets 
+    are evaluated in ``processes`` worker processes (in this process if 0).
+    """
+    parameter_sets = list(parameter_sets)
+    if processes == 0:
+        return [replay(histories, parameter_set) for parameter_set in parameter_sets]
+    # The histories are sent to each worker once
+    pool = multiprocessing.Pool(processes, _init_worker, (histories,))
+    try:
+        results = pool.map(_replay_in_worker, parameter_sets, chunksize=1)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+    return results
+
+
+_worker_histories = None
+
+
+def _init_worker(histories):
+    global _worker_histories
+    _worker_histories = histories
+
+
+def _replay_in_worker(parameter_set):
+    return replay(_worker_histories, parameter_set)
+
+
+def replay(histories, parameter_set):
+    """ Replays the histories with a ParameterSet and returns a SweepResult. """
+    intervals = []
+    workload_cvs = []
+    daily_workloads = []
+    for user_data in sorted(histories):
+        calendar = WorkloadCalendar()
+        algorithm = SSRFAlgorithm(calendar, validate=False, priority_map=parameter_set.priority_map,
+                                  default_avg_grade=parameter_set.default_avg_grade)
+        alg_data = {}
+        for review in sorted(histories[user_data], key=lambda review: review.time):
+            old_alg_data = alg_data.get(review.lu)
+            if old_alg_data is not None:
+                old_alg_data = {'next_review': old_alg_data['next_review'], 'difficulty': old_alg_data['difficulty']}
+            result = algorithm.schedule(review.grade, alg_data.get(review.lu), review.priority, now=review.time,
+                                        user_data=user_data, in_place=review.lu in alg_data)
+            calendar.update(result, old_alg_data, user_data)
+            alg_data[review.lu] = result.alg_data
+            # Reviews in the final drill or repeated within 12h keep their next review
+            if old_alg_data is None or result.next_review != old_alg_data['next_review']:
+                intervals.append((result.next_review - review.time).days)
+        if alg_data:
+            # The calendar keeps only the next review of each LU
+            days = [lu_alg_data['next_review'].date() for lu_alg_data in alg_data.itervalues()]
+            workloads = calendar.get_workloads(min(days), max(days), user_data)
+            daily_workloads.extend(workloads)
+            workload_cvs.append(_cv(workloads))
+    intervals.sort()
+    num_reviews = sum(len(reviews) for reviews in histories.itervalues())
+    return SweepResult(parameter_set.name, num_reviews, 
+                       _mean(intervals), _percentile(intervals, 50), _percentile(intervals, 90),
+                       _mean(daily_workloads), _mean(workload_cvs), max(daily_workloads or [0]))
+
+
+def _mean(values):
+    return float(sum(values)) / len(values) if values else 0.0
+
+
+def _cv(values):
+    mean = _mean(values)
+    if not mean:
+        return 0.0
+    return sqrt(_mean([(value - mean) ** 2 for value in values])) / mean
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * percent // 100)]
+
+
+def read_histories(f):
+    """ Reads a dict of users' review histories from a CSV file. """
+    histories = {}
+    for row in csv.DictReader(f):
+        review = Review(row['lu'], int(row['grade']), datetime.strptime(row['time'], DATETIME_FORMAT),
+                        int(row.get('priority') or DEFAULT_PRIORITY))
+        histories.setdefault(row['user'], []).append(review)
+    return histories
+
+
+def read_parameter_sets(f):
+    """ Reads a list of ParameterSets from a JSON file. """
+    parameter_sets = []
+    for params in json.load(f):
+        priority_map = params.get('priority_map')
+        if priority_map is not None:
+            priority_map = dict((int(priority), float(value)) for priority, value in priority_map.iteritems())
+        parameter_sets.append(ParameterSet(params['name'], priority_map, params.get('default_avg_grade')))
+    return parameter_sets
+
+
+def format_results(results):
+    lines = ["%-20s %8s %8s %8s %8s %9s %8s %8s" % ('name', 'reviews', 'mean int', 'median', 'p90', 
+                                                    'mean load', 'load cv', 'max load')]
+    for result in results:
+        lines.append("%-20s %8d %8.1f %8d %8d %9.2f %8.3f %8d" % result)
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = OptionParser(usage="%prog [options] reviews.csv parameters.json")
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help="number of worker processes (default: number of CPUs, 0: no workers)")
+    options, args = parser.parse_args(args)
+    if len(args) != 2:
+        parser.error("reviews and parameters files are required")
+    with open(args[0], 'rb') as f:
+        histories = read_histories(f)
+    with open(args[1]) as f:
+        parameter_sets = read_parameter_sets(f)
+    print format_results(sweep(histories, parameter_sets, options.processes))
+
+
+if __name__ == '__main__':
+    main()
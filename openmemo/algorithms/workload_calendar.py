@@ -0,0 +1,249 @@
+from array import array
+from datetime import datetime, timedelta
+
+from openmemo.algorithms.segment_tree import MinSegmentTree
+from openmemo.algorithms.ssrf import SSRFAlgorithmGlobalData, SSRFAlgorithmIndexedGlobalData
+
+
+class WorkloadCalendar (SSRFAlgorithmGlobalData):
+    """ In-memory implementation of the SSRF global data.
+    
+    Keeps number of scheduled reviews and a sum of their difficulties per day 
+    for each user. The values are kept in compact arrays indexed by the day offset,
+    so adding, removing and moving of a scheduled review is O(1) 
+    and reading a window of k days is O(k).
+    
+    The calendar is loaded once (e.g. from a database) with ``add()`` and then 
+    kept up to date with ``update()`` called for each AlgorithmResult, so scheduling
+    doesn't need to query the storage.
+    
+    ``user_data`` passed to the methods is used as a key of the user calendar,
+    so it must be hashable. 
+    """
+    
+    def __init__(self):
+        self._users = {}
+
+    def get_workloads(self, from_date, to_date, user_data):
+        return self._user_calendar(user_data).workloads(_to_date(from_date), _to_date(to_date))
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        return self._user_calendar(user_data).avg_difficulties(_to_date(from_date), _to_date(to_date))
+
+    def add(self, review_date, difficulty, user_data=None):
+        """ Adds a review scheduled on ``review_date``. """
+        self._user_calendar(user_data).add(_to_date(review_date), difficulty)
+
+    def remove(self, review_date, difficulty, user_data=None):
+        """ Removes a review scheduled on ``review_date``. """
+        self._user_calendar(user_data).remove(_to_date(review_date), difficulty)
+
+    def move(self, old_review_date, old_difficulty, new_review_date, new_difficulty, user_data=None):
+        """ Moves a review scheduled on ``old_review_date`` to ``new_review_date``. """
+        calendar = self._user_calendar(user_data)
+        calendar.remove(_to_date(old_review_date), old_difficulty)
+        calendar.add(_to_date(new_review_date), new_difficulty)
+
+    def update(self, result, old_alg_data=None, user_data=None):
+        """ Updates the calendar with an AlgorithmResult of a LU. 
+        
+        ``old_alg_data`` is the LU algorithm data passed to ``schedule()``;
+        the review it describes (if any) is moved to the new review date.
+        """
+        if old_alg_data and old_alg_data.get('next_review') is not None:
+            self.move(old_alg_data['next_review'], old_alg_data.get('difficulty', 0.0),
+                      result.next_review, result.alg_data['difficulty'], user_data)
+        else:
+            self.add(result.next_review, result.alg_data['difficulty'], user_data)
+
+    def _user_calendar(self, user_data):
+        calendar = self._users.get(user_data)
+        if calendar is None:
+            calendar = self._users[user_data] = self._create_user_calendar()
+        return calendar
+
+    def _create_user_calendar(self):
+        return _UserCalendar()
+
+
+class IndexedWorkloadCalendar (WorkloadCalendar, SSRFAlgorithmIndexedGlobalData):
+    """ WorkloadCalendar which additionally keeps segment trees of daily workloads
+    and average difficulties. 
+    
+    The last day with no (or at most a given) workload and the minimum workload 
+    or average difficulty of a range of days are found in O(log D), where D is the number of days 
+    in the user calendar. Adding, removing and moving of a review becomes O(log D).
+    """
+
+    def find_last_zero_workload(self, from_date, to_date, user_data):
+        return self._user_calendar(user_data).last_workload_at_most(_to_date(from_date), _to_date(to_date), 0)
+
+    def find_last_workload_at_most(self, from_date, to_date, max_workload, user_data):
+        return self._user_calendar(user_data).last_workload_at_most(_to_date(from_date), _to_date(to_date),
+                                                                    max_workload)
+
+    def get_min_workload(self, from_date, to_date, user_data):
+        calendar = self._user_calendar(user_data)
+        return calendar.range_min(calendar.workload_tree, _to_date(from_date), _to_date(to_date), 0)
+
+    def get_min_avg_difficulty(self, from_date, to_date, user_data):
+        calendar = self._user_calendar(user_data)
+        return calendar.range_min(calendar.difficulty_tree, _to_date(from_date), _to_date(to_date), 0.0)
+
+    def _create_user_calendar(self):
+        return _IndexedUserCalendar()
+
+
+class _UserCalendar (object):
+    """ Reviews scheduled for a single user. 
+    
+    Day ``origin + i`` is kept under index ``i`` of the arrays. 
+    The arrays grow in both directions when a review is added;
+    reading days outside the arrays doesn't extend them.
+    """
+    
+    def __init__(self):
+        self.origin = None
+        self.counts = array('l')
+        self.difficulty_sums = array('d')
+
+    def workloads(self, from_date, to_date):
+        return self._window(self.counts, from_date, to_date, 0)
+
+    def avg_difficulties(self, from_date, to_date):
+        counts = self._window(self.counts, from_date, to_date, 0)
+        difficulty_sums = self._window(self.difficulty_sums, from_date, to_date, 0.0)
+        return [difficulty_sum / count if count else 0.0 for count, difficulty_sum
+                in zip(counts, difficulty_sums)]
+
+    def add(self, day, difficulty):
+        """ Adds a review and returns the index of the day. """
+        ind = self._index(day)
+        self.counts[ind] += 1
+        self.difficulty_sums[ind] += difficulty
+        return ind
+
+    def remove(self, day, difficulty):
+        """ Removes a review and returns the index of the day. """
+        ind = self._index(day)
+        assert self.counts[ind] > 0, "no review scheduled on %s" % day
+        self.counts[ind] -= 1
+        if self.counts[ind]:
+            # Difficulties are >= 0, don't let rounding errors make the sum negative
+            self.difficulty_sums[ind] = max(self.difficulty_sums[ind] - difficulty, 0.0)
+        else:
+            # Don't let rounding errors accumulate on empty days
+            self.difficulty_sums[ind] = 0.0
+        return ind
+
+    def avg_difficulty(self, ind):
+        count = self.counts[ind]
+        return self.difficulty_sums[ind] / count if count else 0.0
+
+    def _window(self, values, from_date, to_date, default):
+        """ Returns a list of values for the days between the dates (both inclusive). """
+        assert from_date <= to_date, "from date %s > to date %s" % (from_date, to_date)
+        num_days = (to_date - from_date).days + 1
+        if self.origin is None:
+            return [default] * num_days
+        i = (from_date - self.origin).days
+        window = values[max(i, 0):max(i + num_days, 0)].tolist()
+        before = min(max(-i, 0), num_days)
+        after = num_days - before - len(window)
+        return [default] * before + window + [default] * after
+
+    def _index(self, day):
+        """ Returns an index of the day, extends the arrays to contain the day. """
+        if self.origin is None:
+            self.origin = day
+        ind = (day - self.origin).days
+        if ind < 0:
+            self.counts[0:0] = array('l', [0]) * -ind
+            self.difficulty_sums[0:0] = array('d', [0.0]) * -ind
+            self.origin = day
+            ind = 0
+        elif ind >= len(self.counts):
+            num_days = ind - len(self.counts) + 1
+            self.counts.extend(array('l', [0]) * num_days)
+            self.difficulty_sums.extend(array('d', [0.0]) * num_days)
+        return ind
+
+
+class _IndexedUserCalendar (_UserCalendar):
+    """ Reviews scheduled for a single user with segment trees of the daily workloads
+    and average difficulties. 
+    
+    The trees are rebuilt with a doubled capacity when the arrays outgrow them
+    or when days are added before the origin.
+    """
+    
+    def __init__(self):
+        super(_IndexedUserCalendar, self).__init__()
+        self.workload_tree = MinSegmentTree([])
+        self.difficulty_tree = MinSegmentTree([], fill=0.0)
+
+    def add(self, day, difficulty):
+        ind = super(_IndexedUserCalendar, self).add(day, difficulty)
+        self._update_trees(ind)
+        return ind
+
+    def remove(self, day, difficulty):
+        ind = super(_IndexedUserCalendar, self).remove(day, difficulty)
+        self._update_trees(ind)
+        return ind
+
+    def last_workload_at_most(self, from_date, to_date, max_workload):
+        """ Returns the last date between the dates (both inclusive) with at most ``max_workload``
+        reviews or None. 
+        """
+        if self.origin is None:
+            return to_date
+        i = (from_date - self.origin).days
+        j = (to_date - self.origin).days
+        if j < 0 or j >= len(self.counts):
+            # No reviews are scheduled outside the arrays
+            return to_date
+        ind = self.workload_tree.find_last(max(i, 0), j, max_workload)
+        if ind is not None:
+            return self.origin + timedelta(ind)
+        if i < 0:
+            return self.origin - timedelta(1)
+        return None
+
+    def range_min(self, tree, from_date, to_date, default):
+        """ Returns the minimum value of the tree between the dates (both inclusive). """
+        assert from_date <= to_date, "from date %s > to date %s" % (from_date, to_date)
+        if self.origin is None:
+            return default
+        i = (from_date - self.origin).days
+        j = (to_date - self.origin).days
+        if j < 0 or i >= len(self.counts):
+            return default
+        result = tree.min(max(i, 0), min(j, len(self.counts) - 1))
+        if i < 0 or j >= len(self.counts):
+            # Days outside the arrays have no reviews
+            result = min(result, default)
+        return result
+
+    def _index(self, day):
+        origin = self.origin
+        ind = super(_IndexedUserCalendar, self)._index(day)
+        if origin != self.origin or len(self.counts) > self.workload_tree.capacity:
+            self._rebuild_trees()
+        return ind
+
+    def _rebuild_trees(self):
+        capacity = 2 * len(self.counts)
+        self.workload_tree = MinSegmentTree(self.counts.tolist(), capacity)
+        self.difficulty_tree = MinSegmentTree([self.avg_difficulty(ind) for ind in range(len(self.counts))],
+                                              capacity, fill=0.0)
+
+    def _update_trees(self, ind):
+        self.workload_tree[ind] = self.counts[ind]
+        self.difficulty_tree[ind] = self.avg_difficulty(ind)
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
@@ -1,8 +1,103 @@
 from openmemo.conversion.exceptions import ConversionFailure
+from openmemo.conversion.resources import ResourceCache
+from collections import namedtuple
 import fnmatch
 from openmemo.i18n import N_
 
+# A bounded batch of imported entities yielded by Importer.iter_import.
+# Resources (images, sounds) are reported in the chunk of the first content
+# object that referenced them.
+ImportChunk = namedtuple('ImportChunk', 'content_objects images sounds')
+
+class _RecordingFactory (object):
+    """ Forwards to the factory and remembers resources created since the last chunk. """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.images = []
+        self.sounds = []
+
+    def ContentObject(self, importer, data):
+        return self.factory.ContentObject(importer, data)
+
+    def Image(self, importer, data):
+        image = self.factory.Image(importer, data)
+        self.images.append(image)
+        return image
+
+    def Sound(self, importer, data):
+        sound = self.factory.Sound(importer, data)
+        self.sounds.append(sound)
+        return sound
+
+    def chunk(self, content_objects):
+        chunk = ImportChunk(content_objects, self.images, self.sounds)
+        self.images = []
+        self.sounds = []
+        return chunk
+
 class Importer (object):
+    """ Base class for importers.
+
+    Content objects are created with factory.ContentObject(importer, values),
+    images and sounds with factory.Image(importer, data) and
+    factory.Sound(importer, data).
+
+    A factory may also implement ContentObjects(importer, list_of_values),
+    returning the list of created content objects. Importers then pass the
+    records to it in batches of batch_size (chunk_size for iter_import),
+    e.g. to issue multi-row inserts.
+
+    Each resource file is passed to the factory once per import, further 
+    references get the same resource. Files with identical content are 
+    passed once if resource_store (openmemo.conversion.resources.ResourceStore) 
+    is set, the store might be shared by several imports.
+    """
+    batch_size = 1000
+    resource_store = None
+
+    def __call__(self):
+        for content_objects in self._content_objects(self.factory, self.batch_size):
+            pass
+
+    def iter_import(self, chunk_size=1000):
+        """ Imports lazily, yielding ImportChunk instances.
+
+        The input is parsed as the chunks are consumed, so at most chunk_size
+        content objects (and the resources they use) are held at a time.
+        The factory is still called for every entity.
+        """
+        factory = self.factory
+        recorder = _RecordingFactory(factory)
+        self.factory = recorder
+        try:
+            for content_objects in self._content_objects(factory, chunk_size):
+                yield recorder.chunk(content_objects)
+            if recorder.images or recorder.sounds:
+                yield recorder.chunk([])
+        finally:
+            self.factory = factory
+
+    def _content_objects(self, factory, batch_size):
+        """ Creates content objects from the records, yielding them in lists of batch_size. """
+        assert batch_size > 0
+        self.resources = ResourceCache(self.resource_store)
+        create_batch = getattr(factory, 'ContentObjects', None)
+        batch = []
+        for values in self._records():
+            if create_batch is None:
+                values = self.factory.ContentObject(self, values)
+            batch.append(values)
+            if len(batch) >= batch_size:
+                yield create_batch(self, batch) if create_batch else batch
+                batch = []
+        if batch:
+            yield create_batch(self, batch) if create_batch else batch
+
+    def _records(self):
+        """ Yields dictionaries of field values, one for every content object. """
+        raise NotImplementedError()
+
     def _find_index_file(self, dir, patterns):
         files = dir.listdir()
         if len(files) == 1 and dir.isdir(files[0]):
@@ -15,4 +110,4 @@ class Importer (object):
                                             match=match, pattern=pattern, patterns=patterns)
                 return match[0]
         raise ConversionFailure(N_(u"Couldn't find an index file. Examined patterns: %(patterns)s"), patterns=patterns)
-    
\ No newline at end of file
+    
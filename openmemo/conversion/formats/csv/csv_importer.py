@@ -1,9 +1,13 @@
 from openmemo.conversion.exceptions import ConversionFailure
+from openmemo.conversion.html import PreparedHTML
+from collections import deque
+from cStringIO import StringIO
 import codecs
 import csv
 import logging
+import multiprocessing
 import os.path
-from ...resources import resource_from_file
+import re
 from ..base import Importer
 log = logging.getLogger(__name__)
 
@@ -15,32 +19,36 @@ class CSVImporter (Importer):
     escapechar = '\\'
     fields = ('question', 'answer')
     fields_in_first_row = False
+    # number of processes parsing chunks of the file (None - number of CPUs),
+    # the file is parsed in this process if 1
+    processes = 1
+    chunk_bytes = 1024 * 1024
+    # fields converted by markup.prepare() in the worker processes (None - all fields),
+    # values which aren't imported as HTML are not affected
+    html_fields = ('question', 'answer')
     
     def __init__(self, dir, factory, markup):
         self.dir = dir
         self.factory = factory
         self.markup = markup
 
-    def __call__(self):
+    def _records(self):
         index_file_path = self._find_index_file(self.dir, self.filenames)
         self.index_dir = self.dir.opendir(os.path.dirname(index_file_path))  
         self.markup.dir = self.index_dir
         self.markup.factory = self.factory
             
-        decoder = codecs.getdecoder(self.encoding)
-        decode = lambda x: decoder(x)[0]
-
-        parser_settings = dict(
-            skipinitialspace=True, 
-            escapechar=str(self.escapechar),
-            lineterminator=str(self.line_terminator),
-            delimiter=str(self.delimiter)
-        )
-        process = lambda f: decode(f).replace(self.line_terminator, "\n")       
+        parser_settings = self._parser_settings()
+        process = _field_processor(self.encoding, self.line_terminator)
         
         file = self.dir.open(index_file_path, 'rb')
 
         with file:
+            if self.processes != 1:
+                for values in self._parallel_records(file, parser_settings):
+                    yield values
+                return
+
             reader = csv.reader(file, **parser_settings)
             lines = enumerate(reader)
             
@@ -53,29 +61,228 @@ class CSVImporter (Importer):
             for line_num, fields in lines:
                 field_num = len(fields)
                 if field_num != len_field_names:
-                    raise ConversionFailure("Expected %(expected_field_num)d values  per line, "
-                                      "got %(actual_field_num)d at line %(line_num)s: %(fields)s",
-                                      expected_field_num=len_field_names, 
-                                      actual_field_num=field_num, line_num=line_num, fields=fields)
+                    raise self._invalid_line(len_field_names, line_num, fields)
                 fields = map(process, fields)
-                values = dict(zip(field_names, fields))
-                self.factory.ContentObject(self, values)
+                yield dict(zip(field_names, fields))
+
+    def _parallel_records(self, file, parser_settings):
+        """ Parses chunks of the file in a process pool. 
+        
+        Records are yielded in the order of rows. The workers parse and decode 
+        the rows and prepare the HTML conversion of their values, content 
+        objects and resources are created here.
+        """
+        chunks = _RowChunks(file, self.chunk_bytes)
+        line_num = 0
+        if self.fields_in_first_row:
+            while True:
+                chunk = chunks.next()
+                if chunk is None:
+                    return
+                header = _rows_pattern(parser_settings, '').match(chunk)
+                if header or chunks.at_end():
+                    break
+                chunks.unread(chunk, len(chunk))
+            end = header.end() if header else len(chunk)
+            field_names = csv.reader(StringIO(chunk[:end]), **parser_settings).next()
+            chunks.unread(chunk[end:])
+            line_num = 1
+        else:
+            field_names = self.fields
+        len_field_names = len(field_names)
+        # the workers get only what they need to prepare HTML, not the whole markup
+        preparer = getattr(self.markup, 'preparer', None)
+        preparer = preparer() if preparer is not None else None
+        html_indexes = [i for i, name in enumerate(field_names) 
+                        if preparer is not None and 
+                        (self.html_fields is None or name in self.html_fields)]
+            
+        processes = self.processes or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes, _init_worker, (preparer,))
+        try:
+            pending = deque()
+            while True:
+                while len(pending) < 2 * processes:
+                    chunk = chunks.next()
+                    if chunk is None:
+                        break
+                    task = (chunk, chunks.at_end(), parser_settings, self.encoding, 
+                            self.line_terminator, len_field_names, html_indexes)
+                    pending.append((chunk, pool.apply_async(_parse_chunk, (task,))))
+                if not pending:
+                    break
+                
+                chunk, result = pending.popleft()
+                chunk_rows, invalid_fields, error, parsed = result.get()
+                for fields in chunk_rows:
+                    yield dict(zip(field_names, fields))
+                line_num += len(chunk_rows)
+                if invalid_fields is not None:
+                    raise self._invalid_line(len_field_names, line_num, invalid_fields)
+                if error is not None:
+                    raise error
+                if parsed < len(chunk):
+                    # the chunk was split inside a row, the following ones are split again 
+                    chunks.unread(chunk[parsed:] + ''.join(chunk for chunk, result in pending),
+                                  len(chunk) - parsed)
+                    pending.clear()
+        except:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def _parser_settings(self):
+        return dict(
+            skipinitialspace=True, 
+            escapechar=str(self.escapechar),
+            lineterminator=str(self.line_terminator),
+            delimiter=str(self.delimiter)
+        )
+
+    def _invalid_line(self, len_field_names, line_num, fields):
+        return ConversionFailure("Expected %(expected_field_num)d values  per line, "
+                                 "got %(actual_field_num)d at line %(line_num)s: %(fields)s",
+                                 expected_field_num=len_field_names, 
+                                 actual_field_num=len(fields), line_num=line_num, fields=fields)
 
     def import_sound(self, value):
         if value: 
-            data = resource_from_file(self.index_dir, value)
-            return self.factory.Sound(self, data)
+            return self.resources(self, self.factory, 'Sound', self.index_dir, value)
     
     def import_image(self, value):
         if value:
-            data = resource_from_file(self.index_dir, value)
-            return self.factory.Image(self, data)   
+            return self.resources(self, self.factory, 'Image', self.index_dir, value)
     
     def import_html(self, value):
         if value:
+            if isinstance(value, PreparedHTML):
+                return self.markup.resolve(self, value)
             return self.markup(self, value) 
 
         
 
 
+def _field_processor(encoding, line_terminator):
+    decoder = codecs.getdecoder(encoding)
+    return lambda f: decoder(f)[0].replace(line_terminator, "\n")
+
+
+class _RowChunks (object):
+    """ Splits a file into chunks of about size bytes at line breaks. 
+    
+    A line break is taken for the end of a row if the chunk has an even number 
+    of quotes before it, which is wrong only for quotes escaped or used inside 
+    unquoted values. Workers check the rows of the chunks (see _parse_chunk), 
+    the data after the last complete row is given back by unread().
+    """
+    
+    def __init__(self, file, size, quotechar='"'):
+        self.file = file
+        self.size = size
+        self.quotechar = quotechar
+        self.data = ''
+        self.eof = False
+        # number of bytes at the start of the data known to be inside a row
+        self.incomplete = 0
+
+    def next(self):
+        """ Returns the next chunk or None at the end of the file. """
+        while True:
+            while not self.eof and len(self.data) < self.size:
+                block = self.file.read(self.size)
+                self.eof = not block
+                self.data += block
+            end = self._end_of_rows()
+            if self.eof or end:
+                if not self.eof:
+                    chunk, self.data = self.data[:end], self.data[end:]
+                else:
+                    chunk, self.data = self.data, ''
+                self.incomplete = 0
+                return chunk or None
+            # the first row continues in the next block
+            block = self.file.read(self.size)
+            self.eof = not block
+            self.data += block
+
+    def at_end(self):
+        """ Whether the last chunk returned ends at the end of the file. """
+        return self.eof and not self.data
+
+    def unread(self, data, incomplete=0):
+        """ Puts back data starting with a row, its first row doesn't end 
+        in the first incomplete bytes. 
+        """
+        self.data = data + self.data
+        self.incomplete = incomplete
 
+    def _end_of_rows(self):
+        """ Returns the end of the last line break with an even number of quotes 
+        before it, 0 if there is none after the incomplete bytes. 
+        """
+        data, quotechar = self.data, self.quotechar
+        end = data.rfind('\n')
+        if end < self.incomplete:
+            return 0
+        odd = data.count(quotechar, 0, end) % 2
+        while odd and end >= self.incomplete:
+            start = data.rfind('\n', 0, end)
+            odd ^= data.count(quotechar, start + 1, end) % 2
+            end = start
+        return end + 1 if end >= self.incomplete else 0
+
+
+def _rows_pattern(parser_settings, repeat='*'):
+    """ Returns a regular expression matching whole rows read by csv.reader 
+    with the settings (and skipinitialspace, doublequote). 
+    """
+    chars = dict((name, re.escape(parser_settings.get(name, '"'))) 
+                 for name in ('delimiter', 'escapechar', 'quotechar'))
+    quoted = ('%(quotechar)s[^%(quotechar)s%(escapechar)s]*'
+              '(?:(?:%(escapechar)s[\\s\\S]|%(quotechar)s%(quotechar)s)[^%(quotechar)s%(escapechar)s]*)*'
+              '%(quotechar)s(?!%(quotechar)s)(?:%(escapechar)s|(?!%(escapechar)s))')
+    field_start = ' *(?:' + quoted + '|(?![ %(quotechar)s]))'
+    row = (field_start + '[^%(delimiter)s%(escapechar)s\\n]*'
+           '(?:(?:%(escapechar)s[^\\n]|%(delimiter)s' + field_start + ')[^%(delimiter)s%(escapechar)s\\n]*)*'
+           '%(escapechar)s?\\n')
+    return re.compile(('(?:' + row + ')' + repeat) % chars)
+
+
+_preparer = None
+
+def _init_worker(preparer):
+    global _preparer
+    _preparer = preparer
+
+
+def _parse_chunk(args):
+    """ Parses and decodes the rows of a chunk in a worker process.
+    
+    Returns the rows preceding the first one with a wrong number of fields 
+    or a csv.Error, the fields of that row or the error (None if all rows are 
+    valid) and the number of bytes parsed, less than the chunk if its end is 
+    not the end of a row.
+    """
+    data, at_end, parser_settings, encoding, line_terminator, num_fields, html_indexes = args
+    if not at_end:
+        parsed = _rows_pattern(parser_settings).match(data).end()
+        data = data[:parsed]
+    else:
+        parsed = len(data)
+    process = _field_processor(encoding, line_terminator)
+    prepare = _preparer.prepare if _preparer is not None else None
+    rows = []
+    try:
+        for fields in csv.reader(StringIO(data), **parser_settings):
+            if len(fields) != num_fields:
+                return rows, fields, None, parsed
+            fields = map(process, fields)
+            for i in html_indexes:
+                fields[i] = prepare(fields[i]) or fields[i]
+            rows.append(fields)
+    except csv.Error, e:
+        return rows, None, e, parsed
+    return rows, None, None, parsed
@@ -1,5 +1,5 @@
 from openmemo.conversion.exceptions import ConversionFailure
-from codecs import EncodedFile
+from codecs import EncodedFile, getincrementaldecoder
 from ..base import Importer
 from os.path import dirname
 
@@ -11,33 +11,110 @@ class SuperMemoQAImporter (Importer):
     encoding = 'utf_8_sig'
     filenames = ('*.txt',)
     fields = ('question', 'answer')
+    # parse blocks of decoded text instead of running the line state machine
+    fast_parser = True
+    block_size = 1024 * 1024
     
     def __init__(self, dir, factory, markup):
         self.dir = dir 
         self.factory = factory
         self.markup = markup 
 
-    def __call__(self):
+    def _records(self):
         index_file_path = self._find_index_file(self.dir, self.filenames)
         self.markup.dir = self.dir.opendir(dirname(index_file_path))
         self.markup.factory = self.factory  
 
+        if self.fast_parser:
+            with self.dir.open(index_file_path, 'rb') as file:
+                for values in self._parse_blocks(self._read_blocks(file)):
+                    yield values
+            return
+
         with EncodedFile(self.dir.open(index_file_path, 'rU'), 'utf8', self.encoding) as file:
-            self._parse(file)
+            for values in self._parse(file):
+                yield values
+
+    def _read_blocks(self, file):
+        """ Decodes the file in blocks of block_size bytes, yielding lists of whole lines. """
+        decoder = getincrementaldecoder(self.encoding)()
+        pending = u""
+        while True:
+            data = file.read(self.block_size)
+            lines = (pending + decoder.decode(data, final=not data)).splitlines(True)
+            if not data:
+                yield lines
+                return
+            # the last line might continue in the next block (also '\r' before '\n')
+            pending = lines.pop() if lines else u""
+            yield lines
+
+    def _parse_blocks(self, blocks):
+        """ Equivalent to _parse, without per line state dispatch and string concatenation. """
+        fields = self.fields
+        question = []
+        answer = []
+        in_answer = False
+        # a card was saved and no other has been started since
+        saved = False
+        line_no = -1
+        for lines in blocks:
+            for line in lines:
+                line_no += 1
+                if not in_answer:
+                    if line.startswith(u"Q: "):
+                        question.append(line[3:].rstrip())
+                        continue
+                    if not line.startswith(u"A: "):
+                        raise ConversionFailure(
+                            "A question line (#%(line_num)s) without the 'Q: ' prefix", 
+                            line_num=line_no+1)
+                    # end of the question, start of an answer
+                    in_answer = True
+                    saved = False
+
+                if line.startswith(u"A: "):
+                    answer.append(line[3:].rstrip())
+                elif line.strip() == u"":
+                    # empty line, end of the answer and of the card
+                    yield dict(zip(fields, (u"\n".join(question).rstrip(), u"\n".join(answer).rstrip())))
+                    question = []
+                    answer = []
+                    in_answer = False
+                    saved = True
+                else:
+                    raise ConversionFailure(
+                        "An answer line (#%(line_num)s) without the 'A: ' prefix", 
+                            line_num=line_no+1)
+
+        # if the last line was an answer, close the card    
+        if in_answer:
+            yield dict(zip(fields, (u"\n".join(question).rstrip(), u"\n".join(answer).rstrip())))
+            saved = True
+
+        if not saved:
+            raise ConversionFailure(
+                "Illegal end state: %s" % self._process_question.__name__) 
 
     def _parse(self, file):
         self._prev_state = None
         self._state = self._process_question
         self._question = ""
         self._answer = ""
+        self._card = None
         for line_no, line in enumerate(file):
             self._line = line.decode('utf8')
             self._line_no = line_no
             self._state()
+            if self._card is not None:
+                yield self._card
+                self._card = None
 
         # if the last line was an answer, close the card    
         if self._state == self._process_answer: 
             self._change_state(self._save_card, execute=True)
+            yield self._card
+            self._card = None
         
         # have we end up with another state than after save?
         if not (self._state == self._process_question
@@ -74,14 +151,14 @@ class SuperMemoQAImporter (Importer):
         if not self._line.startswith("A: "):
             raise ConversionFailure(
                 "An answer line (#%(line_num)s) without the 'A: ' prefix", 
-                    _line_no=self._line_no+1)
+                    line_num=self._line_no+1)
        
         self._answer += self._line[3:].rstrip() + "\n"
         
     def _save_card(self):
         question = self._question.rstrip()
         answer = self._answer.rstrip()
-        self.factory.ContentObject(self, dict(zip(self.fields, (question, answer))))
+        self._card = dict(zip(self.fields, (question, answer)))
         self._question = ""
         self._answer = ""
 
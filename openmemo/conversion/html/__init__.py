@@ -1 +1 @@
-from .html_converter import HTMLConverter
\ No newline at end of file
+from .html_converter import HTMLConverter, HTMLPreparer, PreparedHTML
\ No newline at end of file
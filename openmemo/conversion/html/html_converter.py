@@ -3,7 +3,32 @@ import cgi
 import lxml.etree as etree 
 import mimetypes
 import os
+import re
 from ..exceptions import ConversionFailure
+from .tags import ResourceReader, ResourceWriter
+
+# resource references in prepared HTML, see HTMLConverter.prepare()
+_MARKER = u'\ue000%d\ue001'
+_MARKERS = re.compile(u'\ue000(\\d+)\ue001')
+_MARKER_CHARS = re.compile(u'[\ue000\ue001]')
+# characters lxml escapes or rejects in attribute values
+_UNSAFE_CHARS = re.compile(u'[&<>"\x00-\x1f\ud800-\udfff\ufffe\uffff\ue000\ue001]')
+
+class PreparedHTML (unicode):
+    """ HTML (the string itself) converted by HTMLConverter.prepare() 
+    
+    converted - output HTML with markers in place of the attributes written for resources
+    references - (processor index, path) of the resources, in the order of the markers
+    """
+    
+    def __new__(cls, html, converted, references):
+        self = super(PreparedHTML, cls).__new__(cls, html)
+        self.converted = converted
+        self.references = references
+        return self
+
+    def __reduce__(self):
+        return PreparedHTML, (unicode(self), self.converted, self.references)
 
 class HTMLConverter (object):
     """ Converts one markup to another, HTML-based
@@ -29,22 +54,116 @@ class HTMLConverter (object):
         
         dir - current working directory, links in HTML are relative to it.
         """
-        try:
-            doc = etree.fromstring('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
-                               '<root>'+html.encode('utf8')+'</root>')
-        except etree.XMLSyntaxError, e:
-            raise ConversionFailure("Invalid XML: '%(xml)s'", xml=html)
-        
+        doc = _parse(html)
         for processor in self.processors:
             processor(importer, self.factory, self.dir, doc)
+        return _serialize(doc)
+
+    def prepare(self, html):
+        """ Converts input HTML without reading its resources. 
+        
+        Resources are located by processors having a ResourceReader and 
+        a ResourceWriter, the values written for them are left to resolve().
+        Returns PreparedHTML or None if the HTML can't be converted that way: 
+        it's invalid or has tags for other processors.
+        """
+        preparer = self.preparer()
+        if preparer is None:
+            return None
+        return preparer.prepare(html)
+
+    def preparer(self):
+        """ Returns HTMLPreparer doing prepare() e.g. in another process 
+        or None if the processors can't prepare HTML. 
+        """
+        processors = []
+        for processor in self.processors:
+            locator = getattr(processor, 'locator', None)
+            if locator is None:
+                return None
+            reader = getattr(processor, 'reader', None)
+            writer = getattr(processor, 'writer', None)
+            if isinstance(reader, ResourceReader) and isinstance(writer, ResourceWriter):
+                processors.append((locator, reader.attr, writer.attr))
+            else:
+                processors.append((locator, None, None))
+        return HTMLPreparer(processors)
+
+    def resolve(self, importer, prepared):
+        """ Returns output HTML for PreparedHTML, reading its resources in order. 
+        
+        The HTML is converted again if a value written for a resource would 
+        be escaped, the importer's resources() returns the same resources then.
+        """
+        if not prepared.references:
+            return prepared.converted
+        values = []
+        for index, path in prepared.references:
+            processor = self.processors[index]
+            resource = processor.reader.read(importer, self.factory, self.dir, path)
+            value = processor.writer.src(resource)
+            if isinstance(value, str):
+                try:
+                    value = value.decode('ascii')
+                except UnicodeDecodeError:
+                    return self(importer, prepared)
+            if not isinstance(value, unicode) or _UNSAFE_CHARS.search(value):
+                return self(importer, prepared)
+            values.append(value)
+        return _MARKERS.sub(lambda match: values[int(match.group(1))], prepared.converted)
+
+class HTMLPreparer (object):
+    """ Does HTMLConverter.prepare() with the parts of the processors it needs, 
+    which can be sent to other processes without the factory, directory 
+    and resource writers of the converter.
+    """
+    
+    def __init__(self, processors):
+        """
+        Arguments:
+        processors - (locator, reader attribute, writer attribute) of the converter 
+        processors; the attributes are None for processors not reading resources
+        """
+        self.processors = processors
+
+    def prepare(self, html):
+        """ See HTMLConverter.prepare(). """
+        if _MARKER_CHARS.search(html):
+            return None
+        try:
+            doc = _parse(html)
+        except ConversionFailure:
+            return None
         
-        #xml = etree.tostring(doc, 'utf8')
-        xml = etree.tounicode(doc)
-        i = xml.find('<root>') + 6
-        j = xml.rfind('</root>')
-        xml = xml[i:j] #.decode('utf8')
-        assert isinstance(xml, unicode)
-        return xml
+        references = []
+        for index, (locator, read_attr, write_attr) in enumerate(self.processors):
+            if read_attr is not None:
+                for node in locator(doc):
+                    path = node.attrib.get(read_attr)
+                    if path is None:
+                        return None
+                    node.attrib[write_attr] = _MARKER % len(references)
+                    references.append((index, path))
+            elif locator(doc):
+                return None
+        
+        return PreparedHTML(html, _serialize(doc), references)
+
+def _parse(html):
+    try:
+        return etree.fromstring('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                '<root>'+html.encode('utf8')+'</root>')
+    except etree.XMLSyntaxError, e:
+        raise ConversionFailure("Invalid XML: '%(xml)s'", xml=html)
+
+def _serialize(doc):
+    #xml = etree.tostring(doc, 'utf8')
+    xml = etree.tounicode(doc)
+    i = xml.find('<root>') + 6
+    j = xml.rfind('</root>')
+    xml = xml[i:j] #.decode('utf8')
+    assert isinstance(xml, unicode)
+    return xml
     
           
         
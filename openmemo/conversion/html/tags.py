@@ -1,4 +1,5 @@
 import logging
+import lxml.etree as etree
 from ..resources import resource_from_file
 
 log = logging.getLogger(__name__)
@@ -17,9 +18,14 @@ class Processor (object):
 class XPath (object):
     def __init__(self, xpath):
         self.xpath = xpath
+        self._compiled = etree.XPath(xpath)
 
     def __call__(self, doc):
-        return doc.xpath(self.xpath)
+        return self._compiled(doc)
+
+    def __reduce__(self):
+        # compiled expressions can't be pickled
+        return XPath, (self.xpath,)
 
 class ResourceReader (object):
     def __init__(self, type, attr):
@@ -27,7 +33,13 @@ class ResourceReader (object):
         self.attr = attr
 
     def __call__(self, importer, factory, dir, node):
-        path = node.attrib[self.attr]
+        return self.read(importer, factory, dir, node.attrib[self.attr])
+
+    def read(self, importer, factory, dir, path):
+        """ Returns the resource for the path relative to dir. """
+        resources = getattr(importer, 'resources', None)
+        if resources is not None:
+            return resources(importer, factory, self.type, dir, path)
         data = resource_from_file(dir, path)
         method = getattr(factory, self.type)
         resource = method(importer, data)
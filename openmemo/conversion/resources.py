@@ -1,7 +1,10 @@
 import os
+import hashlib
 import mimetypes 
 import logging
 from fs.errors import FSError
+from fs.path import abspath, normpath, pathjoin
+from fs.wrapfs.subfs import SubFS
 from .exceptions import ConversionFailure
 
 log = logging.getLogger(__name__)
@@ -18,4 +21,63 @@ def resource_from_file(dir, path):
         data = data,
         mime_type = mimetypes.guess_type(path)[0]
     )       
-    return resource
\ No newline at end of file
+    return resource
+
+class ResourceStore (object):
+    """ Resources by the SHA-256 hash of their data. 
+
+    Identical files are created only once, even if they have different paths. 
+    The store can be shared by several imports, a subclass might keep 
+    the hashes in a database.
+    """
+
+    def __init__(self):
+        self._resources = {}
+
+    def get(self, type, data):
+        """ Returns the resource of the type with the same data or None. """
+        return self._resources.get((type, self.digest(data)))
+
+    def add(self, type, data, resource):
+        self._resources[(type, self.digest(data))] = resource
+
+    def digest(self, data):
+        return hashlib.sha256(data['data']).hexdigest()
+
+    def __len__(self):
+        return len(self._resources)
+
+class ResourceCache (object):
+    """ Resources created during an import, by their type and file. 
+
+    The factory is called once for each file (or each unique content if 
+    a ResourceStore is given), later references get the same resource.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._resources = {}
+
+    def __call__(self, importer, factory, type, dir, path):
+        """ Returns the resource of the type (factory method name) for the path relative to dir. """
+        key = (type,) + _resolve(dir, path)
+        resource = self._resources.get(key)
+        if resource is not None:
+            return resource
+        
+        data = resource_from_file(dir, path)
+        if self.store is not None:
+            resource = self.store.get(type, data)
+        if resource is None:
+            resource = getattr(factory, type)(importer, data)
+            if self.store is not None:
+                self.store.add(type, data, resource)
+        self._resources[key] = resource
+        return resource
+
+def _resolve(dir, path):
+    """ Returns (file system, normalized path) of the path relative to dir. """
+    while isinstance(dir, SubFS):
+        path = pathjoin(dir.sub_dir, path)
+        dir = dir.wrapped_fs
+    return dir, normpath(abspath(path))
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.async_ssrf import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+import threading
+
+
+class _Future (object):
+    def __init__(self, log, name, fn, args):
+        self._log = log
+        self._name = name
+        self._fn = fn
+        self._args = args
+        self._callbacks = []
+        self._done = False
+        self.cancelled = False
+
+    def run(self):
+        self._log.append(('complete', self._name))
+        self._value = self._fn(*self._args)
+        self._done = True
+        for fn in self._callbacks:
+            fn(self)
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        assert self._done and not self.cancelled
+        return self._value
+
+    def add_done_callback(self, fn):
+        if self._done:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def cancel(self):
+        self._log.append(('cancel', self._name))
+        self.cancelled = True
+
+
+class _Executor (object):
+    """ Runs the submitted functions when complete() is called (at once if eager) and logs the calls. """
+    def __init__(self, eager=False):
+        self.eager = eager
+        self.log = []
+        self.pending = []
+
+    def submit(self, fn, *args):
+        self.log.append(('submit', fn.__name__))
+        future = _Future(self.log, fn.__name__, fn, args)
+        if self.eager:
+            future.run()
+        else:
+            self.pending.append(future)
+        return future
+
+    def complete(self, name):
+        future = [future for future in self.pending if future._name == name][0]
+        self.pending.remove(future)
+        future.run()
+
+
+class _ThreadExecutor (object):
+    """ Runs each submitted function in a new thread. """
+    def submit(self, fn, *args):
+        future = _Future([], fn.__name__, fn, args)
+        threading.Timer(0.01, future.run).start()
+        return future
+
+
+class TestAsyncSSRFAlgorithm (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 10, 0)
+        self._calendar = WorkloadCalendar()
+        self._executor = _Executor()
+        self._algorithm = AsyncSSRFAlgorithm(ExecutorGlobalData(self._calendar, self._executor))
+
+    def _fill_calendar(self, calendar, days):
+        today = self._now.date()
+        for i in range(1, days):
+            for j in range((i * 7) % 5 + 1):
+                calendar.add(today + timedelta(i), ((i * 3 + j) % 11) / 4.0)
+
+    def test_requests_are_concurrent(self):
+        self._fill_calendar(self._calendar, 100)
+        alg_data = dict(num_reviews=3, avg_grade=4.0, difficulty=0.5)
+        future = self._algorithm.schedule_async(5, alg_data, now=self._now)
+        assert_equals([('submit', 'get_workloads'), ('submit', 'get_avg_difficulties')], self._executor.log)
+        self._executor.complete('get_workloads')
+        assert_true(not future.done())
+        self._executor.complete('get_avg_difficulties')
+        assert_true(future.done())
+        assert_equals(SSRFAlgorithm(self._calendar).schedule(5, alg_data, now=self._now), future.result())
+
+    def test_avg_difficulties_request_is_cancelled_for_zero_workload(self):
+        future = self._algorithm.schedule_async(5, None, now=self._now)
+        self._executor.complete('get_workloads')
+        assert_true(future.done())
+        assert_equals([('submit', 'get_workloads'), ('submit', 'get_avg_difficulties'),
+                       ('complete', 'get_workloads'), ('cancel', 'get_avg_difficulties')],
+                      self._executor.log)
+
+    def test_only_final_run_is_measured(self):
+        self._fill_calendar(self._calendar, 100)
+        metrics = CountingMetrics()
+        self._algorithm.metrics = metrics
+        future = self._algorithm.schedule_async(5, dict(num_reviews=3, avg_grade=4.0, difficulty=0.5),
+                                                now=self._now)
+        self._executor.complete('get_workloads')
+        assert_equals({}, metrics.snapshot())
+        self._executor.complete('get_avg_difficulties')
+        future.result()
+        assert_equals(1, metrics.snapshot()['calls'])
+
+    def test_callbacks_receive_completed_future(self):
+        results = []
+        future = self._algorithm.schedule_async(5, None, now=self._now)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        assert_equals([], results)
+        self._executor.complete('get_workloads')
+        future.add_done_callback(lambda f: results.append(f.result()))
+        assert_equals([future.result()] * 2, results)
+
+    def test_scheduling_errors_are_raised_by_result(self):
+        future = self._algorithm.schedule_async(7, None, now=self._now)
+        assert_true(future.done())
+        assert_raises(AssertionError, future.result)
+
+    def test_schedule_waits_for_requests_completed_in_other_threads(self):
+        self._fill_calendar(self._calendar, 100)
+        algorithm = AsyncSSRFAlgorithm(ExecutorGlobalData(self._calendar, _ThreadExecutor()))
+        alg_data = dict(num_reviews=3, avg_grade=4.0, difficulty=0.5)
+        assert_equals(SSRFAlgorithm(self._calendar).schedule(5, alg_data, now=self._now),
+                      algorithm.schedule(5, alg_data, now=self._now))
+
+    def test_final_drill_does_not_request_global_data(self):
+        alg_data = dict(num_reviews=2, avg_grade=2.7, difficulty=0.8, next_review=datetime(2011, 3, 2),
+                        status=FINAL_DRILL)
+        self._algorithm.schedule(4, alg_data, PRIORITY_HIGH, now=self._now)
+        assert_equals([], self._executor.log)
+
+    def test_results_match_sync_algorithm(self):
+        self._executor.eager = True
+        expected_calendar = WorkloadCalendar()
+        self._fill_calendar(expected_calendar, 60)
+        self._fill_calendar(self._calendar, 60)
+        algorithm = SSRFAlgorithm(expected_calendar)
+        for i in range(100):
+            grade, priority = i % 6, PRIORITIES[i % 3]
+            alg_data = dict(num_reviews=1 + i % 5, avg_grade=2.0 + (i % 6) / 2.0, difficulty=0.5)
+            expected = algorithm.schedule(grade, alg_data, priority, now=self._now)
+            result = self._algorithm.schedule(grade, alg_data, priority, now=self._now)
+            assert_equals(expected, result)
+            expected_calendar.update(expected)
+            self._calendar.update(result)
+        assert_true(('cancel', 'get_avg_difficulties') in self._executor.log)
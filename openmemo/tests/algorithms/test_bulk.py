@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+from StringIO import StringIO
+import tempfile
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.bulk import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class TestBulk (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 10, 0)
+        self._items = []
+        for user in range(7):
+            for lu in range(30):
+                alg_data = dict(num_reviews=1 + lu % 4, avg_grade=2.0 + (lu % 6) / 2.0, difficulty=0.5)
+                self._items.append(BulkItem('user%d' % user, lu, (lu + user) % 6, alg_data,
+                                            PRIORITIES[lu % 3], self._now + timedelta(hours=(lu * 5) % 7)))
+
+    def _expected(self):
+        expected = []
+        for user in range(7):
+            calendar = WorkloadCalendar()
+            algorithm = SSRFAlgorithm(calendar)
+            items = [item for item in self._items if item.user_data == 'user%d' % user]
+            results = {}
+            for item in sorted(items, key=lambda item: item.now):
+                results[item.lu] = algorithm.schedule(item.grade, item.alg_data, item.priority, now=item.now)
+                calendar.update(results[item.lu])
+            expected.extend((item.user_data, item.lu, results[item.lu]) for item in items)
+        return expected
+
+    def test_reschedule_without_workers(self):
+        assert_equals(self._expected(), list(reschedule(self._items, processes=0, chunk_size=2)))
+
+    def test_output_does_not_depend_on_workers(self):
+        expected = self._expected()
+        assert_equals(expected, list(reschedule(self._items, processes=1, chunk_size=3)))
+        assert_equals(expected, list(reschedule(self._items, processes=3, chunk_size=2)))
+
+    def test_items_of_user_must_be_consecutive(self):
+        items = self._items[:30] + self._items[30:31] + self._items[1:2]
+        assert_raises(ValueError, list, reschedule(items, processes=0))
+        assert_raises(ValueError, list, reschedule(items, processes=2))
+
+    def test_progress(self):
+        progress = []
+        list(reschedule(self._items, processes=0, chunk_size=3, progress=progress.append))
+        assert_equals([90, 180, 210], progress)
+
+    def test_throughput_report(self):
+        stream = StringIO()
+        report = ThroughputReport(stream)
+        report(10)
+        report(20)
+        assert_true(stream.getvalue().startswith("10 LUs scheduled in "))
+        assert_equals(1, stream.getvalue().count("\n"))
+
+    def test_csv(self):
+        directory = tempfile.mkdtemp()
+        try:
+            input_path = os.path.join(directory, 'input.csv')
+            output_path = os.path.join(directory, 'output.csv')
+            with open(input_path, 'wb') as f:
+                f.write("user,lu,grade,priority,now,num_reviews,avg_grade,difficulty,status,last_review,next_review\r\n"
+                        "a,1,5,0,2011-03-01 10:00:00,,,,,,\r\n"
+                        "a,2,3,1,2011-03-01 10:00:00,2,3.5,0.5,1,2011-02-20 10:00:00,2011-03-01 10:00:00\r\n")
+            with open(input_path, 'rb') as f:
+                items = list(read_items(f))
+            assert_equals([BulkItem('a', '1', 5, None, 0, self._now),
+                           BulkItem('a', '2', 3, dict(num_reviews=2, avg_grade=3.5, difficulty=0.5, status=1,
+                                                      last_review=datetime(2011, 2, 20, 10, 0),
+                                                      next_review=self._now), 1, self._now)], items)
+            main(['-q', '-p', '0', input_path, output_path])
+            with open(output_path, 'rb') as f:
+                lines = f.read().splitlines()
+            assert_equals(3, len(lines))
+            assert_equals("user,lu,num_reviews,avg_grade,difficulty,status,last_review,next_review", lines[0])
+            assert_equals("a,1,2,3.75,0.0,1,2011-03-01 10:00:00,2011-03-09 10:00:00", lines[1])
+            assert_true(lines[2].startswith("a,2,3,"))
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,185 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import random
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.daily_cap import CappedSSRFAlgorithm
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar, IndexedWorkloadCalendar
+from openmemo.tests.tools import *
+
+_User = namedtuple('_User', 'name daily_cap')
+
+
+class _CountingIndexedCalendar (IndexedWorkloadCalendar):
+    workload_requests = 0
+
+    def get_workloads(self, from_date, to_date, user_data):
+        self.workload_requests += 1
+        return super(_CountingIndexedCalendar, self).get_workloads(from_date, to_date, user_data)
+
+
+class TestCappedSSRFAlgorithm (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 10, 0)
+        self._rnd = random.Random(19)
+
+    def _fill(self, calendar, user_data, max_workload=8):
+        rnd = random.Random(0)
+        for i in range(1, 300):
+            for j in range(rnd.randint(1, max_workload)):
+                calendar.add(self._now.date() + timedelta(i), rnd.uniform(0.0, 2.0), user_data)
+
+    def _items(self, num_items):
+        return [(self._rnd.choice(GRADES), dict(num_reviews=self._rnd.randint(1, 6),
+                                                avg_grade=self._rnd.uniform(2.0, 5.0), difficulty=0.5),
+                 self._rnd.choice(PRIORITIES)) for i in range(num_items)]
+
+    def _schedule_all(self, algorithm, calendar, items, user_data):
+        results = []
+        for grade, alg_data, priority in items:
+            result = algorithm.schedule(grade, alg_data, priority, now=self._now, user_data=user_data)
+            calendar.update(result, user_data=user_data)
+            results.append(result)
+        return results
+
+    def test_without_cap_results_match_ssrf(self):
+        user = _User('a', None)
+        calendar, expected_calendar = WorkloadCalendar(), WorkloadCalendar()
+        self._fill(calendar, user)
+        self._fill(expected_calendar, user)
+        items = self._items(100)
+        assert_equals(self._schedule_all(SSRFAlgorithm(expected_calendar), expected_calendar, items, user),
+                      self._schedule_all(CappedSSRFAlgorithm(calendar), calendar, items, user))
+
+    def test_high_cap_results_match_ssrf(self):
+        user = _User('a', 1000)
+        calendar, expected_calendar = WorkloadCalendar(), WorkloadCalendar()
+        self._fill(calendar, user)
+        self._fill(expected_calendar, user)
+        items = self._items(100)
+        assert_equals(self._schedule_all(SSRFAlgorithm(expected_calendar), expected_calendar, items, user),
+                      self._schedule_all(CappedSSRFAlgorithm(calendar), calendar, items, user))
+
+    def test_saturated_days_are_not_chosen(self):
+        user = _User('a', 6)
+        calendar = WorkloadCalendar()
+        self._fill(calendar, user)
+        algorithm = CappedSSRFAlgorithm(calendar)
+        for grade, alg_data, priority in self._items(200):
+            min_interval = algorithm._calculate_interval(alg_data['num_reviews'], alg_data['avg_grade'],
+                                                         grade - 1, priority)
+            max_interval = algorithm._calculate_interval(alg_data['num_reviews'], alg_data['avg_grade'],
+                                                         grade, priority)
+            today = self._now.date()
+            workloads = calendar.get_workloads(today + timedelta(min_interval), today + timedelta(max_interval),
+                                               user)
+            result = algorithm.schedule(grade, alg_data, priority, now=self._now, user_data=user)
+            workload = workloads[(result.next_review.date() - today).days - min_interval]
+            if min(workloads) < user.daily_cap:
+                assert_true(workload < user.daily_cap)
+            else:
+                assert_equals(min(workloads), workload)
+            calendar.update(result, user_data=user)
+
+    def test_least_loaded_day_when_all_are_saturated(self):
+        user = _User('a', 2)
+        calendar = WorkloadCalendar()
+        for days, workload in enumerate([5, 3, 4, 3, 6, 7, 8, 9, 9, 9]):
+            for i in range(workload):
+                calendar.add(self._now.date() + timedelta(days + 1), 1.0, user)
+        result = CappedSSRFAlgorithm(calendar).schedule(5, None, now=self._now, user_data=user)
+        assert_equals(self._now + timedelta(4), result.next_review)
+
+    def test_saturated_indexed_calendar_is_not_read(self):
+        user = _User('a', 2)
+        calendar = _CountingIndexedCalendar()
+        for days, workload in enumerate([5, 3, 4, 3, 6, 7, 8, 9, 9, 9]):
+            for i in range(workload):
+                calendar.add(self._now.date() + timedelta(days + 1), 1.0, user)
+        result = CappedSSRFAlgorithm(calendar).schedule(5, None, now=self._now, user_data=user)
+        assert_equals(self._now + timedelta(4), result.next_review)
+        assert_equals(0, calendar.workload_requests)
+
+    def test_indexed_calendar(self):
+        user = _User('a', 5)
+        calendar, expected_calendar = IndexedWorkloadCalendar(), WorkloadCalendar()
+        self._fill(calendar, user, 6)
+        self._fill(expected_calendar, user, 6)
+        items = self._items(100)
+        expected = self._schedule_all(CappedSSRFAlgorithm(expected_calendar), expected_calendar, items, user)
+        assert_equals(expected, self._schedule_all(CappedSSRFAlgorithm(calendar), calendar, items, user))
+
+    def test_smooth(self):
+        user = _User('a', 10)
+        calendar = WorkloadCalendar()
+        self._fill(calendar, user, 6)
+        algorithm = CappedSSRFAlgorithm(calendar)
+        today = self._now.date()
+        # An import of reviews which all got the same day
+        items = []
+        for i in range(40):
+            last_review = self._now - timedelta(20 + i)
+            alg_data = dict(num_reviews=4, avg_grade=4.0, difficulty=0.5, status=MEMORIZED, 
+                            last_review=last_review, next_review=self._now + timedelta(10))
+            calendar.add(alg_data['next_review'], alg_data['difficulty'], user)
+            items.append((alg_data, PRIORITY_MEDIUM))
+        workloads = calendar.get_workloads(today, today + timedelta(30), user)
+        moved = algorithm.smooth(items, today, user)
+        assert_equals(workloads[10] - user.daily_cap, len(moved))
+        new_workloads = calendar.get_workloads(today, today + timedelta(30), user)
+        assert_equals(user.daily_cap, new_workloads[10])
+        assert_equals(sum(workloads), sum(new_workloads))
+        assert_equals(max(workloads[:10] + workloads[11:] + [user.daily_cap]), max(new_workloads))
+        for alg_data, old_next_review in moved:
+            assert_equals(old_next_review, self._now + timedelta(10))
+            shift = abs((alg_data['next_review'] - old_next_review).days)
+            assert_true(1 <= shift <= max(1, (old_next_review - alg_data['last_review']).days // 10))
+            assert_true(alg_data['difficulty'] >= 0.0)
+        # Reviews with the longest intervals are moved first
+        assert_equals([alg_data for alg_data, priority in items[-len(moved):]][::-1],
+                      [alg_data for alg_data, old_next_review in moved])
+
+    def test_smooth_skips_items_without_last_review(self):
+        user = _User('a', 2)
+        calendar = WorkloadCalendar()
+        algorithm = CappedSSRFAlgorithm(calendar)
+        items = []
+        for i in range(4):
+            alg_data = dict(num_reviews=4, avg_grade=4.0, difficulty=0.5, status=MEMORIZED, 
+                            next_review=self._now + timedelta(10))
+            if i % 2 == 0:
+                alg_data['last_review'] = self._now - timedelta(20)
+            elif i == 3:
+                alg_data['last_review'] = None
+            calendar.add(alg_data['next_review'], alg_data['difficulty'], user)
+            items.append((alg_data, PRIORITY_MEDIUM))
+        moved = algorithm.smooth(items, self._now.date(), user)
+        assert_equals([items[0][0], items[2][0]], [alg_data for alg_data, old_next_review in moved])
+        assert_equals(self._now + timedelta(10), items[1][0]['next_review'])
+        assert_equals(self._now + timedelta(10), items[3][0]['next_review'])
+
+    def test_smooth_keeps_reviews_past_ideal_interval(self):
+        user = _User('a', 1)
+        for validate in (True, False):
+            calendar = WorkloadCalendar()
+            algorithm = CappedSSRFAlgorithm(calendar, validate=validate)
+            ideal_interval = algorithm.interval_table.ideal_interval(1, PRIORITY_MEDIUM)
+            items = []
+            # Imported reviews scheduled 40 days after their ideal interval and a review within it
+            for last_review in (self._now, self._now, self._now + timedelta(41)):
+                alg_data = dict(num_reviews=2, avg_grade=4.0, difficulty=0.5, status=MEMORIZED,
+                                last_review=last_review, next_review=self._now + timedelta(ideal_interval + 40))
+                calendar.add(alg_data['next_review'], alg_data['difficulty'], user)
+                items.append((alg_data, PRIORITY_MEDIUM))
+            moved = algorithm.smooth(items, self._now.date(), user)
+            assert_equals([items[2][0]], [alg_data for alg_data, old_next_review in moved])
+            assert_true(items[2][0]['difficulty'] >= 0.0)
+            for alg_data, priority in items[:2]:
+                assert_equals(self._now + timedelta(ideal_interval + 40), alg_data['next_review'])
+                assert_equals(0.5, alg_data['difficulty'])
+
+    def test_smooth_without_cap(self):
+        alg_data = dict(num_reviews=4, avg_grade=4.0, difficulty=0.5, status=MEMORIZED, 
+                        last_review=self._now, next_review=self._now + timedelta(10))
+        assert_equals([], CappedSSRFAlgorithm(WorkloadCalendar()).smooth([(alg_data, PRIORITY_LOW)],
+                                                                        self._now.date()))
@@ -0,0 +1,113 @@
+from datetime import date, datetime, timedelta
+import random
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.global_data_cache import CachingGlobalData
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class _CountingCalendar (WorkloadCalendar):
+    def __init__(self):
+        super(_CountingCalendar, self).__init__()
+        self.requests = []
+
+    def get_workloads(self, from_date, to_date, user_data):
+        self.requests.append(('workloads', from_date, to_date))
+        return super(_CountingCalendar, self).get_workloads(from_date, to_date, user_data)
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        self.requests.append(('avg_difficulties', from_date, to_date))
+        return super(_CountingCalendar, self).get_avg_difficulties(from_date, to_date, user_data)
+
+
+class TestCachingGlobalData (TestCase):
+    def setUp(self):
+        self._day = date(2011, 3, 1)
+        self._calendar = _CountingCalendar()
+        for i in range(60):
+            for j in range(i % 4):
+                self._calendar.add(self._day + timedelta(i), (i + j) % 5 / 2.0)
+        self._cache = CachingGlobalData(self._calendar)
+
+    def _days(self, i, j):
+        return self._day + timedelta(i), self._day + timedelta(j)
+
+    def test_hit(self):
+        expected = self._calendar.get_workloads(self._day, self._day + timedelta(20), None)
+        self._calendar.requests = []
+        assert_equals(expected, self._cache.get_workloads(self._day, self._day + timedelta(20), None))
+        assert_equals(expected[5:11], self._cache.get_workloads(*self._days(5, 10) + (None,)))
+        assert_equals([('workloads',) + self._days(0, 20)], self._calendar.requests)
+        assert_equals((1, 0, 1), (self._cache.hits, self._cache.partial_hits, self._cache.misses))
+
+    def test_partial_hit_fetches_missing_days(self):
+        self._cache.get_avg_difficulties(*self._days(10, 20) + (None,))
+        self._calendar.requests = []
+        avg_difficulties = self._cache.get_avg_difficulties(*self._days(5, 25) + (None,))
+        assert_equals(self._calendar.get_avg_difficulties(*self._days(5, 25) + (None,)), avg_difficulties)
+        assert_equals([('avg_difficulties',) + self._days(5, 9), ('avg_difficulties',) + self._days(21, 25)],
+                      self._calendar.requests[:2])
+        assert_equals((0, 1, 1), (self._cache.hits, self._cache.partial_hits, self._cache.misses))
+
+    def test_disjoint_range_is_replaced(self):
+        self._cache.get_workloads(*self._days(0, 5) + (None,))
+        self._cache.get_workloads(*self._days(30, 35) + (None,))
+        self._cache.get_workloads(*self._days(31, 32) + (None,))
+        assert_equals((1, 0, 2), (self._cache.hits, self._cache.partial_hits, self._cache.misses))
+
+    def test_write_through(self):
+        self._cache.get_workloads(*self._days(0, 10) + (None,))
+        self._cache.get_avg_difficulties(*self._days(0, 10) + (None,))
+        result = AlgorithmResult(datetime(2011, 3, 4, 10, 0), {'difficulty': 1.0})
+        old_alg_data = {'next_review': datetime(2011, 3, 3, 10, 0), 'difficulty': 1.0}
+        self._cache.update(result, old_alg_data)
+        self._cache.add(self._day + timedelta(9), 2.0)
+        self._calendar.requests = []
+        for i in range(11):
+            day = self._day + timedelta(i)
+            assert_equals(self._calendar.get_workloads(day, day, None), self._cache.get_workloads(day, day, None))
+            assert_almost_equals(self._calendar.get_avg_difficulties(day, day, None)[0],
+                                 self._cache.get_avg_difficulties(day, day, None)[0])
+        assert_equals(22, len(self._calendar.requests))
+        assert_equals(22, self._cache.hits)
+
+    def test_avg_difficulties_are_invalidated_without_workloads(self):
+        self._cache.get_avg_difficulties(*self._days(0, 10) + (None,))
+        self._cache.add(self._day + timedelta(3), 2.0)
+        self._cache.get_avg_difficulties(*self._days(0, 10) + (None,))
+        assert_equals(2, self._cache.misses)
+
+    def test_lru_eviction(self):
+        cache = CachingGlobalData(self._calendar, max_days=25)
+        cache.get_workloads(*self._days(0, 9) + ('user1',))
+        cache.get_workloads(*self._days(0, 9) + ('user2',))
+        cache.get_workloads(*self._days(0, 9) + ('user1',))
+        cache.get_workloads(*self._days(0, 9) + ('user3',))
+        cache.get_workloads(*self._days(0, 9) + ('user1',))
+        cache.get_workloads(*self._days(0, 9) + ('user2',))
+        assert_equals((2, 0, 4), (cache.hits, cache.partial_hits, cache.misses))
+
+    def test_max_days_is_a_hard_bound(self):
+        cache = CachingGlobalData(self._calendar, max_days=25)
+        cache.get_workloads(*self._days(0, 9) + ('user1',))
+        assert_equals(self._calendar.get_workloads(*self._days(0, 29) + ('user2',)),
+                      cache.get_workloads(*self._days(0, 29) + ('user2',)))
+        assert_equals(0, cache._num_days)
+        cache.get_workloads(*self._days(0, 9) + ('user2',))
+        assert_equals((0, 0, 3), (cache.hits, cache.partial_hits, cache.misses))
+
+    def test_random_requests(self):
+        rnd = random.Random(2)
+        for i in range(500):
+            user_data = rnd.choice(['user1', 'user2'])
+            from_ind = rnd.randrange(-10, 70)
+            from_date, to_date = self._days(from_ind, from_ind + rnd.randrange(30))
+            if rnd.random() < 0.3:
+                self._cache.add(from_date + timedelta(rnd.randrange(5)), rnd.random(), user_data)
+            assert_equals(self._calendar.get_workloads(from_date, to_date, user_data),
+                          self._cache.get_workloads(from_date, to_date, user_data))
+            expected = self._calendar.get_avg_difficulties(from_date, to_date, user_data)
+            for expected_value, value in zip(expected, self._cache.get_avg_difficulties(from_date, to_date,
+                                                                                     user_data)):
+                assert_almost_equals(expected_value, value)
+        assert_true(self._cache.hits > 0 and self._cache.partial_hits > 0)
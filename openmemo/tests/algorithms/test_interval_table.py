@@ -0,0 +1,38 @@
+from math import exp
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.interval_table import IntervalTable
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.tests.tools import *
+
+
+class TestIntervalTable (TestCase):
+    def setUp(self):
+        self._table = IntervalTable(SSRFAlgorithm._PRIORITY_MAP, max_num_reviews=10, avg_grade_resolution=4)
+
+    def test_interval_equals_formula(self):
+        for num_reviews in (1, 2, 5, 10, 11, 40):
+            for avg_grade in (0.0, 0.25, 2.5, 2.6, 3.7, 1.0 / 3, 5.0, 5):
+                for grade in (-1,) + GRADES:
+                    for priority in PRIORITIES:
+                        assert_equals(self._expected_interval(num_reviews, avg_grade, grade, priority),
+                                      self._table.interval(num_reviews, avg_grade, grade, priority))
+
+    def test_table_is_built_lazily(self):
+        assert_equals({}, self._table._base_intervals)
+        self._table.interval(3, 2.5, 4, PRIORITY_LOW)
+        assert_equals([3], self._table._base_intervals.keys())
+        assert_equals(3 ** 1.25, self._table._base_intervals[3][10])
+
+    def test_inputs_outside_table_are_not_tabulated(self):
+        self._table.interval(11, 2.5, 4, PRIORITY_LOW)
+        self._table.interval(3, 2.6, 4, PRIORITY_LOW)
+        assert_equals({}, self._table._base_intervals)
+
+    def test_ideal_interval_is_memoized(self):
+        interval = self._table.ideal_interval(3, PRIORITY_HIGH)
+        assert_equals(self._expected_interval(3, 5.0, 5, PRIORITY_HIGH), interval)
+        assert_equals(interval, self._table._ideal_intervals[3, PRIORITY_HIGH])
+
+    def _expected_interval(self, num_reviews, avg_grade, grade, priority):
+        scale_factor = exp(grade - SSRFAlgorithm._PRIORITY_MAP[priority])
+        return 1 + int(round(num_reviews ** (avg_grade / 2.0) * scale_factor))
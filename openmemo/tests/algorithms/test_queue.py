@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import random
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.queue import DueQueue
+from openmemo.tests.tools import *
+
+
+class TestDueQueue (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 9, 0)
+        self._queue = DueQueue()
+
+    def _result(self, days, status=MEMORIZED):
+        return AlgorithmResult(self._now + timedelta(days), {'status': status})
+
+    def test_pop_due(self):
+        for lu, days in [('a', 2), ('b', -1), ('c', 0), ('d', 1)]:
+            self._queue.push(lu, self._now + timedelta(days))
+        assert_equals(['b', 'c'], self._queue.pop_due(self._now))
+        assert_equals([], self._queue.pop_due(self._now))
+        assert_equals(['d'], self._queue.pop_due(self._now + timedelta(1), limit=1))
+        assert_equals(1, len(self._queue))
+        assert_equals(['a'], self._queue.pop_due(self._now + timedelta(5)))
+        assert_equals(0, len(self._queue))
+
+    def test_initial_items(self):
+        queue = DueQueue([('a', self._now + timedelta(2)), ('b', self._now)])
+        assert_equals([(self._now, 'b'), (self._now + timedelta(2), 'a')], queue.peek(5))
+
+    def test_update(self):
+        self._queue.push('a', self._now)
+        self._queue.push('b', self._now + timedelta(1))
+        self._queue.update('a', self._result(3))
+        assert_equals(self._now + timedelta(3), self._queue.next_review('a'))
+        assert_equals([(self._now + timedelta(1), 'b'), (self._now + timedelta(3), 'a')], self._queue.peek(2))
+        assert_equals(['b', 'a'], self._queue.pop_due(self._now + timedelta(3)))
+
+    def test_users(self):
+        self._queue.push('a', self._now, user_data='user1')
+        self._queue.push('a', self._now, user_data='user2')
+        self._queue.remove('a', user_data='user1')
+        assert_equals([], self._queue.pop_due(self._now, user_data='user1'))
+        assert_equals([], self._queue.pop_due(self._now))
+        assert_equals(['a'], self._queue.pop_due(self._now, user_data='user2'))
+
+    def test_final_drill(self):
+        self._queue.update('a', self._result(1, FINAL_DRILL))
+        self._queue.update('b', self._result(2, FINAL_DRILL))
+        assert_equals(['a', 'b'], self._queue.drills())
+        assert_equals('a', self._queue.pop_drill())
+        self._queue.update('a', self._result(1, FINAL_DRILL))
+        assert_equals('b', self._queue.pop_drill())
+        self._queue.update('b', self._result(2))
+        assert_equals(['a'], self._queue.drills())
+        assert_equals('a', self._queue.pop_drill())
+        assert_equals(None, self._queue.pop_drill())
+        assert_equals(['a', 'b'], self._queue.pop_due(self._now + timedelta(2)))
+
+    def test_remove_drill(self):
+        self._queue.update('a', self._result(1, FINAL_DRILL))
+        self._queue.remove('a')
+        assert_equals(None, self._queue.pop_drill())
+        assert_true(not self._queue.contains('a'))
+
+    def test_random_updates(self):
+        rnd = random.Random(1)
+        expected = {}
+        for i in xrange(2000):
+            lu = rnd.randrange(100)
+            if lu in expected and rnd.random() < 0.2:
+                self._queue.remove(lu)
+                del expected[lu]
+            else:
+                expected[lu] = self._now + timedelta(hours=rnd.randrange(1000), microseconds=lu)
+                self._queue.push(lu, expected[lu])
+        ordered = sorted((next_review, lu) for lu, next_review in expected.items())
+        assert_equals(ordered[:10], self._queue.peek(10))
+        until = self._now + timedelta(hours=500)
+        assert_equals([lu for next_review, lu in ordered if next_review <= until], self._queue.pop_due(until))
+        assert_equals(len([lu for next_review, lu in ordered if next_review > until]), len(self._queue))
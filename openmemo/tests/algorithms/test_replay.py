@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import os
+import random
+import shutil
+import tempfile
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.replay import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class _Crash (Exception):
+    pass
+
+
+def _crashing(events, after):
+    for i, event in enumerate(events):
+        if i == after:
+            raise _Crash()
+        yield event
+
+
+class TestReplayEngine (TestCase):
+    def setUp(self):
+        rnd = random.Random(0)
+        start = datetime(2011, 3, 1, 9, 0)
+        self._events = [ReviewEvent(rnd.choice(['user1', 'user2']), rnd.randrange(40), rnd.choice(GRADES),
+                                    start + timedelta(hours=3 * i), rnd.choice(PRIORITIES)) for i in range(500)]
+        self._directory = tempfile.mkdtemp()
+        self._checkpoint_path = os.path.join(self._directory, 'replay.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_replay_matches_scheduling(self):
+        calendar = WorkloadCalendar()
+        algorithm = SSRFAlgorithm(calendar)
+        expected = {}
+        for event in self._events:
+            key = (event.user_data, event.lu)
+            result = algorithm.schedule(event.grade, expected.get(key), event.priority, now=event.time,
+                                        user_data=event.user_data)
+            calendar.update(result, expected.get(key), event.user_data)
+            expected[key] = result.alg_data
+
+        engine = ReplayEngine()
+        assert_equals(500, engine.run(self._events))
+        assert_equals(expected, engine.alg_data)
+        day = self._events[-1].time.date()
+        for user_data in ('user1', 'user2'):
+            assert_equals(calendar.get_workloads(day, day + timedelta(100), user_data),
+                          engine.calendar.get_workloads(day, day + timedelta(100), user_data))
+
+    def test_resume_after_crash(self):
+        expected = ReplayEngine()
+        expected.run(self._events)
+
+        engine = ReplayEngine.resume(self._checkpoint_path, checkpoint_interval=100)
+        assert_raises(_Crash, engine.run, _crashing(self._events, 250))
+        engine = ReplayEngine.resume(self._checkpoint_path, checkpoint_interval=100)
+        assert_equals(200, engine.num_events)
+        assert_equals(300, engine.run(self._events))
+        assert_equals(expected.alg_data, engine.alg_data)
+        assert_equals(500, ReplayEngine.resume(self._checkpoint_path).num_events)
+        assert_equals(0, ReplayEngine.resume(self._checkpoint_path).run(self._events))
+
+    def test_checkpoint_arguments_must_match(self):
+        ReplayEngine(self._checkpoint_path).run(self._events[:10])
+        assert_raises(AssertionError, ReplayEngine.resume, self._checkpoint_path,
+                      algorithm_kwargs={'use_numpy': False})
+
+    def test_events_must_be_ordered(self):
+        engine = ReplayEngine()
+        assert_raises(AssertionError, engine.run, [self._events[1], self._events[0]])
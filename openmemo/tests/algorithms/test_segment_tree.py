@@ -0,0 +1,41 @@
+import random
+from openmemo.algorithms.segment_tree import MinSegmentTree
+from openmemo.tests.tools import *
+
+
+class TestMinSegmentTree (TestCase):
+    def test_min(self):
+        tree = MinSegmentTree([5, 3, 8, 1, 9, 2])
+        assert_equals(1, tree.min(0, 5))
+        assert_equals(3, tree.min(0, 2))
+        assert_equals(8, tree.min(2, 2))
+        assert_equals(2, tree.min(4, 5))
+
+    def test_find_last(self):
+        tree = MinSegmentTree([0, 3, 0, 1, 9, 2])
+        assert_equals(2, tree.find_last(0, 5, 0))
+        assert_equals(0, tree.find_last(0, 1, 0))
+        assert_equals(None, tree.find_last(3, 5, 0))
+        assert_equals(5, tree.find_last(3, 5, 2))
+
+    def test_set_item(self):
+        tree = MinSegmentTree([4, 3, 5], capacity=8, fill=10)
+        tree[1] = 7
+        assert_equals(7, tree[1])
+        assert_equals(4, tree.min(0, 2))
+        tree[6] = 1
+        assert_equals(1, tree.min(0, 7))
+        assert_equals(10, tree.min(3, 5))
+
+    def test_same_results_as_linear_scan(self):
+        rnd = random.Random(3)
+        values = [rnd.randint(0, 5) for i in range(100)]
+        tree = MinSegmentTree(values)
+        for k in range(500):
+            ind = rnd.randrange(len(values))
+            values[ind] = tree[ind] = rnd.randint(0, 5)
+            i = rnd.randrange(len(values))
+            j = rnd.randrange(i, len(values))
+            assert_equals(min(values[i:j + 1]), tree.min(i, j))
+            zeros = [n for n in range(i, j + 1) if values[n] == 0]
+            assert_equals(zeros[-1] if zeros else None, tree.find_last(i, j, 0))
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import random
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.session import ReviewSession
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class _CountingAlgorithm (SSRFAlgorithm):
+    def __init__(self, *args, **kwargs):
+        super(_CountingAlgorithm, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    def schedule(self, *args, **kwargs):
+        self.calls += 1
+        return super(_CountingAlgorithm, self).schedule(*args, **kwargs)
+
+
+class _StrictDrillAlgorithm (SSRFAlgorithm):
+    FINAL_DRILL_GRADES = (0, 1)
+
+    def _reviewed_within_12h(self, alg_data, now):
+        return False
+
+
+class TestReviewSession (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 10, 0)
+        self._calendar = WorkloadCalendar()
+        for i in range(1, 100):
+            for j in range(1 + i % 4):
+                self._calendar.add(self._now + timedelta(i), (i % 7) / 3.0)
+        self._algorithm = _CountingAlgorithm(self._calendar)
+        self._session = ReviewSession(self._algorithm)
+
+    def test_final_drill(self):
+        alg_data = dict(num_reviews=3, avg_grade=3.5, difficulty=0.5, status=MEMORIZED,
+                        last_review=self._now - timedelta(10), next_review=self._now)
+        self._calendar.add(alg_data['next_review'], alg_data['difficulty'])
+        result = self._session.grade('a', 1, alg_data, now=self._now)
+        assert_equals(FINAL_DRILL, result.alg_data['status'])
+        next_review = result.next_review
+        now = self._now + timedelta(minutes=1)
+        result = self._session.grade('a', 2, now=now)
+        assert_equals((next_review, FINAL_DRILL, now), (result.next_review, result.alg_data['status'],
+                                                        result.alg_data['last_review']))
+        result = self._session.grade('a', 4, now=now + timedelta(minutes=1))
+        assert_equals((next_review, MEMORIZED), (result.next_review, result.alg_data['status']))
+        assert_equals(1, self._algorithm.calls)
+        assert_raises(AssertionError, self._session.grade, 'a', 7, now=now)
+
+    def test_rules_of_algorithm_subclass_are_used(self):
+        session = ReviewSession(_StrictDrillAlgorithm(self._calendar))
+        result = session.grade('a', 1, now=self._now)
+        assert_equals(FINAL_DRILL, result.alg_data['status'])
+        num_reviews = result.alg_data['num_reviews']
+        result = session.grade('a', 2, now=self._now + timedelta(minutes=1))
+        assert_equals(MEMORIZED, result.alg_data['status'])
+        result = session.grade('a', 4, now=self._now + timedelta(minutes=2))
+        assert_equals(num_reviews + 1, result.alg_data['num_reviews'])
+
+    def test_results_match_scheduling(self):
+        rnd = random.Random(20)
+        expected_calendar = WorkloadCalendar()
+        for i in range(1, 100):
+            for j in range(1 + i % 4):
+                expected_calendar.add(self._now + timedelta(i), (i % 7) / 3.0)
+        algorithm = SSRFAlgorithm(expected_calendar)
+        expected = {}
+        now = self._now
+        for i in range(300):
+            lu = rnd.randrange(30)
+            grade = rnd.choice(GRADES)
+            priority = PRIORITIES[lu % 3]
+            # Some gradings come more than 12 hours after the previous one
+            now += timedelta(minutes=rnd.choice([1, 5, 800]))
+            old_alg_data = expected.get(lu)
+            result = algorithm.schedule(grade, old_alg_data, priority, now=now)
+            expected_calendar.update(result, old_alg_data)
+            expected[lu] = result.alg_data
+            session_result = self._session.grade(lu, grade, None, priority, now=now)
+            assert_equals(result.next_review, session_result.next_review)
+            assert_equals(result.alg_data, session_result.alg_data)
+        assert_true(self._algorithm.calls < 300)
+        results = self._session.flush()
+        assert_equals(sorted(expected), sorted(lu for lu, result in results))
+        for lu, result in results:
+            assert_equals(expected[lu], result.alg_data)
+            assert_equals(expected[lu]['next_review'], result.next_review)
+        assert_equals(0, len(self._session))
+
+    def test_flush_order(self):
+        for lu in ('c', 'a', 'b', 'a'):
+            self._session.grade(lu, 5, now=self._now)
+        assert_true('a' in self._session)
+        assert_equals(['c', 'a', 'b'], [lu for lu, result in self._session.flush()])
+        assert_true('a' not in self._session)
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.simulation import *
+from openmemo.tests.tools import *
+
+
+class _ConstantGradeModel (GradeModel):
+    def __init__(self, grade, drill_grade):
+        self._grade = grade
+        self._drill_grade = drill_grade
+
+    def new_memory(self, random):
+        return None
+
+    def recall_probability(self, memory, now):
+        return 1.0
+
+    def grade(self, memory, now, random):
+        return self._grade
+
+    def drill_grade(self, memory, now, random):
+        return self._drill_grade
+
+
+class TestSimulation (TestCase):
+    def setUp(self):
+        self._start = datetime(2011, 3, 1, 9, 0)
+
+    def test_day_stats(self):
+        simulation = Simulation(new_cards_per_day=10, start=self._start)
+        stats = simulation.run(30)
+        assert_equals(30, len(stats))
+        assert_equals(self._start.date(), stats[0].date)
+        assert_equals(self._start.date() + timedelta(29), stats[-1].date)
+        assert_equals(self._start + timedelta(30), simulation.now)
+        assert_equals(300, len(simulation.cards))
+        assert_equals((10, 10, None), (stats[0].reviews, stats[0].new_cards, stats[0].retention))
+        for day in stats:
+            assert_true(day.reviews >= day.new_cards)
+            assert_true(day.avg_difficulty > 0.0)
+
+    def test_deterministic(self):
+        stats1 = Simulation(new_cards_per_day=20, start=self._start, seed=3).run(40)
+        stats2 = Simulation(new_cards_per_day=20, start=self._start, seed=3).run(40)
+        assert_equals(stats1, stats2)
+
+    def test_calendar_matches_cards(self):
+        simulation = Simulation(new_cards_per_day=15, start=self._start)
+        simulation.run(60)
+        workloads = {}
+        for alg_data in simulation.cards:
+            day = alg_data['next_review'].date()
+            workloads[day] = workloads.get(day, 0) + 1
+        today = simulation.now.date()
+        last_day = max(workloads)
+        expected = [workloads.get(today + timedelta(i), 0) for i in xrange((last_day - today).days + 1)]
+        assert_equals(expected, simulation.forecast(len(expected)))
+        assert_equals(len(simulation.cards), sum(simulation.forecast(len(expected))))
+
+    def test_reviews_are_due_cards(self):
+        simulation = Simulation(new_cards_per_day=15, start=self._start)
+        simulation.run(30)
+        due = len([alg_data for alg_data in simulation.cards
+                   if alg_data['next_review'].date() == simulation.now.date()])
+        assert_equals(due + 15, simulation.step().reviews)
+
+    def test_perfect_recall(self):
+        simulation = Simulation(_ConstantGradeModel(5, 5), new_cards_per_day=10, start=self._start)
+        for day in simulation.run(50):
+            assert_equals(0, day.drills)
+        assert_true(all(alg_data['status'] == MEMORIZED for alg_data in simulation.cards))
+
+    def test_cards_failing_drills_are_due_next_day(self):
+        simulation = Simulation(_ConstantGradeModel(1, 0), new_cards_per_day=10, start=self._start, max_drills=3)
+        for day in simulation.run(5):
+            assert_equals(3 * day.reviews, day.drills)
+        assert_true(all(alg_data['status'] == FINAL_DRILL for alg_data in simulation.cards))
+        assert_true(all(alg_data['next_review'] == simulation.now for alg_data in simulation.cards))
+        assert_equals([50], simulation.forecast(1))
+        assert_equals(60, simulation.step().reviews)
+
+    def test_retention_depends_on_elapsed_time(self):
+        stats = Simulation(new_cards_per_day=20, start=self._start).run(60)
+        retentions = set(day.retention for day in stats[1:])
+        assert_true(len(retentions) > 10)
+        assert_true(all(0.0 < retention <= 1.0 for retention in retentions))
+
+    def test_recall_probability(self):
+        model = ExponentialForgettingModel(retention=0.8)
+        memory = [self._start, 4.0, 2.0]
+        assert_almost_equals(1.0, model.recall_probability(memory, self._start))
+        assert_almost_equals(0.8, model.recall_probability(memory, self._start + timedelta(4)))
+        assert_almost_equals(0.64, model.recall_probability(memory, self._start + timedelta(8)))
+        assert_almost_equals(0.0, model.recall_probability([None, 4.0, 2.0], self._start))
+
+    def test_stability_grows_after_recall(self):
+        model = ExponentialForgettingModel(retention=0.9, growth_range=(3.0, 3.0))
+        memory = [self._start, 4.0, 3.0]
+        grade = model.grade(memory, self._start + timedelta(4), _Random(0.0))
+        assert_true(grade in model.recall_grades)
+        assert_equals([self._start + timedelta(4), 12.0, 3.0], memory)
+
+    def test_stability_drops_after_lapse(self):
+        model = ExponentialForgettingModel(retention=0.9, lapse=0.5)
+        memory = [self._start, 8.0, 3.0]
+        grade = model.grade(memory, self._start + timedelta(40), _Random(0.99))
+        assert_true(grade in model.forget_grades)
+        assert_equals([self._start + timedelta(40), 4.0, 3.0], memory)
+
+
+class _Random (object):
+    def __init__(self, value):
+        self._value = value
+
+    def random(self):
+        return self._value
+
+    def choice(self, values):
+        return values[0]
@@ -1,9 +1,13 @@
 import logging
 import mox
+import random
 from datetime import date, timedelta
 from openmemo.algorithms.algorithm import *
 from openmemo.tests.tools import *
 from openmemo.algorithms.ssrf import *
+from openmemo.algorithms.ssrf import numpy
+from openmemo.algorithms.interval_table import IntervalTable
+from nose.plugins.skip import SkipTest
 
 logging.basicConfig(format=logging.BASIC_FORMAT, level=logging.DEBUG)
 
@@ -333,3 +337,374 @@ class TestSSRFAlgorithm (TestCase):
         assert_almost_equals(exp_avg_grade, alg_data['avg_grade'], 2)
         self._assert_difficulty(exp_difficulty, alg_data['difficulty'])
         assert_equals(exp_status, alg_data['status'])
+
+
+class _InMemoryGlobalData (SSRFAlgorithmGlobalData):
+    """ Keeps workloads and avg. difficulties in dicts keyed by date and counts requests. """
+    def __init__(self, workloads=None, avg_difficulties=None):
+        self.workloads = dict(workloads or {})
+        self.avg_difficulties = dict(avg_difficulties or {})
+        self.calls = 0
+
+    def get_workloads(self, from_date, to_date, user_data):
+        self.calls += 1
+        return [self.workloads.get(d, 0) for d in self._days(from_date, to_date)]
+
+    def get_avg_difficulties(self, from_date, to_date, user_data):
+        self.calls += 1
+        return [self.avg_difficulties.get(d, 0.0) for d in self._days(from_date, to_date)]
+
+    def add(self, day, difficulty):
+        workload = self.workloads.get(day, 0)
+        avg_difficulty = self.avg_difficulties.get(day, 0.0)
+        self.avg_difficulties[day] = (workload * avg_difficulty + difficulty) / (workload + 1)
+        self.workloads[day] = workload + 1
+
+    def _days(self, from_date, to_date):
+        return [from_date + timedelta(i) for i in range((to_date - from_date).days + 1)]
+
+
+class _WrongMinimumGlobalData (_InMemoryGlobalData, SSRFAlgorithmIndexedGlobalData):
+    """ Indexed provider reporting a minimum workload larger than the real one. """
+    def find_last_zero_workload(self, from_date, to_date, user_data):
+        return None
+
+    def get_min_workload(self, from_date, to_date, user_data):
+        return 10
+
+    def get_min_avg_difficulty(self, from_date, to_date, user_data):
+        return min(self.get_avg_difficulties(from_date, to_date, user_data))
+
+
+class TestSSRFAlgorithmScheduleMany (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 10, 0)
+        today = self._now.date()
+        workloads = dict((today + timedelta(i), (i * 7) % 5 + 1) for i in range(1, 200))
+        avg_difficulties = dict((today + timedelta(i), ((i * 3) % 11) / 4.0) for i in range(1, 200))
+        self._global_data = _InMemoryGlobalData(workloads, avg_difficulties)
+        self._expected_global_data = _InMemoryGlobalData(workloads, avg_difficulties)
+        self._items = []
+        for i in range(60):
+            alg_data = dict(num_reviews=1 + i % 4, avg_grade=2.0 + (i % 6) / 2.0, difficulty=0.5)
+            self._items.append((i % 6, alg_data, PRIORITIES[i % 3]))
+
+    def test_results_match_scheduling_in_turn(self):
+        algorithm = SSRFAlgorithm(self._expected_global_data)
+        expected = []
+        for grade, alg_data, priority in self._items:
+            result = algorithm.schedule(grade, alg_data, priority, now=self._now)
+            self._expected_global_data.add(result.next_review.date(), result.alg_data['difficulty'])
+            expected.append(result)
+
+        results = SSRFAlgorithm(self._global_data).schedule_many(self._items, now=self._now)
+
+        assert_equals(expected, results)
+
+    def test_global_data_is_requested_once(self):
+        SSRFAlgorithm(self._global_data).schedule_many(self._items, now=self._now)
+        assert_equals(2, self._global_data.calls)
+
+    def test_avg_difficulties_are_not_requested_for_zero_workloads(self):
+        global_data = _InMemoryGlobalData()
+        items = [(5, None, PRIORITY_MEDIUM), (5, None, PRIORITY_MEDIUM)]
+        results = SSRFAlgorithm(global_data).schedule_many(items, now=self._now)
+        assert_equals(1, global_data.calls)
+        assert_equals(self._now + timedelta(8), results[0].next_review)
+        assert_equals(self._now + timedelta(7), results[1].next_review)
+
+    def test_final_drill_items_do_not_request_global_data(self):
+        alg_data = dict(num_reviews=2, avg_grade=2.7, difficulty=0.8, next_review=datetime(2011, 3, 2),
+                        status=FINAL_DRILL)
+        results = SSRFAlgorithm(self._global_data).schedule_many([(4, alg_data, PRIORITY_HIGH)], now=self._now)
+        assert_equals(0, self._global_data.calls)
+        assert_equals(datetime(2011, 3, 2), results[0].next_review)
+        assert_equals(MEMORIZED, results[0].alg_data['status'])
+
+
+class TestSSRFAlgorithmNumPy (TestCase):
+    def setUp(self):
+        if numpy is None:
+            raise SkipTest("NumPy is not installed")
+        self._python = SSRFAlgorithm(None, use_numpy=False)
+        self._numpy = SSRFAlgorithm(None, use_numpy=True)
+        self._numpy.NUMPY_MIN_WINDOW = 1
+
+    def test_same_index_as_pure_python(self):
+        rnd = random.Random(7)
+        for i in range(300):
+            num_days = rnd.randint(1, 120)
+            min_interval = rnd.randint(1, 20)
+            workloads = [rnd.randint(0, 6) for d in range(num_days)]
+            if i % 3:
+                workloads = [workload + 1 for workload in workloads]
+            avg_difficulties = [rnd.choice([0.0, rnd.uniform(0.0, 3.0)]) for d in range(num_days)]
+            alg_data = dict(num_reviews=rnd.randint(4, 12), avg_grade=2.5, difficulty=0.5)
+            args = (alg_data, range(min_interval, min_interval + num_days), workloads, avg_difficulties,
+                    PRIORITY_LOW)
+            assert_equals(self._python._find_max_load_reduction_ind(*args),
+                          self._numpy._find_max_load_reduction_ind(*args))
+
+    def test_latest_day_wins_ties(self):
+        alg_data = dict(num_reviews=9, avg_grade=2.5, difficulty=0.5)
+        ind = self._numpy._find_max_load_reduction_ind(alg_data, range(1, 5), [2, 2, 2, 2], [1.0, 1.0, 1.0, 1.0],
+                                                       PRIORITY_LOW)
+        assert_equals(3, ind)
+
+    def test_wrong_workloads(self):
+        assert_raises(AssertionError, self._numpy._find_max_load_reduction_ind,
+                          self._numpy._fill_initial_algorithm_data(), [1, 2], [-1, 0], [0.0, 0.0], PRIORITY_MEDIUM)
+
+
+class TestSSRFAlgorithmSinglePassLoadReduction (TestCase):
+    """ Compares the single pass evaluation with the evaluation building the lists, used when tracing. """
+    def setUp(self):
+        self._algorithm = SSRFAlgorithm(None, use_numpy=False)
+
+    def _compare(self, rnd, with_mins):
+        alg_data = dict(num_reviews=rnd.randint(4, 15), avg_grade=2.5, difficulty=0.5)
+        priority = rnd.choice(PRIORITIES)
+        # Intervals can't be longer than the ideal interval
+        max_interval = min(int(self._algorithm.interval_table.ideal_interval(alg_data['num_reviews'], priority)),
+                           rnd.randint(1, 200))
+        min_interval = rnd.randint(1, max_interval)
+        num_days = max_interval - min_interval + 1
+        workloads = [rnd.choice([0, rnd.randint(1, 3), rnd.randint(1, 500)]) for d in range(num_days)]
+        avg_difficulties = [rnd.choice([0.0, 1.5, rnd.uniform(0.0, 5.0)]) for d in range(num_days)]
+        args = (alg_data, range(min_interval, max_interval + 1), workloads, avg_difficulties, priority)
+        mins = (min(workloads), min(avg_difficulties)) if with_mins else (None, None)
+        expected = self._algorithm._find_max_load_reduction_ind(*args + mins + (SchedulingTrace(),))
+        assert_equals(expected, self._algorithm._find_max_load_reduction_ind_single_pass(*args + mins))
+        assert_equals(expected, self._algorithm._find_max_load_reduction_ind(*args + mins))
+
+    def test_same_index_on_random_windows(self):
+        rnd = random.Random(16)
+        for i in range(500):
+            self._algorithm.validate = i % 2 == 0
+            self._compare(rnd, with_mins=i % 3 == 0)
+
+    def test_latest_day_wins_ties(self):
+        alg_data = dict(num_reviews=9, avg_grade=2.5, difficulty=0.5)
+        ind = self._algorithm._find_max_load_reduction_ind_single_pass(alg_data, range(1, 5), [2, 2, 2, 2],
+                                                                       [1.0, 1.0, 1.0, 1.0], PRIORITY_LOW)
+        assert_equals(3, ind)
+
+    def test_load_coeffs_are_validated_without_tracing(self):
+        # The module sets up DEBUG logging, which makes schedule() trace and use the list evaluation
+        root = logging.getLogger()
+        level = root.level
+        root.setLevel(logging.INFO)
+        try:
+            now = datetime(2011, 3, 1, 10, 0)
+            global_data = _WrongMinimumGlobalData(dict((now.date() + timedelta(i), 2) for i in range(1, 20)),
+                                                  dict((now.date() + timedelta(i), 1.0) for i in range(1, 20)))
+            alg_data = dict(num_reviews=3, avg_grade=3.0, difficulty=0.5)
+            algorithm = SSRFAlgorithm(global_data, use_numpy=False)
+            assert_raises(AssertionError, algorithm.schedule, 5, alg_data, PRIORITY_MEDIUM, now=now)
+            algorithm.validate = False
+            algorithm.schedule(5, alg_data, PRIORITY_MEDIUM, now=now)
+        finally:
+            root.setLevel(level)
+
+
+class TestSSRFAlgorithmConfiguration (TestCase):
+    def test_defaults(self):
+        algorithm = SSRFAlgorithm(None)
+        assert_equals(SSRFAlgorithm._PRIORITY_MAP, algorithm.priority_map)
+        assert_equals(SSRFAlgorithm._PRIORITY_MAP, algorithm.interval_table.priority_map)
+        assert_equals(SSRFAlgorithm._DEFAULT_AVG_GRADE, algorithm._fill_initial_algorithm_data()['avg_grade'])
+
+    def test_default_avg_grade(self):
+        algorithm = SSRFAlgorithm(None, default_avg_grade=4.0)
+        assert_equals(4.0, algorithm._fill_initial_algorithm_data()['avg_grade'])
+        assert_equals(SSRFAlgorithm._DEFAULT_AVG_GRADE,
+                      SSRFAlgorithm(None)._fill_initial_algorithm_data()['avg_grade'])
+
+    def test_priority_map(self):
+        priority_map = {PRIORITY_LOW: 1.0, PRIORITY_MEDIUM: 3.0, PRIORITY_HIGH: 5.0}
+        algorithm = SSRFAlgorithm(None, priority_map=priority_map)
+        default_algorithm = SSRFAlgorithm(None)
+        assert_true(algorithm._calculate_interval(3, 4.0, 5, PRIORITY_LOW) >
+                    default_algorithm._calculate_interval(3, 4.0, 5, PRIORITY_LOW))
+        assert_equals(default_algorithm._calculate_interval(3, 4.0, 5, PRIORITY_MEDIUM),
+                      algorithm._calculate_interval(3, 4.0, 5, PRIORITY_MEDIUM))
+
+    def test_interval_table_must_match_priority_map(self):
+        priority_map = {PRIORITY_LOW: 1.0, PRIORITY_MEDIUM: 3.0, PRIORITY_HIGH: 5.0}
+        assert_raises(AssertionError, SSRFAlgorithm, None, interval_table=IntervalTable(SSRFAlgorithm._PRIORITY_MAP),
+                      priority_map=priority_map)
+
+
+class TestSSRFAlgorithmWithoutValidation (TestCase):
+    def setUp(self):
+        self._global_data = _InMemoryGlobalData(
+            dict((date(2011, 3, 1) + timedelta(i), i % 3) for i in range(200)),
+            dict((date(2011, 3, 1) + timedelta(i), (i % 5) / 2.0) for i in range(200)))
+        self._algorithm = SSRFAlgorithm(self._global_data, validate=False)
+
+    def test_same_results_as_with_validation(self):
+        now = datetime(2011, 3, 1, 8, 0)
+        validated = SSRFAlgorithm(self._global_data)
+        for i in range(50):
+            alg_data = dict(num_reviews=1 + i % 5, avg_grade=1.0 + (i % 8) / 2.0, difficulty=0.2)
+            args = (i % 6, alg_data, PRIORITIES[i % 3], now)
+            assert_equals(validated.schedule(*args), self._algorithm.schedule(*args))
+
+    def test_input_is_validated(self):
+        assert_raises(AssertionError, self._algorithm.schedule, 6)
+        assert_raises(AssertionError, self._algorithm.schedule, grade=5, priority=5.0)
+        assert_raises(AssertionError, self._algorithm.schedule, 5, dict(num_reviews=0))
+        assert_raises(AssertionError, self._algorithm.schedule, 5, dict(avg_grade=5.01))
+
+    def test_calculations_are_not_validated(self):
+        self._algorithm._find_last_zero_workload_ind([0, -1])
+        self._algorithm._calculate_load_coeffs([2, 1], [0.0, -0.01])
+
+
+class _RecordingHandler (logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSSRFAlgorithmTracing (TestCase):
+    def setUp(self):
+        self._logger = logging.getLogger('openmemo.algorithms.ssrf')
+        self._level = self._logger.level
+        self._handler = _RecordingHandler()
+        self._logger.addHandler(self._handler)
+        self._now = datetime(2011, 3, 1, 8, 0)
+        self._global_data = _InMemoryGlobalData(
+            dict((self._now.date() + timedelta(i), 1 + i % 3) for i in range(200)),
+            dict((self._now.date() + timedelta(i), (i % 5) / 2.0) for i in range(200)))
+        self._algorithm = SSRFAlgorithm(self._global_data)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._handler)
+        self._logger.setLevel(self._level)
+
+    def test_trace_is_logged_once_per_call(self):
+        self._logger.setLevel(logging.DEBUG)
+        next_review, alg_data = self._algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41),
+                                                         PRIORITY_LOW, now=self._now)
+        assert_equals(1, len(self._handler.records))
+        trace = self._handler.records[0].ssrf_trace
+        assert_equals(SchedulingTrace.LOAD_BALANCING, trace.branch)
+        assert_equals(trace.max_interval - trace.min_interval + 1, len(trace.workloads))
+        assert_equals(len(trace.workloads), len(trace.load_coeff_rel))
+        assert_equals(next_review.date(), trace.date_from + timedelta(trace.chosen_ind))
+        assert_equals(alg_data, trace.output_alg_data)
+
+    def test_trace_of_final_drill(self):
+        self._logger.setLevel(logging.DEBUG)
+        alg_data = dict(num_reviews=2, avg_grade=2.7, difficulty=0.8, next_review=datetime(2011, 3, 2),
+                        status=FINAL_DRILL)
+        self._algorithm.schedule(2, alg_data, PRIORITY_HIGH, now=self._now)
+        trace = self._handler.records[0].ssrf_trace
+        assert_equals(SchedulingTrace.FINAL_DRILL, trace.branch)
+        assert_equals(None, trace.workloads)
+
+    def test_trace_is_not_recorded_if_debug_is_disabled(self):
+        self._logger.setLevel(logging.INFO)
+        self._algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41), PRIORITY_LOW,
+                                 now=self._now)
+        assert_equals([], self._handler.records)
+
+
+class _ListMetrics (AlgorithmMetrics):
+    def __init__(self):
+        self.records = []
+
+    def record(self, branch, durations, window_size):
+        self.records.append((branch, durations, window_size))
+
+
+class TestSSRFAlgorithmMetrics (TestCase):
+    def setUp(self):
+        self._now = datetime(2011, 3, 1, 8, 0)
+        self._global_data = _InMemoryGlobalData(
+            dict((self._now.date() + timedelta(i), 1 + i % 3) for i in range(200)),
+            dict((self._now.date() + timedelta(i), (i % 5) / 2.0) for i in range(200)))
+        self._metrics = _ListMetrics()
+        self._algorithm = SSRFAlgorithm(self._global_data, metrics=self._metrics)
+
+    def test_load_balancing(self):
+        self._algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41), PRIORITY_LOW,
+                                 now=self._now)
+        branch, durations, window_size = self._metrics.records[0]
+        assert_equals(SchedulingTrace.LOAD_BALANCING, branch)
+        assert_equals(set(['prepare', 'get_workloads', 'get_avg_difficulties', 'validation', 'calculation',
+                           'total']),
+                      set(durations))
+        assert_almost_equals(durations['total'], sum(durations.values()) - durations['total'])
+        assert_true(window_size > 1)
+
+    def test_validation_is_measured_only_if_enabled(self):
+        alg_data = dict(num_reviews=3, avg_grade=3.7, difficulty=0.41)
+        self._algorithm.schedule(5, alg_data, PRIORITY_LOW, now=self._now)
+        self._algorithm.validate = False
+        self._algorithm.schedule(5, alg_data, PRIORITY_LOW, now=self._now)
+        durations, unvalidated_durations = [durations for branch, durations, window_size in self._metrics.records]
+        assert_true(0 < durations['validation'] < durations['total'])
+        assert_true(durations['prepare'] >= 0)
+        assert_true('validation' not in unvalidated_durations)
+
+    def test_checks_of_subclasses_are_measured(self):
+        checked_intervals = []
+        class CheckingAlgorithm (SSRFAlgorithm):
+            def _assert_interval(self, interval):
+                checked_intervals.append(interval)
+                super(CheckingAlgorithm, self)._assert_interval(interval)
+        algorithm = CheckingAlgorithm(self._global_data, metrics=self._metrics)
+        result = algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41), PRIORITY_LOW,
+                                    now=self._now)
+        assert_true(checked_intervals)
+        assert_true(self._metrics.records[0][1]['validation'] > 0)
+        # The algorithm itself is not changed by measuring
+        assert_true(type(algorithm) is CheckingAlgorithm)
+        assert_true('_measurement' not in vars(algorithm))
+        algorithm.metrics = None
+        assert_equals(result, algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41),
+                                                 PRIORITY_LOW, now=self._now))
+
+    def test_shortcuts(self):
+        self._algorithm.schedule(5, None, now=self._now, user_data='user')
+        self._global_data.workloads = {}
+        self._algorithm.schedule(5, None, now=self._now)
+        self._algorithm.schedule(2, dict(num_reviews=2, avg_grade=2.7, difficulty=0.8,
+                                         next_review=datetime(2011, 3, 2), status=FINAL_DRILL), now=self._now)
+        self._algorithm.schedule(4, dict(num_reviews=2, avg_grade=2.7, difficulty=0.8,
+                                         last_review=self._now - timedelta(hours=2),
+                                         next_review=datetime(2011, 3, 2)), now=self._now)
+        self._algorithm.schedule(4, None, now=self._now, estimated=True)
+        assert_equals([SchedulingTrace.LOAD_BALANCING, SchedulingTrace.ZERO_WORKLOAD, SchedulingTrace.FINAL_DRILL,
+                       SchedulingTrace.REVIEWED_WITHIN_12H, SchedulingTrace.ESTIMATED],
+                      [branch for branch, durations, window_size in self._metrics.records])
+        assert_equals([None, None, None], [window_size for branch, durations, window_size
+                                           in self._metrics.records[2:]])
+        assert_true('get_avg_difficulties' not in self._metrics.records[1][1])
+
+    def test_counting_metrics(self):
+        metrics = CountingMetrics()
+        algorithm = SSRFAlgorithm(self._global_data, metrics=metrics)
+        for i in range(3):
+            algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41), PRIORITY_LOW, now=self._now)
+        algorithm.schedule(4, None, now=self._now, estimated=True)
+        counters = metrics.snapshot()
+        assert_equals(4, counters['calls'])
+        assert_equals(3, counters['calls.load balancing'])
+        assert_equals(1, counters['calls.estimated'])
+        assert_true(counters['seconds.total'] >= counters['seconds.get_workloads'] > 0)
+        assert_true(counters['seconds.total'] >= counters['seconds.validation'] > 0)
+        metrics.reset()
+        assert_equals({}, metrics.snapshot())
+
+    def test_no_metrics(self):
+        self._algorithm.metrics = None
+        self._algorithm.schedule(5, dict(num_reviews=3, avg_grade=3.7, difficulty=0.41), PRIORITY_LOW,
+                                 now=self._now)
+        assert_equals([], self._metrics.records)
+
@@ -0,0 +1,71 @@
+from datetime import date, datetime, timedelta
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.ssrf_state import SSRFState, SSRFStateArray
+from openmemo.algorithms.workload_calendar import WorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class TestSSRFState (TestCase):
+    def test_dict_conversion(self):
+        alg_data = dict(num_reviews=3, avg_grade=3.7, difficulty=0.41, status=MEMORIZED,
+                        next_review=datetime(2011, 3, 1, 10, 30))
+        state = SSRFState.from_dict(alg_data)
+        assert_equals(3, state.num_reviews)
+        assert_equals(None, state.last_review)
+        assert_equals(alg_data, state.to_dict())
+        assert_equals(alg_data, state)
+
+    def test_dict_interface(self):
+        state = SSRFState(num_reviews=2)
+        assert_equals(2, state['num_reviews'])
+        assert_raises(KeyError, lambda: state['difficulty'])
+        assert_equals(None, state.get('difficulty'))
+        assert_equals(0.5, state.setdefault('difficulty', 0.5))
+        assert_equals(0.5, state.setdefault('difficulty', 1.0))
+        state['status'] = FINAL_DRILL
+        assert_equals(FINAL_DRILL, state.status)
+        assert_raises(KeyError, state.__setitem__, 'grade', 1)
+        copy = state.copy()
+        copy['num_reviews'] = 3
+        assert_equals(2, state.num_reviews)
+
+    def test_schedule_copies_state(self):
+        state = SSRFState(num_reviews=3, avg_grade=3.7, difficulty=0.41)
+        next_review, alg_data = SSRFAlgorithm(WorkloadCalendar()).schedule(5, state)
+        assert_equals(3, state.num_reviews)
+        assert_equals(4, alg_data['num_reviews'])
+
+    def test_schedule_in_place(self):
+        state = SSRFState(num_reviews=3, avg_grade=3.7, difficulty=0.41)
+        next_review, alg_data = SSRFAlgorithm(WorkloadCalendar()).schedule(5, state, in_place=True)
+        assert_true(alg_data is state)
+        assert_equals(4, state.num_reviews)
+        assert_equals(next_review, state.next_review)
+
+
+class TestSSRFStateArray (TestCase):
+    def setUp(self):
+        self._states = SSRFStateArray([
+            dict(num_reviews=3, avg_grade=3.7, difficulty=0.41, status=MEMORIZED,
+                 last_review=datetime(2011, 3, 1, 10, 30, 0, 15), next_review=datetime(2011, 3, 5, 10, 30)),
+            SSRFState(num_reviews=1)])
+
+    def test_items(self):
+        assert_equals(2, len(self._states))
+        assert_equals(dict(num_reviews=3, avg_grade=3.7, difficulty=0.41, status=MEMORIZED,
+                           last_review=datetime(2011, 3, 1, 10, 30, 0, 15),
+                           next_review=datetime(2011, 3, 5, 10, 30)), self._states[0].to_dict())
+        assert_equals(dict(num_reviews=1), self._states[1].to_dict())
+        self._states[1] = dict(num_reviews=2, status=FINAL_DRILL)
+        assert_equals(dict(num_reviews=2, status=FINAL_DRILL), self._states[1].to_dict())
+        assert_equals(2, len(list(self._states)))
+
+    def test_schedule_view_in_place(self):
+        now = datetime(2011, 3, 10, 9, 0)
+        view = self._states.view(0)
+        next_review, alg_data = SSRFAlgorithm(WorkloadCalendar()).schedule(4, view, now=now, in_place=True)
+        assert_equals(4, self._states.get(0, 'num_reviews'))
+        assert_equals(now, self._states.get(0, 'last_review'))
+        assert_equals(next_review, self._states.get(0, 'next_review'))
+        assert_equals(alg_data, self._states[0])
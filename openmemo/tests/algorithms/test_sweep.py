@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import json
+import random
+from StringIO import StringIO
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.sweep import *
+from openmemo.tests.tools import *
+
+
+def _create_histories(num_users=3, num_lus=20, num_reviews=6, seed=0):
+    rnd = random.Random(seed)
+    start = datetime(2011, 3, 1, 9, 0)
+    histories = {}
+    for user in range(num_users):
+        reviews = []
+        for lu in range(num_lus):
+            time = start + timedelta(days=rnd.randrange(10), minutes=rnd.randrange(600))
+            for i in range(num_reviews):
+                reviews.append(Review(lu, rnd.choice(GRADES), time, PRIORITIES[lu % 3]))
+                time += timedelta(days=rnd.randrange(1, 30))
+        histories['user%d' % user] = reviews
+    return histories
+
+
+class TestSweep (TestCase):
+    def setUp(self):
+        self._histories = _create_histories()
+        self._default = ParameterSet('default', None, None)
+
+    def test_replay(self):
+        result = replay(self._histories, self._default)
+        assert_equals('default', result.name)
+        assert_equals(360, result.reviews)
+        assert_true(0 < result.median_interval <= result.p90_interval)
+        assert_true(result.mean_workload > 0 and result.workload_cv > 0)
+        assert_true(result.max_workload >= result.mean_workload)
+
+    def test_workloads_count_next_reviews_only(self):
+        start = datetime(2011, 3, 1, 9, 0)
+        reviews = [Review('lu', 5, start + timedelta(days=days), PRIORITY_MEDIUM) for days in (0, 3, 9, 20)]
+        result = replay({'user': reviews}, self._default)
+        assert_equals((1.0, 0.0, 1), (result.mean_workload, result.workload_cv, result.max_workload))
+
+    def test_explicit_default_parameters(self):
+        explicit = ParameterSet('default', SSRFAlgorithm._PRIORITY_MAP, SSRFAlgorithm._DEFAULT_AVG_GRADE)
+        assert_equals(replay(self._histories, self._default), replay(self._histories, explicit))
+
+    def test_parameters_change_intervals(self):
+        results = sweep(self._histories, [self._default, ParameterSet('low', {-1: 1.0, 0: 2.0, 1: 3.0}, None),
+                                          ParameterSet('high', {-1: 3.0, 0: 4.0, 1: 5.0}, None)], processes=0)
+        assert_equals(['default', 'low', 'high'], [result.name for result in results])
+        assert_true(results[1].mean_interval > results[0].mean_interval > results[2].mean_interval)
+
+    def test_results_do_not_depend_on_processes(self):
+        parameter_sets = [self._default, ParameterSet('avg grade', None, 4.0)]
+        assert_equals(sweep(self._histories, parameter_sets, processes=0),
+                      sweep(self._histories, parameter_sets, processes=2))
+
+    def test_read_files(self):
+        histories = read_histories(StringIO("user,lu,grade,time,priority\r\n"
+                                            "a,1,5,2011-03-01 10:00:00,1\r\n"
+                                            "a,2,3,2011-03-02 10:00:00,\r\n"))
+        assert_equals({'a': [Review('1', 5, datetime(2011, 3, 1, 10, 0), 1),
+                             Review('2', 3, datetime(2011, 3, 2, 10, 0), DEFAULT_PRIORITY)]}, histories)
+        parameter_sets = read_parameter_sets(StringIO(json.dumps([
+            {'name': 'a', 'priority_map': {'-1': 1, '0': 2, '1': 3}}, {'name': 'b', 'default_avg_grade': 3.0}])))
+        assert_equals([ParameterSet('a', {-1: 1.0, 0: 2.0, 1: 3.0}, None), ParameterSet('b', None, 3.0)],
+                      parameter_sets)
+        assert_equals(3, len(format_results(sweep(histories, parameter_sets, processes=0)).splitlines()))
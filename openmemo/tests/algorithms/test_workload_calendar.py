@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+from openmemo.algorithms.algorithm import *
+from openmemo.algorithms.ssrf import SSRFAlgorithm
+from openmemo.algorithms.workload_calendar import WorkloadCalendar, IndexedWorkloadCalendar
+from openmemo.tests.tools import *
+
+
+class TestWorkloadCalendar (TestCase):
+    def setUp(self):
+        self._calendar = WorkloadCalendar()
+        self._day = date(2011, 3, 1)
+
+    def test_empty_calendar(self):
+        assert_equals([0, 0, 0], self._calendar.get_workloads(self._day, self._day + timedelta(2), None))
+        assert_equals([0.0, 0.0], self._calendar.get_avg_difficulties(self._day, self._day + timedelta(1), None))
+
+    def test_add(self):
+        self._calendar.add(self._day, 1.0)
+        self._calendar.add(self._day, 2.0)
+        self._calendar.add(datetime(2011, 3, 3, 10, 30), 0.5)
+        date_from, date_to = self._day - timedelta(1), self._day + timedelta(3)
+        assert_equals([0, 2, 0, 1, 0], self._calendar.get_workloads(date_from, date_to, None))
+        assert_equals([0.0, 1.5, 0.0, 0.5, 0.0], self._calendar.get_avg_difficulties(date_from, date_to, None))
+
+    def test_add_before_first_day(self):
+        self._calendar.add(self._day, 1.0)
+        self._calendar.add(self._day - timedelta(2), 3.0)
+        date_from, date_to = self._day - timedelta(2), self._day
+        assert_equals([1, 0, 1], self._calendar.get_workloads(date_from, date_to, None))
+        assert_equals([3.0, 0.0, 1.0], self._calendar.get_avg_difficulties(date_from, date_to, None))
+
+    def test_remove(self):
+        self._calendar.add(self._day, 1.0)
+        self._calendar.add(self._day, 2.0)
+        self._calendar.remove(self._day, 2.0)
+        assert_equals([1], self._calendar.get_workloads(self._day, self._day, None))
+        assert_equals([1.0], self._calendar.get_avg_difficulties(self._day, self._day, None))
+        self._calendar.remove(self._day, 1.0)
+        assert_equals([0.0], self._calendar.get_avg_difficulties(self._day, self._day, None))
+        assert_raises(AssertionError, self._calendar.remove, self._day, 1.0)
+
+    def test_remove_rounding_errors(self):
+        self._calendar.add(self._day, 0.0)
+        self._calendar.add(self._day, 2 / 3.0)
+        self._calendar.add(self._day, 1.0)
+        self._calendar.remove(self._day, 2 / 3.0)
+        self._calendar.remove(self._day, 1.0)
+        assert_equals([0.0], self._calendar.get_avg_difficulties(self._day, self._day, None))
+
+    def test_remove_keeps_difficulty_sum_non_negative(self):
+        # 0.3 + 2/3 - 0.3 - 2/3 is slightly below zero in floating point
+        self._calendar.add(self._day, 0.0)
+        self._calendar.add(self._day, 0.3)
+        self._calendar.add(self._day, 2 / 3.0)
+        self._calendar.remove(self._day, 0.3)
+        self._calendar.remove(self._day, 2 / 3.0)
+        assert_equals([1], self._calendar.get_workloads(self._day, self._day, None))
+        assert_equals([0.0], self._calendar.get_avg_difficulties(self._day, self._day, None))
+
+    def test_move(self):
+        self._calendar.add(self._day, 1.0)
+        self._calendar.move(self._day, 1.0, self._day + timedelta(1), 0.4)
+        assert_equals([0, 1], self._calendar.get_workloads(self._day, self._day + timedelta(1), None))
+        assert_equals([0.0, 0.4], self._calendar.get_avg_difficulties(self._day, self._day + timedelta(1), None))
+
+    def test_users_are_separated(self):
+        self._calendar.add(self._day, 1.0, user_data='a')
+        assert_equals([1], self._calendar.get_workloads(self._day, self._day, 'a'))
+        assert_equals([0], self._calendar.get_workloads(self._day, self._day, 'b'))
+
+    def test_update_with_algorithm_results(self):
+        algorithm = SSRFAlgorithm(self._calendar)
+        now = datetime(2011, 3, 1, 9, 0)
+        alg_data = None
+        for days, grade in ((0, 5), (8, 4), (30, 5)):
+            result = algorithm.schedule(grade, alg_data, now=now + timedelta(days))
+            self._calendar.update(result, alg_data)
+            alg_data = result.alg_data
+        workloads = self._calendar.get_workloads(self._day, alg_data['next_review'].date(), None)
+        assert_equals(1, sum(workloads))
+        assert_equals(1, workloads[-1])
+        assert_almost_equals(alg_data['difficulty'], self._calendar.get_avg_difficulties(
+            alg_data['next_review'], alg_data['next_review'], None)[0])
+
+
+class TestIndexedWorkloadCalendar (TestCase):
+    def setUp(self):
+        self._calendar = IndexedWorkloadCalendar()
+        self._day = date(2011, 3, 1)
+
+    def test_find_last_zero_workload(self):
+        for days in (0, 1, 3, 4, 4):
+            self._calendar.add(self._day + timedelta(days), 1.0)
+        find = lambda i, j: self._calendar.find_last_zero_workload(self._day + timedelta(i),
+                                                                   self._day + timedelta(j), None)
+        assert_equals(self._day + timedelta(2), find(0, 4))
+        assert_equals(None, find(0, 1))
+        assert_equals(None, find(3, 4))
+        assert_equals(self._day + timedelta(6), find(3, 6))
+        assert_equals(self._day - timedelta(1), find(-3, 1))
+        assert_equals(self._day - timedelta(2), find(-5, -2))
+
+    def test_find_last_zero_workload_in_empty_calendar(self):
+        assert_equals(self._day, self._calendar.find_last_zero_workload(self._day, self._day, None))
+
+    def test_find_last_workload_at_most(self):
+        for days, workload in enumerate([3, 1, 2, 4, 2, 5]):
+            for i in range(workload):
+                self._calendar.add(self._day + timedelta(days), 1.0)
+        find = lambda i, j, max_workload: self._calendar.find_last_workload_at_most(
+            self._day + timedelta(i), self._day + timedelta(j), max_workload, None)
+        assert_equals(self._day + timedelta(1), find(0, 3, 1))
+        assert_equals(self._day + timedelta(4), find(0, 5, 2))
+        assert_equals(self._day + timedelta(4), find(0, 5, 4))
+        assert_equals(None, find(3, 5, 1))
+        assert_equals(self._day + timedelta(7), find(3, 7, 1))
+        assert_equals(self._day - timedelta(1), find(-2, 0, 2))
+
+    def test_min_workload_and_avg_difficulty(self):
+        for days, difficulty in ((0, 1.0), (0, 2.0), (1, 0.5), (2, 3.0), (2, 3.0), (2, 1.0)):
+            self._calendar.add(self._day + timedelta(days), difficulty)
+        date_to = self._day + timedelta(2)
+        assert_equals(1, self._calendar.get_min_workload(self._day, date_to, None))
+        assert_equals(3, self._calendar.get_min_workload(date_to, date_to, None))
+        assert_equals(0, self._calendar.get_min_workload(self._day, date_to + timedelta(1), None))
+        assert_equals(0.5, self._calendar.get_min_avg_difficulty(self._day, date_to, None))
+        assert_almost_equals(7.0 / 3, self._calendar.get_min_avg_difficulty(date_to, date_to, None))
+        assert_equals(0.0, self._calendar.get_min_avg_difficulty(self._day - timedelta(1), date_to, None))
+
+    def test_remove_updates_index(self):
+        self._calendar.add(self._day, 1.0)
+        self._calendar.add(self._day + timedelta(1), 1.0)
+        assert_equals(None, self._calendar.find_last_zero_workload(self._day, self._day + timedelta(1), None))
+        self._calendar.remove(self._day, 1.0)
+        assert_equals(self._day, self._calendar.find_last_zero_workload(self._day, self._day + timedelta(1), None))
+
+    def test_schedules_same_as_workload_calendar(self):
+        now = datetime(2011, 3, 1, 9, 0)
+        calendars = (WorkloadCalendar(), IndexedWorkloadCalendar())
+        for calendar in calendars:
+            for days in range(1, 300):
+                for i in range(days % 4 + 1):
+                    calendar.add(self._day + timedelta(days), (days * i % 7) / 3.0)
+        results = []
+        for calendar in calendars:
+            algorithm = SSRFAlgorithm(calendar)
+            results.append([])
+            for i in range(100):
+                alg_data = dict(num_reviews=1 + i % 7, avg_grade=2.0 + (i % 5) / 2.0, difficulty=0.5)
+                result = algorithm.schedule(i % 6, alg_data, PRIORITIES[i % 3], now=now)
+                calendar.update(result)
+                results[-1].append(result)
+        assert_equals(results[0], results[1])
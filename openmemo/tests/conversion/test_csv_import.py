@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import pickle
 from openmemo.tests.tools import *
 from openmemo.conversion.formats import CSVImporter
 from openmemo.conversion.exceptions import  ConversionFailure
+from openmemo.conversion.resources import ResourceStore
 import openmemo.tests.tools.model as m
 from fs.tempfs import TempFS
 from os.path import sep
@@ -239,3 +241,185 @@ class TestQAFromCSVImport (TestCase):
         assert_equals('button.mp3', self.sounds[0]['filename'])
         assert_equals('audio/mpeg', self.sounds[0]['mime_type'])
         assert_true(image_data == self.sounds[0]['data'])
+
+    def test_iter_import_yields_bounded_chunks(self):
+        data = u"\r\n".join(u"question %d, answer %d" % (i, i) for i in range(5))
+        self.fs.setcontents('index.csv', data)
+        chunks = list(self.importer.iter_import(chunk_size=2))
+        assert_equals([2, 2, 1], [len(c.content_objects) for c in chunks])
+        assert_equals(self.cos, sum([c.content_objects for c in chunks], []))
+        assert_equals(u"question 4", chunks[2].content_objects[0]['question'])
+
+    def test_iter_import_is_lazy(self):
+        data = u"question 1, answer 1\r\nquestion"
+        self.fs.setcontents('index.csv', data)
+        chunks = self.importer.iter_import(chunk_size=1)
+        assert_equals(u"question 1", chunks.next().content_objects[0]['question'])
+        assert_raises(ConversionFailure, chunks.next)
+
+    def test_iter_import_reports_resources_with_their_content_objects(self):
+        data = u'question 1, answer 1\r\n<img src="image.jpg" />, answer 2'
+        self.fs.setcontents('index.csv', data)
+        self.fs.setcontents('image.jpg', self.data.getcontents('small.jpg'))
+        chunks = list(self.importer.iter_import(chunk_size=1))
+        assert_equals(2, len(chunks))
+        assert_equals([], chunks[0].images)
+        assert_equals(self.images, chunks[1].images)
+        assert_equals(u'<img src="/images/image.jpg"/>', chunks[1].content_objects[0]['question'])
+
+    def test_batch_factory_receives_records_in_batches(self):
+        factory = m.BatchImportedInstanceFactory(self, field_types={
+            'question': 'html',
+            'answer': 'html'
+        })
+        self.importer = CSVImporter(self.fs, factory, m.HTMLMarkupImporter(self))
+        self.importer.batch_size = 2
+        data = u'\r\n'.join([u'<img src="image.jpg" />, answer 0'] +
+                             [u"question %d, answer %d" % (i, i) for i in range(1, 5)])
+        self.fs.setcontents('index.csv', data)
+        self.fs.setcontents('image.jpg', self.data.getcontents('small.jpg'))
+        self.importer()
+        assert_equals([2, 2, 1], factory.batches)
+        assert_equals(5, len(self.cos))
+        assert_equals(u'<img src="/images/image.jpg"/>', self.cos[0]['question'])
+        assert_equals(u"answer 4", self.cos[4]['answer'])
+        assert_equals(1, len(self.images))
+
+    def test_iter_import_uses_batch_factory(self):
+        factory = m.BatchImportedInstanceFactory(self, field_types={
+            'question': 'html',
+            'answer': 'html'
+        })
+        self.importer = CSVImporter(self.fs, factory, m.HTMLMarkupImporter(self))
+        data = u'question 1, answer 1\r\n<img src="image.jpg" />, answer 2'
+        self.fs.setcontents('index.csv', data)
+        self.fs.setcontents('image.jpg', self.data.getcontents('small.jpg'))
+        chunks = list(self.importer.iter_import(chunk_size=5))
+        assert_equals([2], factory.batches)
+        assert_equals(1, len(chunks))
+        assert_equals(self.cos, chunks[0].content_objects)
+        assert_equals(self.images, chunks[0].images)
+
+    def _parallel_data(self):
+        rows = [u'"question %d\r\n, line 2", answer \\" %d' % (i, i) for i in range(50)]
+        rows[7] = u'"<img src=""image.jpg"" />", answer 7'
+        self.fs.setcontents('image.jpg', self.data.getcontents('small.jpg'))
+        return u"\r\n".join(rows)
+
+    def test_parallel_import_keeps_order_of_rows(self):
+        self.fs.setcontents('index.csv', self._parallel_data())
+        self.importer()
+        expected = list(self.cos)
+        del self.cos[:]
+        del self.images[:]
+
+        self.importer.processes = 2
+        self.importer.chunk_bytes = 64
+        self.importer()
+        assert_equals(expected, self.cos)
+        assert_equals(u"question 49\n, line 2", self.cos[49]['question'])
+        assert_equals(u'<img src="/images/image.jpg"/>', self.cos[7]['question'])
+        assert_equals(1, len(self.images))
+
+    def test_parallel_import_with_field_names_in_first_row(self):
+        data = u"word, translation\r\n" + u"\r\n".join(u"a %d, \"b\r\n%d\"" % (i, i) for i in range(20))
+        self.fs.setcontents('index.csv', data)
+        self.importer.fields_in_first_row = True
+        self.importer.processes = 2
+        self.importer.chunk_bytes = 16
+        self.importer()
+        assert_equals(20, len(self.cos))
+        assert_equals(u"a 19", self.cos[19]['word'])
+        assert_equals(u"b\n19", self.cos[19]['translation'])
+
+    def test_parallel_import_reports_global_line_numbers(self):
+        rows = [u"question %d, answer %d" % (i, i) for i in range(40)]
+        rows[33] = u"question 33"
+        self.fs.setcontents('index.csv', u"\r\n".join(rows))
+        self.importer.processes = 2
+        self.importer.chunk_bytes = 32
+        try:
+            self.importer()
+            fail()
+        except ConversionFailure, e:
+            assert_true("at line 33: ['question 33']" in unicode(e))
+        assert_equals(33, len(self.cos))
+
+    def _html_data(self):
+        for name in ('small.jpg', 'medium.jpg', 'big.png', 'button.mp3'):
+            self.fs.setcontents(name, self.data.getcontents(name))
+        self.fs.setcontents('a&b.jpg', self.data.getcontents('big.gif'))
+        images = ['big.png', 'small.jpg', 'a&amp;b.jpg', './small.jpg', 'medium.jpg']
+        rows = [u'"<p><img src=""%s"" /> %d</p>", "<span class=""audio""><a href=""button.mp3""/></span>"' % (path, i) 
+                for i, path in enumerate(images * 4)]
+        return u"\r\n".join(rows)
+
+    def _import_sequentially_and_in_parallel(self):
+        self.importer()
+        expected = list(self.cos), list(self.images), list(self.sounds)
+        del self.cos[:], self.images[:], self.sounds[:]
+        self.importer.processes = 2
+        self.importer.chunk_bytes = 64
+        self.importer()
+        return expected, (self.cos, self.images, self.sounds)
+
+    def test_parallel_import_converts_html_like_import_in_one_process(self):
+        self.fs.setcontents('index.csv', self._html_data())
+        expected, actual = self._import_sequentially_and_in_parallel()
+        assert_equals(expected, actual)
+        assert_equals(['big.png', 'small.jpg', 'a&b.jpg', 'medium.jpg'], 
+                      [image['filename'] for image in self.images])
+        assert_equals(u'<p><img src="/images/a&amp;b.jpg"/> 2</p>', self.cos[2]['question'])
+        assert_equals(1, len(self.sounds))
+
+    def test_parallel_import_converts_only_html_fields_in_workers(self):
+        self.fs.setcontents('index.csv', self._html_data())
+        self.importer.html_fields = ('answer',)
+        expected, actual = self._import_sequentially_and_in_parallel()
+        assert_equals(expected, actual)
+
+    def test_workers_get_a_picklable_preparer_only(self):
+        preparer = pickle.loads(pickle.dumps(self.importer.markup.preparer(), 2))
+        html = u'<p><img src="a.png"/><span class="audio"><a href="b.mp3"/></span></p>'
+        prepared = preparer.prepare(html)
+        assert_equals(self.importer.markup.prepare(html), prepared)
+        assert_equals([(0, 'a.png'), (1, 'b.mp3')], prepared.references)
+        assert_true(not hasattr(preparer, 'factory'))
+
+    def test_parallel_import_fails_at_invalid_xml(self):
+        rows = [u"<b>question %d</b>, answer %d" % (i, i) for i in range(40)]
+        rows[25] = u"<b>question 25, answer 25"
+        self.fs.setcontents('index.csv', u"\r\n".join(rows))
+        self.importer.processes = 2
+        self.importer.chunk_bytes = 32
+        assert_raises(ConversionFailure, self.importer)
+        assert_equals(25, len(self.cos))
+
+    def test_resource_referenced_by_many_cards_is_created_once(self):
+        data = u"\r\n".join(u'<span class="audio autoplay"><a href="%s" /></span>, answer %d' % (path, i) 
+                             for i, path in enumerate(['button.mp3', './button.mp3', 'button.mp3']))
+        self.fs.setcontents('index.csv', data)
+        self.fs.setcontents('button.mp3', self.data.getcontents('button.mp3'))
+        self.importer()
+        assert_equals(3, len(self.cos))
+        assert_equals(1, len(self.sounds))
+        assert_equals(u'<span class="audio autoplay"><a href="/sounds/button.mp3"/></span>', self.cos[2]['question'])
+
+    def test_resource_store_dedupes_content_across_paths_and_imports(self):
+        factory = m.ImportedInstanceFactory(self, field_types={
+            'question': 'html',
+            'answer': 'image'
+        })
+        self.importer = CSVImporter(self.fs, factory, m.HTMLMarkupImporter(self))
+        self.importer.resource_store = ResourceStore()
+        data = u'<img src="image.jpg" />, copy.jpg'
+        self.fs.setcontents('index.csv', data)
+        image_data = self.data.getcontents('small.jpg')
+        self.fs.setcontents('image.jpg', image_data)
+        self.fs.setcontents('copy.jpg', image_data)
+        self.importer()
+        self.importer()
+        assert_equals(2, len(self.cos))
+        assert_equals(1, len(self.images))
+        assert_equals(self.images[0], self.cos[1]['answer'])
+        assert_equals(u'<img src="/images/%s"/>' % self.images[0]['filename'], self.cos[1]['question'])
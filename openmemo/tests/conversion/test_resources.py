@@ -0,0 +1,67 @@
+from openmemo.tests.tools import *
+from openmemo.conversion.exceptions import ConversionFailure
+from openmemo.conversion.resources import ResourceCache, ResourceStore
+from fs.tempfs import TempFS
+
+class FakeFactory (object):
+    def __init__(self):
+        self.created = []
+
+    def Image(self, importer, data):
+        self.created.append(('Image', data['filename']))
+        return len(self.created)
+
+    def Sound(self, importer, data):
+        self.created.append(('Sound', data['filename']))
+        return len(self.created)
+
+class TestResourceCache (TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.fs = TempFS()
+        self.fs.makedir('dir')
+        self.fs.setcontents('dir/a.jpg', 'a')
+        self.fs.setcontents('dir/b.jpg', 'b')
+        self.fs.setcontents('dir/copy.jpg', 'a')
+        self.factory = FakeFactory()
+
+    def test_resource_is_created_once_per_normalized_path(self):
+        cache = ResourceCache()
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, 'dir/a.jpg'))
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, './dir/../dir/a.jpg'))
+        assert_equals(2, cache(None, self.factory, 'Image', self.fs, 'dir/b.jpg'))
+        assert_equals(3, cache(None, self.factory, 'Image', self.fs, 'dir/copy.jpg'))
+        assert_equals([('Image', 'a.jpg'), ('Image', 'b.jpg'), ('Image', 'copy.jpg')], self.factory.created)
+
+    def test_same_path_in_other_directory_is_another_resource(self):
+        self.fs.makedir('other')
+        self.fs.setcontents('other/a.jpg', 'other')
+        cache = ResourceCache()
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs.opendir('dir'), 'a.jpg'))
+        assert_equals(2, cache(None, self.factory, 'Image', self.fs.opendir('other'), 'a.jpg'))
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, 'dir/a.jpg'))
+
+    def test_resource_types_are_cached_separately(self):
+        cache = ResourceCache(ResourceStore())
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, 'dir/a.jpg'))
+        assert_equals(2, cache(None, self.factory, 'Sound', self.fs, 'dir/a.jpg'))
+
+    def test_store_dedupes_identical_content(self):
+        store = ResourceStore()
+        cache = ResourceCache(store)
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, 'dir/a.jpg'))
+        assert_equals(1, cache(None, self.factory, 'Image', self.fs, 'dir/copy.jpg'))
+        assert_equals([('Image', 'a.jpg')], self.factory.created)
+        assert_equals(1, len(store))
+
+    def test_store_is_shared_by_imports(self):
+        store = ResourceStore()
+        ResourceCache(store)(None, self.factory, 'Image', self.fs, 'dir/a.jpg')
+        assert_equals(1, ResourceCache(store)(None, self.factory, 'Image', self.fs, 'dir/copy.jpg'))
+        assert_equals(2, ResourceCache(store)(None, self.factory, 'Image', self.fs, 'dir/b.jpg'))
+        assert_equals(2, len(self.factory.created))
+
+    def test_missing_file_results_in_failure(self):
+        cache = ResourceCache()
+        assert_raises(ConversionFailure, cache, None, self.factory, 'Image', self.fs, 'dir/missing.jpg')
@@ -167,4 +167,73 @@ A: answer"""
     def test_invalid_fields_number_in_input_error(self):
         data = u'Q: question'
         self.fs.setcontents('index.txt', data)
-        assert_raises(ConversionFailure, self.importer)                                
\ No newline at end of file
+        assert_raises(ConversionFailure, self.importer)
+
+    def test_iter_import_yields_bounded_chunks(self):
+        data = u"\n\n".join(u"Q: question %d\nA: answer %d" % (i, i) for i in range(5))
+        self.fs.setcontents('cards.txt', data)
+        chunks = list(self.importer.iter_import(chunk_size=2))
+        assert_equals([2, 2, 1], [len(c.content_objects) for c in chunks])
+        assert_equals(self.cos, sum([c.content_objects for c in chunks], []))
+        assert_equals(u"answer 4", chunks[2].content_objects[0]['answer'])
+        assert_equals(self.importer.factory, self.importer.markup.factory.factory)
+
+    def test_iter_import_fails_after_yielding_preceding_cards(self):
+        data = u"Q: question 1\nA: answer 1\n\nquestion 2"
+        self.fs.setcontents('cards.txt', data)
+        chunks = self.importer.iter_import(chunk_size=1)
+        assert_equals(u"question 1", chunks.next().content_objects[0]['question'])
+        assert_raises(ConversionFailure, chunks.next)
+
+    def test_batch_factory_receives_records_in_batches(self):
+        factory = m.BatchImportedInstanceFactory(self, field_types={
+            'question': 'html',
+            'answer': 'html'
+        })
+        self.importer = SuperMemoQAImporter(self.fs, factory, m.HTMLMarkupImporter(self))
+        self.importer.batch_size = 3
+        data = u"\n\n".join(u"Q: question %d\nA: answer %d" % (i, i) for i in range(4))
+        self.fs.setcontents('cards.txt', data)
+        self.importer()
+        assert_equals([3, 1], factory.batches)
+        assert_equals([u"question %d" % i for i in range(4)], [co['question'] for co in self.cos])
+
+    def _parse_results(self, data, fast_parser, block_size=1024):
+        self.fs.setcontents('cards.txt', data)
+        self.importer.fast_parser = fast_parser
+        self.importer.block_size = block_size
+        cards = []
+        try:
+            for values in self.importer._records():
+                cards.append(values)
+        except ConversionFailure, e:
+            return cards, unicode(e)
+        return cards, None
+
+    def test_fast_parser_is_equivalent_to_line_parser(self):
+        inputs = [
+            "Q: question",
+            "A: answer",
+            "Q: question\nA: answer",
+            "Q: question\r\nA: answer\r\n\r\nQ: question 2\r\nA: answer 2\r\n",
+            "Q: question\rA: answer\r\rQ: question 2\rA: answer 2",
+            "Q: q  \nQ:  q2 \nA: a \nA: a2  \n  \nQ: q3\nA: a3\n\n",
+            "Q: question\nA: answer\n\nQ: question 2",
+            "Q: question\nA: answer\n\n\nQ: question 2\nA: answer 2",
+            "Q: question\nA: answer\nQ: question 2\nA: answer 2",
+            "Q: question\nanswer",
+            "Q: question\nA: answer\n\nquestion 2\nA: answer 2",
+            "A: answer\n\nA: answer 2\n\n",
+            "Q:question\nA: answer",
+            "Q: \nA: \n",
+            "Q: a\x0cb\nA: c\x0c\n\x0c\nQ: d\nA: e",
+        ]
+        for data in inputs:
+            for block_size in (1, 2, 7, 1024):
+                assert_equals(self._parse_results(data, False),
+                              self._parse_results(data, True, block_size))
+
+    def test_fast_parser_reports_line_numbers(self):
+        data = "Q: question\nA: answer\n\nQ: question 2\nA: answer 2\nanswer 2"
+        assert_equals(u"An answer line (#6) without the 'A: ' prefix", self._parse_results(data, True)[1])
+        assert_equals(u"Illegal end state: _process_question", self._parse_results("", True)[1])
@@ -50,6 +50,15 @@ class ImportedInstanceFactory (object):
         sound = Sound(**data)
         self.suite.sounds.append(sound)
         return sound
+
+class BatchImportedInstanceFactory (ImportedInstanceFactory):
+    def __init__(self, suite, field_types={}):
+        super(BatchImportedInstanceFactory, self).__init__(suite, field_types)
+        self.batches = []
+
+    def ContentObjects(self, importer, values):
+        self.batches.append(len(values))
+        return [self.ContentObject(importer, data) for data in values]
        
 from openmemo.conversion.html.tags import *
    
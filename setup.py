@@ -13,6 +13,7 @@ setup(
     #author_email='',
     #url='',
     install_requires=['nose', 'mox', 'enum', 'fs>=0.4.0'],
+    extras_require={'numpy': ['numpy']},
     packages=find_packages(exclude=['ez_setup']),
     include_package_data=True,
     test_suite='nose.collector'